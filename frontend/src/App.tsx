@@ -13,6 +13,9 @@ interface ClientData {
   address?: string;
 }
 
+// Clients are fetched from the server one page at a time as the user types
+const CLIENT_PAGE_SIZE = 50;
+
 function App() {
   const [invoiceData, setInvoiceData] = useState<InvoiceData>({});
   const [clients, setClients] = useState<ClientData[]>([]);
@@ -36,7 +39,7 @@ function App() {
         const data = await apiClient.getInitialData();
         setInvoiceData(data);
         
-        const clientList = await apiClient.getClients();
+        const { clients: clientList } = await apiClient.searchClients('', CLIENT_PAGE_SIZE);
         setClients(clientList);
       } catch (err) {
         setError(`Failed to load data: ${err instanceof Error ? err.message : 'Unknown error'}`);
@@ -48,6 +51,15 @@ function App() {
     loadData();
   }, []);
 
+  const handleClientSearch = async (query: string) => {
+    try {
+      const { clients: clientList } = await apiClient.searchClients(query, CLIENT_PAGE_SIZE);
+      setClients(clientList);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to search clients');
+    }
+  };
+
   const handleFieldChange = (fieldName: string, value: any) => {
     setInvoiceData(prev => ({
       ...prev,
@@ -92,9 +104,16 @@ function App() {
         return;
       }
 
-      // Save invoice
-      const result = await apiClient.saveInvoice(invoiceData);
-      setSuccess(`✓ Invoice saved successfully!\n\nLocation: ${result.output_path}`);
+      // Save invoice on the server and hand the file to the browser
+      const result = await apiClient.downloadInvoice(invoiceData, true);
+      const url = URL.createObjectURL(result.blob);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = result.filename;
+      link.click();
+      // Revoking straight after click() can cancel the download in some browsers
+      setTimeout(() => URL.revokeObjectURL(url), 1000);
+      setSuccess(`✓ Invoice saved successfully!\n\nLocation: ${result.outputPath || result.filename}`);
       
       // Reset form
       setTimeout(() => {
@@ -167,6 +186,7 @@ function App() {
               onAddClient={(name, address) => {
                 setClients([...clients, { name, address }]);
               }}
+              onClientSearch={handleClientSearch}
             />
           </div>
 
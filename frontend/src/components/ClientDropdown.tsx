@@ -1,23 +1,43 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 
 interface ClientDropdownProps {
   clients: { name: string; address?: string }[];
   value: string;
   onChange: (value: string) => void;
   onAddClient: (name: string, address: string) => void;
+  onSearch?: (query: string) => void;
 }
 
+// Wait for a pause in typing before asking the server for matches
+const SEARCH_DEBOUNCE_MS = 250;
+
 export default function ClientDropdown({
   clients,
   value,
   onChange,
   onAddClient,
+  onSearch,
 }: ClientDropdownProps) {
+  const [searchQuery, setSearchQuery] = useState('');
+  const searchTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
   const [showAddDialog, setShowAddDialog] = useState(false);
   const [newClientName, setNewClientName] = useState('');
   const [newClientAddress, setNewClientAddress] = useState('');
   const [error, setError] = useState<string | null>(null);
 
+  useEffect(() => {
+    return () => {
+      if (searchTimer.current) clearTimeout(searchTimer.current);
+    };
+  }, []);
+
+  const handleSearchChange = (query: string) => {
+    setSearchQuery(query);
+    if (!onSearch) return;
+    if (searchTimer.current) clearTimeout(searchTimer.current);
+    searchTimer.current = setTimeout(() => onSearch(query), SEARCH_DEBOUNCE_MS);
+  };
+
   const handleAddClient = () => {
     if (!newClientName.trim()) {
       setError('Client name cannot be empty');
@@ -34,6 +54,16 @@ export default function ClientDropdown({
   return (
     <div className="field-group">
       <label htmlFor="client_name" className="font-semibold">Client Name</label>
+
+      {onSearch && (
+        <input
+          type="text"
+          placeholder="Search clients..."
+          value={searchQuery}
+          onChange={(e) => handleSearchChange(e.target.value)}
+          className="w-full mb-2"
+        />
+      )}
       
       <div className="flex gap-2">
         <select
@@ -43,6 +73,9 @@ export default function ClientDropdown({
           className="flex-1"
         >
           <option value="">Select a client...</option>
+          {value && !clients.some((client) => client.name === value) && (
+            <option value={value}>{value}</option>
+          )}
           {clients.map((client) => (
             <option key={client.name} value={client.name}>
               {client.name}
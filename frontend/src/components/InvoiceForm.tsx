@@ -21,6 +21,7 @@ interface InvoiceFormProps {
   calculations: Calculations;
   onFieldChange: (fieldName: string, value: any) => void;
   onAddClient: (name: string, address: string) => void;
+  onClientSearch?: (query: string) => void;
 }
 
 export default function InvoiceForm({
@@ -29,6 +30,7 @@ export default function InvoiceForm({
   calculations,
   onFieldChange,
   onAddClient,
+  onClientSearch,
 }: InvoiceFormProps) {
   const nextInvoiceNumber = invoiceData.invoice_no || 'AUTO-GENERATED';
 
@@ -71,6 +73,7 @@ export default function InvoiceForm({
           }
         }}
         onAddClient={onAddClient}
+        onSearch={onClientSearch}
       />
 
       {/* Client Address */}
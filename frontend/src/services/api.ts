@@ -9,6 +9,36 @@ const axiosInstance: AxiosInstance = axios.create({
   },
 });
 
+export type JobStatus = 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+
+export interface Job {
+  id: string;
+  kind: 'invoice_batch' | 'bo_ingest' | 'register_export' | 'invoice_pdf';
+  status: JobStatus;
+  total: number;
+  succeeded: number;
+  failed: number;
+  cancelled: number;
+  pending: number;
+  progress: number;
+  cancel_requested: boolean;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+}
+
+export interface JobItem {
+  index: number;
+  status: 'pending' | 'running' | 'succeeded' | 'failed' | 'invalid' | 'cancelled';
+  result: { [key: string]: any } | null;
+  error: string | null;
+  attempts: number;
+}
+
+const FINISHED_JOB_STATUSES: JobStatus[] = ['succeeded', 'failed', 'cancelled'];
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
 export const apiClient = {
   // Initialize app - get initial invoice data and clients
   async getInitialData(): Promise<{ [key: string]: any }> {
@@ -31,6 +61,25 @@ export const apiClient = {
     }
   },
 
+  // Search clients one page at a time (server-side filtering)
+  async searchClients(
+    query: string,
+    limit: number = 50,
+    offset: number = 0
+  ): Promise<{ clients: { name: string; address?: string }[]; total: number }> {
+    try {
+      const response = await axiosInstance.get('/api/clients', {
+        params: { q: query, limit, offset },
+      });
+      return {
+        clients: response.data.clients || [],
+        total: response.data.total || 0,
+      };
+    } catch (error) {
+      throw new Error(`Failed to search clients: ${error instanceof Error ? error.message : 'Unknown error'}`);
+    }
+  },
+
   // Add new client
   async addClient(name: string, address: string): Promise<{ success: boolean; message: string }> {
     try {
@@ -51,6 +100,178 @@ export const apiClient = {
     }
   },
 
+  // Render invoice on the server and return the .xlsx (or PDF) file
+  async downloadInvoice(
+    data: { [key: string]: any },
+    persist: boolean = false,
+    format: 'xlsx' | 'pdf' = 'xlsx'
+  ): Promise<{ blob: Blob; filename: string; outputPath?: string }> {
+    try {
+      const response = await axiosInstance.post('/api/invoice/download', data, {
+        params: { ...(persist ? { persist: 1 } : {}), ...(format === 'pdf' ? { format } : {}) },
+        responseType: 'blob',
+      });
+      const disposition: string = response.headers['content-disposition'] || '';
+      const match = disposition.match(/filename\*?=(?:UTF-8'')?"?([^";]+)"?/i);
+      return {
+        blob: response.data,
+        filename: match ? decodeURIComponent(match[1]) : `Invoice.${format}`,
+        outputPath: response.headers['x-output-path'],
+      };
+    } catch (error) {
+      let message = error instanceof Error ? error.message : 'Unknown error';
+      // Errors come back as a blob too; show the server's reason (e.g. a 409
+      // when the previewed invoice number has been issued meanwhile)
+      const body = axios.isAxiosError(error) ? error.response?.data : undefined;
+      if (body instanceof Blob) {
+        try {
+          const parsed = JSON.parse(await body.text());
+          message = [...(parsed.errors || []), parsed.error].filter(Boolean).join('; ') || message;
+        } catch {
+          // Not JSON: keep the HTTP error message
+        }
+      }
+      throw new Error(`Failed to download invoice: ${message}`);
+    }
+  },
+
+  // Search the invoice register one page at a time
+  async listInvoices(
+    filters: {
+      invoice_no?: string;
+      client?: string;
+      bo_no?: string;
+      month_from?: string;
+      month_to?: string;
+      date_from?: string;
+      date_to?: string;
+    } = {},
+    limit: number = 50,
+    offset: number = 0
+  ): Promise<{ invoices: { [key: string]: any }[]; total: number }> {
+    try {
+      const response = await axiosInstance.get('/api/invoices', {
+        params: { ...filters, limit, offset },
+      });
+      return {
+        invoices: response.data.invoices || [],
+        total: response.data.total || 0,
+      };
+    } catch (error) {
+      throw new Error(`Failed to load invoices: ${error instanceof Error ? error.message : 'Unknown error'}`);
+    }
+  },
+
+  // Queue a batch of invoices (rows or a CSV/XLSX file); returns the job to poll
+  async submitInvoiceBatchJob(invoices: { [key: string]: any }[] | File): Promise<Job> {
+    try {
+      let response;
+      if (invoices instanceof File) {
+        const form = new FormData();
+        form.append('file', invoices);
+        response = await axiosInstance.post('/api/jobs/invoice-batch', form, {
+          headers: { 'Content-Type': 'multipart/form-data' },
+        });
+      } else {
+        response = await axiosInstance.post('/api/jobs/invoice-batch', invoices);
+      }
+      return response.data.job;
+    } catch (error) {
+      throw new Error(`Failed to queue invoice batch: ${error instanceof Error ? error.message : 'Unknown error'}`);
+    }
+  },
+
+  // Queue BO PDF parsing for a zip or several PDFs; returns the job to poll
+  async submitBoIngestJob(files: File[]): Promise<Job> {
+    try {
+      const form = new FormData();
+      files.forEach((file) => form.append('files', file));
+      const response = await axiosInstance.post('/api/jobs/bo-ingest', form, {
+        headers: { 'Content-Type': 'multipart/form-data' },
+      });
+      return response.data.job;
+    } catch (error) {
+      throw new Error(`Failed to queue BO ingestion: ${error instanceof Error ? error.message : 'Unknown error'}`);
+    }
+  },
+
+  // Queue a register export; download it with jobDownloadUrl once it succeeds
+  async submitRegisterExportJob(): Promise<Job> {
+    try {
+      const response = await axiosInstance.post('/api/jobs/register-export');
+      return response.data.job;
+    } catch (error) {
+      throw new Error(`Failed to queue register export: ${error instanceof Error ? error.message : 'Unknown error'}`);
+    }
+  },
+
+  // Queue PDF conversion of saved invoices; download the .zip with jobDownloadUrl once it finishes
+  async submitInvoicePdfJob(invoiceNos: string[]): Promise<Job> {
+    try {
+      const response = await axiosInstance.post('/api/jobs/invoice-pdf', { invoice_nos: invoiceNos });
+      return response.data.job;
+    } catch (error) {
+      throw new Error(`Failed to queue PDF conversion: ${error instanceof Error ? error.message : 'Unknown error'}`);
+    }
+  },
+
+  // URL of a saved invoice rendered as PDF
+  invoicePdfUrl(invoiceNo: string): string {
+    return `${BASE_URL}/api/invoices/${encodeURIComponent(invoiceNo)}/pdf`;
+  },
+
+  // Get a job's progress, optionally with one page of per-item results
+  async getJob(
+    jobId: string,
+    results?: { status?: JobItem['status']; limit?: number; offset?: number }
+  ): Promise<{ job: Job; results?: JobItem[] }> {
+    try {
+      const response = await axiosInstance.get(`/api/jobs/${jobId}`, {
+        params: results ? { results: 1, ...results } : {},
+      });
+      return response.data;
+    } catch (error) {
+      throw new Error(`Failed to load job: ${error instanceof Error ? error.message : 'Unknown error'}`);
+    }
+  },
+
+  // Poll a job until it finishes, reporting progress along the way
+  async pollJob(jobId: string, onProgress?: (job: Job) => void, intervalMs: number = 1000): Promise<Job> {
+    for (;;) {
+      const { job } = await apiClient.getJob(jobId);
+      onProgress?.(job);
+      if (FINISHED_JOB_STATUSES.includes(job.status)) {
+        return job;
+      }
+      await sleep(intervalMs);
+    }
+  },
+
+  // Cancel the items of a job that have not started yet
+  async cancelJob(jobId: string): Promise<Job> {
+    try {
+      const response = await axiosInstance.post(`/api/jobs/${jobId}/cancel`);
+      return response.data.job;
+    } catch (error) {
+      throw new Error(`Failed to cancel job: ${error instanceof Error ? error.message : 'Unknown error'}`);
+    }
+  },
+
+  // Queue a job's failed items again
+  async retryJob(jobId: string): Promise<Job> {
+    try {
+      const response = await axiosInstance.post(`/api/jobs/${jobId}/retry`);
+      return response.data.job;
+    } catch (error) {
+      throw new Error(`Failed to retry job: ${error instanceof Error ? error.message : 'Unknown error'}`);
+    }
+  },
+
+  // URL of the file produced by a finished export or PDF job
+  jobDownloadUrl(jobId: string): string {
+    return `${BASE_URL}/api/jobs/${jobId}/download`;
+  },
+
   // Get next invoice number
   async getNextInvoiceNumber(): Promise<string> {
     try {
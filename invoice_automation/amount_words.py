@@ -0,0 +1,127 @@
+"""
+Amount-to-words conversion for invoice totals
+Word tables for 0-999 are built once; larger numbers are spelled group by
+group (thousands, millions, billions) and memoized
+"""
+
+from functools import lru_cache
+
+
+# Currency code -> (major unit name, minor unit name, minor units per major)
+CURRENCIES = {
+    'USD': ('Dollars', 'Cents', 100),
+    'AED': ('Dirhams', 'Fils', 100),
+    'SAR': ('Riyals', 'Halalas', 100),
+    'QAR': ('Riyals', 'Dirhams', 100),
+    'EUR': ('Euros', 'Cents', 100),
+    'GBP': ('Pounds', 'Pence', 100),
+    'KWD': ('Dinars', 'Fils', 1000),
+    'BHD': ('Dinars', 'Fils', 1000),
+    'OMR': ('Rials', 'Baisa', 1000),
+}
+
+WORDS_CACHE_SIZE = 65536
+
+_TO19 = ['Zero','One','Two','Three','Four','Five','Six','Seven','Eight','Nine','Ten','Eleven','Twelve','Thirteen','Fourteen','Fifteen','Sixteen','Seventeen','Eighteen','Nineteen']
+_TENS = ['','','Twenty','Thirty','Forty','Fifty','Sixty','Seventy','Eighty','Ninety']
+_GROUPS = [(10**6, 'Million'), (1000, 'Thousand')]
+_BILLION = 10**9
+
+
+def _build_below_1000():
+    """Words for every number from 0 to 999"""
+    below_100 = list(_TO19)
+    for num in range(20, 100):
+        below_100.append(_TENS[num // 10] + ('' if num % 10 == 0 else ' ' + _TO19[num % 10]))
+    table = list(below_100)
+    for num in range(100, 1000):
+        rest = num % 100
+        table.append(_TO19[num // 100] + ' Hundred' + ('' if rest == 0 else ' ' + below_100[rest]))
+    return table
+
+
+_BELOW_1000 = _build_below_1000()
+
+
+def _below_billion(num):
+    """Words for 1 <= num < 1 billion"""
+    parts = []
+    for size, name in _GROUPS:
+        if num >= size:
+            group, num = divmod(num, size)
+            parts.append(f"{_BELOW_1000[group]} {name}")
+    if num:
+        parts.append(_BELOW_1000[num])
+    return ' '.join(parts)
+
+
+@lru_cache(maxsize=WORDS_CACHE_SIZE)
+def int_to_words(n):
+    """
+    Convert a non-negative integer to words
+
+    Beyond 999 billion the billion scale repeats (1000 billion is "One
+    Thousand Billion"), as the invoices have always printed it.
+    """
+    if n < 1000:
+        return _BELOW_1000[n]
+
+    # Split into billion-sized chunks, lowest first
+    chunks = []
+    while n >= _BILLION:
+        n, chunk = divmod(n, _BILLION)
+        chunks.append(chunk)
+
+    # The top chunk, then " Billion" plus each lower chunk in turn
+    text = _below_billion(n)
+    for chunk in reversed(chunks):
+        text += ' Billion' + (' ' + _below_billion(chunk) if chunk else '')
+    return text
+
+
+def amount_in_words(total_minor, currency='USD'):
+    """
+    Uppercase wording for an amount given in minor units (e.g. cents)
+
+    Args:
+        total_minor: Amount in whole minor units
+        currency: Currency code from CURRENCIES
+
+    Returns:
+        Text like "FOUR THOUSAND DOLLARS AND TWENTY FIVE CENTS"
+    """
+    try:
+        major_name, minor_name, minor_units = CURRENCIES[currency]
+    except KeyError:
+        raise ValueError(f"Unsupported currency: {currency}")
+
+    major, minor = divmod(abs(int(total_minor)), minor_units)
+    words_parts = []
+    if major == 0:
+        words_parts.append(f"Zero {major_name}")
+    else:
+        words_parts.append(f"{int_to_words(major)} {major_name}")
+    if minor > 0:
+        words_parts.append(f"and {int_to_words(minor)} {minor_name}")
+    return ' '.join(words_parts).upper()
+
+
+def amounts_in_words(totals_minor, currency='USD'):
+    """
+    Batch amount_in_words over a column of amounts in minor units
+
+    Each distinct amount is spelled once; missing values stay missing.
+
+    Args:
+        totals_minor: List, array or Series of amounts in minor units
+        currency: Currency code from CURRENCIES
+
+    Returns:
+        Series of wordings, indexed like the input when it is a Series
+    """
+    import pandas as pd
+
+    totals = totals_minor if isinstance(totals_minor, pd.Series) else pd.Series(totals_minor)
+    unique = totals.dropna().unique()
+    wording = {value: amount_in_words(value, currency) for value in unique}
+    return totals.map(wording)
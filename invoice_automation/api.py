@@ -3,24 +3,132 @@ Flask API wrapper for Invoice Template Automation
 Provides REST endpoints for the React frontend
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify, Response, send_file, stream_with_context
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
+import io
 import json
+import math
 import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
 from datetime import datetime, timedelta
-import math
-from config import INVOICE_FIELDS
-from excel_handler import ExcelHandler
-from validator import InvoiceValidator
-from client_manager import ClientManager
+from config import INVOICE_NUMBER_PREFIX, TEMPLATE_FILE
+from excel_handler import ExcelHandler, invoice_filename
+from invoice_batch import read_invoice_rows, render_invoices
+from invoice_totals import calculate_line_items, calculate_totals, calculate_totals_batch
+from bo_ingest import find_bo_pdfs, get_executor as get_bo_executor, ingest_bo_pdfs
+from validator import compiled_validator
+from client_manager import create_client_manager
+from invoice_register import InvoiceRegister
+from invoice_pdf import compile_layout, invoice_pdf_bytes, pdf_filename
+from job_queue import JobQueue, job_folder, start_workers
+import metrics
+from config import JOBS_FOLDER, JOB_WORKERS
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['Content-Disposition', 'X-Output-Path'])
+# Job worker processes started on the first submitted job (see create_app)
+app.config['JOB_WORKERS'] = JOB_WORKERS
+
+
+class _OnFirstUse:
+    """
+    Shared object created by ``factory`` the first time it is used
+
+    Opening the SQLite stores migrates them (and a fresh register imports
+    the Excel register), which belongs in warm_up() or the first request,
+    not in ``import api``.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+# Initialize handlers. Invoices are rendered with a per-request ExcelHandler
+# (see _new_excel_handler); the client manager and compiled_validator are
+# shared and thread-safe.
+client_manager = _OnFirstUse(create_client_manager)
+invoice_register = _OnFirstUse(InvoiceRegister)
+job_queue = _OnFirstUse(JobQueue)
+
+
+def _new_excel_handler():
+    """Create a request-scoped handler holding its own copy of the template"""
+    handler = ExcelHandler()
+    handler.load_template()
+    return handler
+
+
+def warm_up():
+    """Load the template cache, PDF layout and client store before the first request"""
+    _new_excel_handler()
+    compile_layout(TEMPLATE_FILE)
+    client_manager.get_all_clients()
+    client_manager.get_next_invoice_number()
+    invoice_register.get_invoice('')
+    job_queue.get_job('')
 
-# Initialize handlers
-excel_handler = ExcelHandler()
-validator = InvoiceValidator()
-client_manager = ClientManager()
+
+def create_app(job_workers=JOB_WORKERS, warm=True):
+    """
+    Configure the API for serving and return the WSGI app
+
+    Args:
+        job_workers: Job worker processes this process may start (0 when the
+            server runs them once for all API workers)
+        warm: Load templates and stores now instead of on the first request
+
+    Returns:
+        The Flask app
+    """
+    app.config['JOB_WORKERS'] = job_workers
+    if warm:
+        warm_up()
+    return app
+
+
+@app.before_request
+def _start_request_timer():
+    """Note when the request started, for the request latency histogram"""
+    if metrics.enabled():
+        g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    """Count the request and observe its latency"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        metrics.observe_request(
+            request.endpoint or 'unmatched', request.method, response.status_code, time.perf_counter() - start
+        )
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request and pipeline stage metrics in the Prometheus text format"""
+    if not metrics.enabled():
+        return jsonify({'error': 'Metrics are disabled (METRICS_ENABLED)'}), 404
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 @app.route('/', methods=['GET'])
@@ -31,41 +139,63 @@ def index():
         'version': '1.0.0',
         'endpoints': {
             '/health': 'Health check',
+            '/metrics': 'Request counts, latencies and save pipeline stage timings (Prometheus text format)',
             '/api/invoice/initial': 'Get initial invoice data',
-            '/api/clients': 'Get all clients',
+            '/api/clients': 'Get all clients (or a page with ?q=&limit=&offset=)',
             '/api/clients/add': 'Add new client (POST)',
             '/api/invoice/next-number': 'Get next invoice number',
             '/api/invoice/validate': 'Validate invoice (POST)',
-            '/api/invoice/save': 'Save invoice (POST)'
+            '/api/invoice/save': 'Save invoice (POST)',
+            '/api/invoice/download': 'Render invoice and return the .xlsx (POST, ?persist=1 also saves it, ?format=pdf returns a PDF)',
+            '/api/invoice/batch': 'Generate many invoices from JSON or CSV/XLSX (POST)',
+            '/api/bo/ingest': 'Parse a zip or several BO PDFs, streamed as JSON Lines (POST)',
+            '/api/invoices': 'Search the invoice register (?invoice_no=&client=&bo_no=&month_from=&month_to=&date_from=&date_to=&limit=&offset=)',
+            '/api/invoices/<invoice_no>': 'Get one invoice from the register',
+            '/api/invoices/<invoice_no>/pdf': 'Download a saved invoice as PDF',
+            '/api/invoices/export': 'Download the register as Yazle_Invoices_List.xlsx',
+            '/api/jobs/invoice-batch': 'Queue a batch (same input as /api/invoice/batch) and return a job id (POST)',
+            '/api/jobs/bo-ingest': 'Queue BO PDF parsing (same upload as /api/bo/ingest) and return a job id (POST)',
+            '/api/jobs/register-export': 'Queue a register export and return a job id (POST)',
+            '/api/jobs/invoice-pdf': 'Queue PDF conversion of saved invoices ({"invoice_nos": [...]}) and return a job id (POST)',
+            '/api/jobs': 'List recent jobs',
+            '/api/jobs/<job_id>': 'Job progress (?results=1&status=&limit=&offset= for per-item results)',
+            '/api/jobs/<job_id>/cancel': 'Cancel the items not yet started (POST)',
+            '/api/jobs/<job_id>/retry': 'Queue the failed items again (POST)',
+            '/api/jobs/<job_id>/download': 'Download the file produced by an export job (a .zip of PDFs for PDF jobs)'
         }
     })
 
-# Load template data on startup
-try:
-    excel_handler.load_template()
-    current_template_data = excel_handler.get_all_template_values()
-except Exception as e:
-    print(f"Error loading template: {e}")
-    current_template_data = {}
-
-
 @app.route('/api/invoice/initial', methods=['GET'])
 def get_initial_data():
     """Get initial invoice data from template"""
     try:
-        return jsonify(current_template_data)
+        # The template is parsed on first use (or by warm_up) and cached by modification time
+        return jsonify(_new_excel_handler().get_all_template_values())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/clients', methods=['GET'])
 def get_clients():
-    """Get all available clients"""
+    """Get all available clients, or one page of matches when q/limit/offset are given"""
     try:
-        clients = client_manager.get_all_clients()
+        if not any(arg in request.args for arg in ('q', 'limit', 'offset')):
+            return jsonify({'clients': client_manager.get_clients_with_addresses()})
+
+        try:
+            limit = int(request.args.get('limit', 50))
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return jsonify({'error': 'limit and offset must be integers'}), 400
+        limit = max(1, min(limit, 500))
+        offset = max(0, offset)
+
+        clients, total = client_manager.search_clients(request.args.get('q', ''), limit=limit, offset=offset)
         return jsonify({
-            'clients': [{'name': name, 'address': client_manager.get_client_address(name)} 
-                       for name in clients]
+            'clients': clients,
+            'total': total,
+            'limit': limit,
+            'offset': offset
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -106,11 +236,12 @@ def validate_invoice():
     try:
         data = request.get_json()
         
-        if not validator.validate_all(data):
-            errors = validator.get_errors()
+        errors = compiled_validator.validate(data)
+        if errors:
             return jsonify({
                 'valid': False,
-                'errors': errors
+                'errors': [error['message'] for error in errors],
+                'details': errors
             })
         
         return jsonify({'valid': True})
@@ -118,23 +249,171 @@ def validate_invoice():
         return jsonify({'error': str(e)}), 500
 
 
-def _int_to_words(n):
-    """Convert integer to words"""
-    to19 = ['Zero','One','Two','Three','Four','Five','Six','Seven','Eight','Nine','Ten','Eleven','Twelve','Thirteen','Fourteen','Fifteen','Sixteen','Seventeen','Eighteen','Nineteen']
-    tens = ['','','Twenty','Thirty','Forty','Fifty','Sixty','Seventy','Eighty','Ninety']
+def _check_required(form_data, require_invoice_no=True):
+    """Check that the required fields are filled in
+
+    Returns a list of error messages.
+    """
+    # Fields that must be present
+    required_fields = ['invoice_no', 'client_name', 'date', 'description', 'quantity', 'rate']
+    if not require_invoice_no:
+        required_fields.remove('invoice_no')
+
+    line_items = form_data.get('line_items')
+    if line_items:
+        # Description, quantity and rate come from the items
+        if not isinstance(line_items, list) or not all(isinstance(item, dict) for item in line_items):
+            return ["line_items must be a list of objects"]
+        required_fields = [field for field in required_fields if field not in ('description', 'quantity', 'rate')]
+        for number, item in enumerate(line_items, 1):
+            missing = [field for field in ('description', 'quantity', 'rate') if not item.get(field)]
+            if missing:
+                return [f"Line item {number}: missing {', '.join(missing)}"]
+
+    # Check required fields
+    missing_fields = []
+    for field in required_fields:
+        if field not in form_data or not form_data[field]:
+            missing_fields.append(field)
+
+    if missing_fields:
+        return [f"Missing required fields: {', '.join(missing_fields)}"]
+    return []
+
+
+def _fill_due_date(form_data):
+    """Set the due date (date + 30 days) in place
+
+    Returns a list of error messages.
+    """
+    date_str = form_data.get('date', '')
+    if date_str:
+        try:
+            parsed = datetime.strptime(date_str, "%d/%m/%Y")
+            due_dt = parsed + timedelta(days=30)
+            due_str = due_dt.strftime("%d/%m/%Y")
+            form_data['due_date'] = due_str
+        except Exception as e:
+            return [f"Invalid date format. Use DD/MM/YYYY: {str(e)}"]
+
+    return []
+
+
+def _check_invoice(form_data, require_invoice_no=True):
+    """Check required fields and fill in the due date in place
+
+    Returns a list of error messages.
+    """
+    return _check_required(form_data, require_invoice_no) or _fill_due_date(form_data)
+
+
+def _vat_percent(form_data):
+    """VAT percentage for the submitted vat_rate option"""
+    vat_rate_str = str(form_data.get('vat_rate', 'non-GCC (0%)'))
+    return 5 if 'GCC' in vat_rate_str else 0
+
+
+def _apply_totals(form_data, totals, vat_percent):
+    """Write calculated amounts (from invoice_totals) into the invoice data"""
+    form_data['budget'] = float(totals['budget'])
+    form_data['vat_amount'] = float(totals['vat_amount'])
+    form_data['vat_rate'] = f"VAT({vat_percent}%)"
+    form_data['total_amount'] = float(totals['total_amount'])
+    form_data['total_in_words'] = totals['total_in_words']
+
+
+def _fill_totals(form_data):
+    """Fill in budget, VAT, total and total in words in place
+
+    Returns a list of error messages.
+    """
+    line_items = form_data.get('line_items')
+    try:
+        vat_percent = _vat_percent(form_data)
+        if line_items:
+            totals = calculate_line_items(line_items, vat_percent)
+        else:
+            totals = calculate_totals(
+                form_data.get('quantity', 0) or 0,
+                form_data.get('rate', 0) or 0,
+                vat_percent,
+            )
+    except Exception as e:
+        return [f"Error calculating fields: {str(e)}"]
+
+    _apply_totals(form_data, totals, vat_percent)
+    if line_items:
+        form_data['line_items'] = totals['items']
+        # The register and validator read the first item as the invoice line
+        for field in ('description', 'quantity', 'rate'):
+            if not form_data.get(field):
+                form_data[field] = line_items[0][field]
+    return []
+
+
+def _prepare_invoice(form_data, require_invoice_no=True):
+    """Check required fields and fill in calculated fields in place
+
+    Returns a list of error messages (empty when the invoice is ready to save).
+    """
+    return _check_invoice(form_data, require_invoice_no) or _fill_totals(form_data)
 
-    def words(num):
-        if num < 20:
-            return to19[num]
-        if num < 100:
-            return tens[num//10] + ('' if num%10==0 else ' ' + to19[num%10])
-        if num < 1000:
-            return to19[num//100] + ' Hundred' + ('' if num%100==0 else ' ' + words(num%100))
-        for p, w in [(10**9, 'Billion'), (10**6, 'Million'), (1000, 'Thousand')]:
-            if num >= p:
-                return words(num//p) + ' ' + w + ('' if num%p==0 else ' ' + words(num%p))
-        return ''
-    return words(n)
+
+def _prepare_invoice_timed(form_data, endpoint, require_invoice_no=True):
+    """_prepare_invoice with each step timed as a stage of ``endpoint``"""
+    steps = (
+        ('validate', lambda data: _check_required(data, require_invoice_no)),
+        ('date_math', _fill_due_date),
+        ('totals', _fill_totals),
+    )
+    for name, step in steps:
+        with metrics.stage(endpoint, name):
+            errors = step(form_data)
+        if errors:
+            metrics.count_error(endpoint, name)
+            return errors
+    return []
+
+
+def _prepare_invoices(rows, require_invoice_no=True):
+    """Batch version of _prepare_invoice for a list of invoice dicts
+
+    Field checks run per row; the amounts for every valid row are computed
+    in one vectorized pass.
+
+    Returns:
+        List with the error messages for each row (empty when ready)
+    """
+    errors = [_check_invoice(row, require_invoice_no) for row in rows]
+    ready = []
+    for index, row_errors in enumerate(errors):
+        if row_errors:
+            continue
+        if rows[index].get('line_items'):
+            errors[index] = _fill_totals(rows[index])
+        else:
+            ready.append(index)
+    if not ready:
+        return errors
+
+    vat_percents = [_vat_percent(rows[index]) for index in ready]
+    frame = calculate_totals_batch(
+        [rows[index].get('quantity', 0) or 0 for index in ready],
+        [rows[index].get('rate', 0) or 0 for index in ready],
+        vat_percents,
+    )
+    for index, vat_percent, totals in zip(ready, vat_percents, frame.to_dict('records')):
+        if math.isnan(totals['total_amount']):
+            errors[index] = ["Error calculating fields: quantity and rate must be numbers"]
+            continue
+        _apply_totals(rows[index], totals, vat_percent)
+    return errors
+
+
+def _number_taken(invoice_no):
+    """Error for a submitted invoice number that is not the next one to issue"""
+    return (f"Invoice number {invoice_no} is already issued or is not the next number "
+            f"({INVOICE_NUMBER_PREFIX}{client_manager.get_next_invoice_number()})")
 
 
 @app.route('/api/invoice/save', methods=['POST'])
@@ -142,87 +421,46 @@ def save_invoice():
     """Save invoice to template"""
     try:
         form_data = request.get_json()
-        
-        # Fields that must be present
-        required_fields = ['invoice_no', 'client_name', 'date', 'description', 'quantity', 'rate']
-        
-        # Check required fields
-        missing_fields = []
-        for field in required_fields:
-            if field not in form_data or not form_data[field]:
-                missing_fields.append(field)
-        
-        if missing_fields:
+
+        # invoice_no is optional: a blank one gets the next number, a given one
+        # (the previewed next number) must still be the next one (see below)
+        errors = _prepare_invoice_timed(form_data, 'save_invoice', require_invoice_no=False)
+        if errors:
             return jsonify({
                 'success': False,
-                'errors': [f"Missing required fields: {', '.join(missing_fields)}"]
+                'errors': errors
             }), 400
         
-        # Calculate due date (date + 30 days)
-        date_str = form_data.get('date', '')
-        if date_str:
-            try:
-                parsed = datetime.strptime(date_str, "%d/%m/%Y")
-                due_dt = parsed + timedelta(days=30)
-                due_str = due_dt.strftime("%d/%m/%Y")
-                form_data['due_date'] = due_str
-            except Exception as e:
-                return jsonify({
-                    'success': False,
-                    'errors': [f"Invalid date format. Use DD/MM/YYYY: {str(e)}"]
-                }), 400
-        
-        # Ensure calculated fields
-        try:
-            quantity = float(form_data.get('quantity', 0) or 0)
-            rate = float(form_data.get('rate', 0) or 0)
-            budget = (quantity * rate) / 1000
-            form_data['budget'] = budget
-            
-            # VAT calculation
-            vat_rate_str = form_data.get('vat_rate', 'non-GCC (0%)')
-            vat_percent = 5 if 'GCC' in vat_rate_str else 0
-            vat_amount = (budget * vat_percent) / 100
-            form_data['vat_amount'] = vat_amount
-            form_data['vat_rate'] = f"VAT({vat_percent}%)"
-            
-            # Total amount
-            total_amount = budget + vat_amount
-            form_data['total_amount'] = total_amount
-            
-            # Total in words
-            dollars = int(math.floor(abs(total_amount)))
-            cents = int(round((abs(total_amount) - dollars) * 100))
-            words_parts = []
-            if dollars == 0:
-                words_parts.append('Zero Dollars')
-            else:
-                words_parts.append(f"{_int_to_words(dollars)} Dollars")
-            if cents > 0:
-                words_parts.append(f"and {_int_to_words(cents)} Cents")
-            total_words = ' '.join(words_parts)
-            form_data['total_in_words'] = total_words.upper()
-        except Exception as e:
-            return jsonify({
-                'success': False,
-                'errors': [f"Error calculating fields: {str(e)}"]
-            }), 400
         
         # Save invoice
         try:
-            excel_handler.update_invoice(form_data)
-            inv_no = form_data.get('invoice_no', 'Invoice')
-            safe_name = str(inv_no).strip().replace('/', '-').replace('\n', '_')
-            filename = f"{safe_name}.xlsx"
-            
-            output_path = excel_handler.save_invoice(output_filename=filename)
+            # Claimed atomically, so concurrent saves (other threads, API workers or
+            # Streamlit sessions) never share a number; a failed save leaves a gap
+            with metrics.stage('save_invoice', 'allocate_number'):
+                invoice_no = client_manager.claim_invoice_number(form_data.get('invoice_no'))
+            if invoice_no is None:
+                return jsonify({'success': False, 'errors': [_number_taken(form_data['invoice_no'])]}), 409
+            form_data['invoice_no'] = invoice_no
+
+            # Each request fills its own copy of the template
+            with metrics.stage('save_invoice', 'load_template'):
+                excel_handler = _new_excel_handler()
+            with metrics.stage('save_invoice', 'update_invoice'):
+                excel_handler.update_invoice(form_data)
+            filename = invoice_filename(form_data.get('invoice_no', 'Invoice'))
             
-            # Increment invoice number
-            client_manager.increment_invoice_number()
+            with metrics.stage('save_invoice', 'serialize'):
+                data = excel_handler.render_bytes()
+            with metrics.stage('save_invoice', 'write'):
+                output_path = excel_handler.save_invoice(output_filename=filename, data=data)
+            with metrics.stage('save_invoice', 'register'):
+                invoice_register.record_invoice(form_data, output_path)
+            metrics.count_invoices('save_invoice')
             
             return jsonify({
                 'success': True,
                 'message': 'Invoice saved successfully',
+                'invoice_no': form_data['invoice_no'],
                 'output_path': output_path
             })
         except Exception as e:
@@ -238,6 +476,495 @@ def save_invoice():
         }), 500
 
 
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PDF_MIMETYPE = 'application/pdf'
+
+
+@app.route('/api/invoice/download', methods=['POST'])
+def download_invoice():
+    """Render invoice in memory and return it as an .xlsx (or, with ?format=pdf, PDF) attachment"""
+    try:
+        form_data = request.get_json()
+
+        # Writing to OUTPUT_FOLDER is opt-in; by default nothing touches disk,
+        # the counter or the register, and the request's number is used as is.
+        # A persisted download issues its number like a save does
+        persist = str(request.args.get('persist', '')).lower() in ('1', 'true', 'yes')
+        as_pdf = str(request.args.get('format', 'xlsx')).lower() == 'pdf'
+
+        errors = _prepare_invoice_timed(form_data, 'download_invoice', require_invoice_no=not persist)
+        if errors:
+            return jsonify({
+                'success': False,
+                'errors': errors
+            }), 400
+
+        try:
+            if persist:
+                with metrics.stage('download_invoice', 'allocate_number'):
+                    invoice_no = client_manager.claim_invoice_number(form_data.get('invoice_no'))
+                if invoice_no is None:
+                    return jsonify({'success': False, 'errors': [_number_taken(form_data['invoice_no'])]}), 409
+                form_data['invoice_no'] = invoice_no
+            with metrics.stage('download_invoice', 'load_template'):
+                excel_handler = _new_excel_handler()
+            with metrics.stage('download_invoice', 'update_invoice'):
+                excel_handler.update_invoice(form_data)
+            filename = invoice_filename(form_data.get('invoice_no', 'Invoice'))
+            with metrics.stage('download_invoice', 'serialize'):
+                data = excel_handler.render_bytes()
+
+            headers = {}
+            output_path = None
+            if persist:
+                with metrics.stage('download_invoice', 'write'):
+                    output_path = excel_handler.save_invoice(output_filename=filename, data=data)
+                headers['X-Output-Path'] = output_path
+                with metrics.stage('download_invoice', 'register'):
+                    invoice_register.record_invoice(form_data, output_path)
+
+            mimetype = XLSX_MIMETYPE
+            if as_pdf:
+                with metrics.stage('download_invoice', 'pdf'):
+                    data = invoice_pdf_bytes(io.BytesIO(data), excel_handler.template_path)
+                filename = pdf_filename(filename)
+                mimetype = PDF_MIMETYPE
+            metrics.count_invoices('download_invoice')
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'errors': [f"Error rendering invoice: {str(e)}"]
+            }), 500
+
+        response = send_file(
+            io.BytesIO(data),
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=filename,
+        )
+        response.headers.update(headers)
+        return response
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f"Unexpected error: {str(e)}"
+        }), 500
+
+
+def _read_batch_rows():
+    """
+    Read batch rows from a JSON array or an uploaded CSV/XLSX file
+
+    Returns:
+        Tuple of (rows, None) or (None, error response)
+    """
+    if 'file' in request.files:
+        upload = request.files['file']
+        try:
+            rows = read_invoice_rows(upload.filename, upload.stream)
+        except ValueError as e:
+            return None, (jsonify({'success': False, 'errors': [str(e)]}), 400)
+    else:
+        payload = request.get_json(silent=True)
+        rows = payload.get('invoices') if isinstance(payload, dict) else payload
+
+    if not isinstance(rows, list) or not rows:
+        return None, (jsonify({
+            'success': False,
+            'errors': ['Provide a JSON array of invoices or a CSV/XLSX file']
+        }), 400)
+    return rows, None
+
+
+def _prepare_batch(rows):
+    """
+    Validate, total and number batch rows
+
+    Returns:
+        Tuple of (results, jobs): ``results`` holds a failure dict for each
+        invalid row and None for the rest; ``jobs`` lists (row index,
+        prepared data, output filename) for every valid row
+    """
+    results = [None] * len(rows)
+    objects = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[index] = {'row': index, 'success': False, 'errors': ['Invoice row must be an object']}
+            continue
+        objects.append(index)
+
+    ready = []
+    row_errors = _prepare_invoices([rows[index] for index in objects], require_invoice_no=False)
+    for index, errors in zip(objects, row_errors):
+        if errors:
+            results[index] = {'row': index, 'success': False, 'invoice_no': rows[index].get('invoice_no'), 'errors': errors}
+            continue
+        ready.append(index)
+
+    # Rows with a number issue it as a save does (it must be the next one when
+    # its turn comes); the rest are numbered from a single reserved block
+    numbered = [index for index in ready if rows[index].get('invoice_no')]
+    for index in numbered:
+        invoice_no = client_manager.claim_invoice_number(rows[index]['invoice_no'])
+        if invoice_no is None:
+            results[index] = {'row': index, 'success': False, 'invoice_no': rows[index]['invoice_no'],
+                              'errors': [_number_taken(rows[index]['invoice_no'])]}
+            continue
+        rows[index]['invoice_no'] = invoice_no
+    unnumbered = [index for index in ready if not rows[index].get('invoice_no')]
+    numbers = client_manager.reserve_invoice_numbers(len(unnumbered))
+    for index, number in zip(unnumbered, numbers):
+        rows[index]['invoice_no'] = f"{INVOICE_NUMBER_PREFIX}{number}"
+
+    jobs = [(index, rows[index], invoice_filename(rows[index]['invoice_no']))
+            for index in ready if results[index] is None]
+    return results, jobs
+
+
+@app.route('/api/invoice/batch', methods=['POST'])
+def batch_invoices():
+    """Generate many invoices from a JSON array or an uploaded CSV/XLSX file"""
+    try:
+        rows, error_response = _read_batch_rows()
+        if error_response:
+            return error_response
+
+        with metrics.stage('batch_invoices', 'prepare'):
+            results, jobs = _prepare_batch(rows)
+        with metrics.stage('batch_invoices', 'render'):
+            for result in render_invoices(jobs):
+                results[result['row']] = result
+        saved = [result for result in results if result['success']]
+        with metrics.stage('batch_invoices', 'register'):
+            invoice_register.record_invoices(
+                [rows[result['row']] for result in saved],
+                [result['output_path'] for result in saved],
+            )
+
+        succeeded = sum(1 for result in results if result['success'])
+        metrics.count_invoices('batch_invoices', succeeded)
+        return jsonify({
+            'success': succeeded == len(rows),
+            'total': len(rows),
+            'succeeded': succeeded,
+            'failed': len(rows) - succeeded,
+            'results': results
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f"Unexpected error: {str(e)}"
+        }), 500
+
+
+@app.route('/api/invoices', methods=['GET'])
+def list_invoices():
+    """Search the invoice register with filters and paging"""
+    try:
+        try:
+            limit = int(request.args.get('limit', 50))
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return jsonify({'error': 'limit and offset must be integers'}), 400
+        limit = max(1, min(limit, 500))
+        offset = max(0, offset)
+
+        filters = {
+            key: request.args.get(key)
+            for key in ('invoice_no', 'client', 'bo_no', 'month_from', 'month_to', 'date_from', 'date_to')
+            if request.args.get(key)
+        }
+        try:
+            invoices, total = invoice_register.search(limit=limit, offset=offset, **filters)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({
+            'invoices': invoices,
+            'total': total,
+            'limit': limit,
+            'offset': offset
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/export', methods=['GET'])
+def export_invoices():
+    """Download the whole register as an .xlsx workbook"""
+    try:
+        buffer = io.BytesIO()
+        invoice_register.export_xlsx(buffer)
+        buffer.seek(0)
+        return send_file(
+            buffer,
+            mimetype=XLSX_MIMETYPE,
+            as_attachment=True,
+            download_name=os.path.basename(invoice_register.register_file),
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/<path:invoice_no>', methods=['GET'])
+def get_invoice(invoice_no):
+    """Get one invoice from the register"""
+    try:
+        invoice = invoice_register.get_invoice(invoice_no)
+        if invoice is None:
+            return jsonify({'error': f"Invoice not found: {invoice_no}"}), 404
+        return jsonify({'invoice': invoice})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/invoices/<path:invoice_no>/pdf', methods=['GET'])
+def get_invoice_pdf(invoice_no):
+    """Render a saved invoice from the register as PDF"""
+    try:
+        invoice = invoice_register.get_invoice(invoice_no)
+        if invoice is None:
+            return jsonify({'error': f"Invoice not found: {invoice_no}"}), 404
+        output_path = invoice.get('output_path')
+        if not output_path or not os.path.exists(output_path):
+            return jsonify({'error': f"No saved file for invoice: {invoice_no}"}), 404
+        return send_file(
+            io.BytesIO(invoice_pdf_bytes(output_path)),
+            mimetype=PDF_MIMETYPE,
+            as_attachment=True,
+            download_name=pdf_filename(output_path),
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/bo/ingest', methods=['POST'])
+def ingest_bos():
+    """Parse an uploaded zip of BO PDFs (or several PDFs) and stream one JSON line per file"""
+    uploads = request.files.getlist('file') + request.files.getlist('files')
+    if not uploads:
+        return jsonify({'success': False, 'errors': ['Upload a .zip of BO PDFs or one or more PDFs']}), 400
+    include_text = request.args.get('include_text', '').lower() in ('1', 'true', 'yes')
+
+    tmp_dir = tempfile.mkdtemp(prefix='bo_ingest_')
+    try:
+        saved = []
+        for index, upload in enumerate(uploads):
+            filename = secure_filename(upload.filename or '') or f"upload_{index}.pdf"
+            path = os.path.join(tmp_dir, filename)
+            upload.save(path)
+            saved.append(path)
+        source = saved[0] if len(saved) == 1 else tmp_dir
+    except Exception as e:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return jsonify({'success': False, 'errors': [f"Error receiving upload: {str(e)}"]}), 500
+
+    def generate():
+        try:
+            # One spawned pool per API worker, shared by concurrent uploads
+            for result in ingest_bo_pdfs(source, include_text=include_text, executor=get_bo_executor()):
+                # Report uploaded files by name, not by their temporary path
+                if result['file'].startswith(tmp_dir):
+                    result['file'] = os.path.relpath(result['file'], tmp_dir)
+                yield json.dumps(result, default=str) + '\n'
+        except Exception as e:
+            yield json.dumps({'success': False, 'error': str(e)}) + '\n'
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def _submit_job(kind, payloads, params=None, invalid=None):
+    """Queue a job, make sure workers are running and return the 202 response"""
+    job_id = job_queue.submit(kind, payloads, params, invalid)
+    start_workers(app.config['JOB_WORKERS'])
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'job': job_queue.get_job(job_id),
+        'status_url': f"/api/jobs/{job_id}"
+    }), 202
+
+
+@app.route('/api/jobs/invoice-batch', methods=['POST'])
+def queue_invoice_batch():
+    """Validate and number a batch now, render it in the background"""
+    try:
+        rows, error_response = _read_batch_rows()
+        if error_response:
+            return error_response
+
+        results, jobs = _prepare_batch(rows)
+        prepared = {index: (data, filename) for index, data, filename in jobs}
+        payloads = []
+        invalid = {}
+        for index, result in enumerate(results):
+            if result is not None:
+                payloads.append({'row': index, 'invoice_no': result.get('invoice_no')})
+                invalid[index] = '; '.join(result['errors'])
+            else:
+                data, filename = prepared[index]
+                payloads.append({'row': index, 'data': data, 'filename': filename})
+        return _submit_job('invoice_batch', payloads, invalid=invalid)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f"Unexpected error: {str(e)}"}), 500
+
+
+@app.route('/api/jobs/bo-ingest', methods=['POST'])
+def queue_bo_ingest():
+    """Store uploaded BO PDFs (or a zip of them) and parse them in the background"""
+    uploads = request.files.getlist('file') + request.files.getlist('files')
+    if not uploads:
+        return jsonify({'success': False, 'errors': ['Upload a .zip of BO PDFs or one or more PDFs']}), 400
+    include_text = request.args.get('include_text', '').lower() in ('1', 'true', 'yes')
+
+    os.makedirs(JOBS_FOLDER, exist_ok=True)
+    folder = tempfile.mkdtemp(prefix='bo_ingest_', dir=JOBS_FOLDER)
+    try:
+        for index, upload in enumerate(uploads):
+            filename = secure_filename(upload.filename or '') or f"upload_{index}.pdf"
+            upload.save(os.path.join(folder, filename))
+        payloads = []
+        for name in sorted(os.listdir(folder)):
+            for path, member in find_bo_pdfs(os.path.join(folder, name)):
+                payloads.append({'path': path, 'member': member, 'name': member or name})
+        if not payloads:
+            shutil.rmtree(folder, ignore_errors=True)
+            return jsonify({'success': False, 'errors': ['No PDF files found in the upload']}), 400
+        return _submit_job('bo_ingest', payloads, {'include_text': include_text, 'folder': folder})
+    except ValueError as e:
+        shutil.rmtree(folder, ignore_errors=True)
+        return jsonify({'success': False, 'errors': [str(e)]}), 400
+    except Exception as e:
+        shutil.rmtree(folder, ignore_errors=True)
+        return jsonify({'success': False, 'error': f"Unexpected error: {str(e)}"}), 500
+
+
+@app.route('/api/jobs/register-export', methods=['POST'])
+def queue_register_export():
+    """Export the register workbook in the background"""
+    try:
+        return _submit_job('register_export', [{}])
+    except Exception as e:
+        return jsonify({'success': False, 'error': f"Unexpected error: {str(e)}"}), 500
+
+
+@app.route('/api/jobs/invoice-pdf', methods=['POST'])
+def queue_invoice_pdf():
+    """Convert saved invoices from the register to PDF in the background"""
+    try:
+        invoice_nos = (request.get_json(silent=True) or {}).get('invoice_nos')
+        if not isinstance(invoice_nos, list) or not invoice_nos:
+            return jsonify({'success': False, 'errors': ['Send {"invoice_nos": [...]} with at least one number']}), 400
+
+        payloads = []
+        invalid = {}
+        for index, invoice_no in enumerate(invoice_nos):
+            invoice = invoice_register.get_invoice(str(invoice_no))
+            output_path = invoice.get('output_path') if invoice else None
+            payloads.append({'invoice_no': str(invoice_no), 'path': output_path})
+            if invoice is None:
+                invalid[index] = f"Invoice not found: {invoice_no}"
+            elif not output_path or not os.path.exists(output_path):
+                invalid[index] = f"No saved file for invoice: {invoice_no}"
+        return _submit_job('invoice_pdf', payloads, invalid=invalid)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f"Unexpected error: {str(e)}"}), 500
+
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """Most recent jobs with their progress"""
+    try:
+        try:
+            limit = max(1, min(int(request.args.get('limit', 20)), 200))
+            offset = max(0, int(request.args.get('offset', 0)))
+        except ValueError:
+            return jsonify({'error': 'limit and offset must be integers'}), 400
+        return jsonify({'jobs': job_queue.list_jobs(limit, offset)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job progress, plus a page of per-item results with ?results=1"""
+    try:
+        job = job_queue.get_job(job_id)
+        if job is None:
+            return jsonify({'error': f"Job not found: {job_id}"}), 404
+        response = {'job': job}
+        if request.args.get('results', '').lower() in ('1', 'true', 'yes'):
+            try:
+                limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+                offset = max(0, int(request.args.get('offset', 0)))
+            except ValueError:
+                return jsonify({'error': 'limit and offset must be integers'}), 400
+            response['results'] = job_queue.get_items(job_id, request.args.get('status'), limit, offset)
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel the items of a job that have not started yet"""
+    try:
+        cancelled = job_queue.cancel(job_id)
+        if cancelled is None:
+            return jsonify({'error': f"Job not found: {job_id}"}), 404
+        return jsonify({'success': True, 'cancelled': cancelled, 'job': job_queue.get_job(job_id)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    """Queue the failed items of a job again"""
+    try:
+        retried = job_queue.retry(job_id)
+        if retried is None:
+            return jsonify({'error': f"Job not found: {job_id}"}), 404
+        if retried:
+            start_workers(app.config['JOB_WORKERS'])
+        return jsonify({'success': True, 'retried': retried, 'job': job_queue.get_job(job_id)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>/download', methods=['GET'])
+def download_job_file(job_id):
+    """Download the workbook written by an export job, or the PDFs of a PDF job as a .zip"""
+    try:
+        job = job_queue.get_job(job_id)
+        if job is None:
+            return jsonify({'error': f"Job not found: {job_id}"}), 404
+        items = job_queue.get_items(job_id, status='succeeded', limit=max(job['succeeded'], 1))
+        if job['kind'] not in ('register_export', 'invoice_pdf') or not items:
+            return jsonify({'error': 'This job has no file to download'}), 404
+        if job['kind'] == 'invoice_pdf':
+            buffer = io.BytesIO()
+            # PDF streams are already compressed
+            with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+                for item in items:
+                    filename = item['result']['filename']
+                    archive.write(os.path.join(job_folder(job_id), filename), filename)
+            buffer.seek(0)
+            return send_file(buffer, mimetype='application/zip', as_attachment=True,
+                             download_name=f"invoices_{job_id}.zip")
+        filename = items[0]['result']['filename']
+        return send_file(
+            os.path.join(job_folder(job_id), filename),
+            mimetype=XLSX_MIMETYPE,
+            as_attachment=True,
+            download_name=filename,
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -245,4 +972,5 @@ def health_check():
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8000)
+    # Development server with the reloader; use `python server.py` in production
+    app.run(debug=True, host='0.0.0.0', port=8000, threaded=True)
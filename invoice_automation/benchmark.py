@@ -0,0 +1,705 @@
+"""
+Benchmarks for the invoice automation hot paths
+Every suite prints its numbers and records them for a JSON report, which
+can be checked against a stored baseline to catch regressions
+
+Usage:
+    python benchmark.py [suite ...] [--json FILE] [--baseline [FILE]] [--tolerance 0.5] [--runs N]
+    python benchmark.py --runs 3 --save-baseline    # store the best of three runs as the baseline
+"""
+
+import argparse
+import json
+import platform
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from openpyxl import load_workbook
+
+# Add the current directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bo_pdf_parser import BOPDFParser
+from bo_cache import BOParseCache
+from amount_words import amounts_in_words, int_to_words
+from bo_ingest import ingest_bo_pdfs, parse_bo_pdf_bytes
+from excel_handler import ExcelHandler, read_invoice_values, template_cache
+from invoice_indexer import InvoiceIndexer
+import invoice_pdf
+import metrics
+from invoice_register import InvoiceRegister
+from invoice_totals import calculate_totals, calculate_totals_batch
+from validator import InvoiceValidator, compiled_validator
+from config import OUTPUT_FOLDER
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# A run may be this much slower than the baseline before it counts as a regression;
+# millisecond timings on shared machines swing 30-50% between runs
+DEFAULT_TOLERANCE = 0.5
+
+# Times a suite is re-run while it still looks regressed
+CONFIRM_RUNS = 2
+
+# Heavy libraries the entry points may only import on the code path that needs them
+LAZY_MODULES = ('pandas', 'numpy', 'openpyxl', 'pypdf', 'PyPDF2', 'streamlit')
+
+# Cold import budgets (ms) of the entry points, checked by test_system.py
+IMPORT_BUDGETS = OrderedDict([
+    ('api', 600),
+    ('server', 300),
+    ('job_queue', 250),
+    ('invoice_pdf', 300),
+    ('bo_ingest', 300),
+])
+
+
+BO_HEADER = [
+    "MEDIA BOOKING ORDER",
+    "Attention: Yazle Marketing Management",
+    "Client: Unilever Master - GCC",
+    "Order No: PD25|2041|4",
+    "VAT REGISTRATION No. 100041432Z0003",
+    "Details | Volume | Date | Gross | Disc | Exp | Unit Cost | Net Cost | Taxes | Total Cost",
+]
+
+BO_PLACEMENTS = [
+    "Mixed Placement - ar, en - United Arab Emirates",
+    "Clickable In-Game Banners - - Saudi Arabia",
+    "Rewarded Video - en - Kuwait",
+    "Premium Display Placement - ar - Qatar",
+]
+
+
+def synthetic_bo_text(lines, seed=0):
+    """Build a BO-like text with the given number of placement rows"""
+    rng = random.Random(seed)
+    rows = list(BO_HEADER)
+    for _ in range(lines):
+        volume = rng.randint(1, 500) * 1000
+        unit_cost = rng.randint(100, 9999) / 100
+        rows.append(
+            f"{rng.choice(BO_PLACEMENTS)} | {volume:,} | 4th Sep - 30th Sep | "
+            f"{unit_cost:.2f} USD | {volume * unit_cost / 1000:,.2f} USD | 5% VAT"
+        )
+    return "\n".join(rows)
+
+
+def synthetic_bo_pdf(lines, seed=0, lines_per_page=60):
+    """Build a minimal multi-page text PDF holding a synthetic BO"""
+    text_lines = synthetic_bo_text(lines, seed).split('\n')
+    pages = [text_lines[i:i + lines_per_page] for i in range(0, len(text_lines), lines_per_page)]
+
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>", None]
+    kids = []
+    for page_lines in pages:
+        ops = ["BT /F1 8 Tf 11 TL 20 820 Td"]
+        for line in page_lines:
+            escaped = line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+            ops.append(f"({escaped}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 1 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, len(objects), xref)
+    return bytes(out)
+
+
+SAMPLE_INVOICE = {
+    'invoice_no': 'INV-BENCH-00001',
+    'client_name': 'Optimum Media Direction FZ-LLC',
+    'client_address': '401, Fourth Floor, OMD Building\nDubai Media City, Dubai\nUnited Arab Emirates',
+    'client_trn': '100041433200003',
+    'date': '20/01/2026',
+    'bo_no': 'OD25|25113|1',
+    'delivery_month': 'Oct-25',
+    'description': "APAC K-Celeb W2 Youku | Oct'2025",
+    'quantity': 172859,
+    'rate': 22.23,
+    'vat_rate': 'UAE GCC (5%)',
+}
+
+# Measurements of the current run: name -> {'value', 'unit', 'better', 'gate'}
+RESULTS = OrderedDict()
+
+
+def record(name, value, unit, better='lower', gate=True):
+    """
+    Keep one measurement for the report and the baseline check
+
+    Args:
+        name: Dotted metric name, e.g. 'bo_parser.lines_1000'
+        value: Measured value
+        unit: Unit shown in reports ('ms', 'files/s', ...)
+        better: 'lower' for times, 'higher' for throughputs
+        gate: False for figures too small or noisy to fail a run on
+            (they are still reported and compared)
+    """
+    RESULTS[name] = {'value': round(value, 6), 'unit': unit, 'better': better, 'gate': gate}
+    return value
+
+
+def timed(func, repeat):
+    """Best wall-clock time of ``repeat`` runs, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_bo_parser():
+    """Full BO extraction (all fields plus line items) on growing texts"""
+    print("📄 BOPDFParser.extract_all_data + extract_line_items")
+    for lines in (100, 1000, 10000, 50000):
+        text = synthetic_bo_text(lines)
+
+        def run():
+            parser = BOPDFParser(text)
+            parser.extract_all_data()
+            parser.extract_line_items()
+
+        elapsed = timed(run, repeat=5)
+        record(f"bo_parser.lines_{lines}", elapsed * 1000, 'ms')
+        print(f"   {lines:>6} lines: {elapsed * 1000:8.2f} ms  ({lines / elapsed:,.0f} lines/s)")
+
+
+def bench_bo_ingest(files=48, lines=120):
+    """Bulk BO PDF ingestion throughput against worker count"""
+    print(f"📥 bo_ingest.ingest_bo_pdfs ({files} PDFs x {lines} rows)")
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cores} - {n for n in (2, 4, 8) if n > cores})
+    with tempfile.TemporaryDirectory() as folder:
+        for index in range(files):
+            with open(os.path.join(folder, f"bo_{index:03d}.pdf"), 'wb') as f:
+                f.write(synthetic_bo_pdf(lines, seed=index))
+
+        for workers in worker_counts:
+            def run():
+                results = list(ingest_bo_pdfs(folder, workers=workers, use_cache=False))
+                assert all(result['success'] for result in results)
+
+            elapsed = timed(run, repeat=2)
+            record(f"bo_ingest.workers_{workers}", files / elapsed, 'PDFs/s', better='higher')
+            print(f"   {workers:>2} worker(s): {files / elapsed:8.1f} PDFs/s")
+
+
+def bench_bo_cache(lines=600):
+    """Single BO PDF: cold extraction and parse against a cache hit"""
+    print(f"🗃️  BOParseCache ({lines} rows)")
+    pdf = synthetic_bo_pdf(lines)
+    with tempfile.TemporaryDirectory() as folder:
+        cache = BOParseCache(os.path.join(folder, 'bo_cache.db'))
+        cold = timed(lambda: parse_bo_pdf_bytes(pdf), repeat=3)
+        parse_bo_pdf_bytes(pdf, cache=cache)
+        hit = timed(lambda: parse_bo_pdf_bytes(pdf, cache=cache), repeat=20)
+        record('bo_cache.uncached', cold * 1000, 'ms')
+        record('bo_cache.cached', hit * 1000, 'ms')
+        print(f"   uncached: {cold * 1000:8.2f} ms")
+        print(f"   cached:   {hit * 1000:8.2f} ms  ({cold / hit:,.0f}x)")
+
+
+def bench_totals(rows=100000):
+    """Budget/VAT/total for many invoices: per-row scalar calls against one batch call"""
+    print(f"🧮 invoice_totals ({rows:,} rows)")
+    rng = random.Random(0)
+    quantities = [rng.randint(1, 500) * 1000 for _ in range(rows)]
+    rates = [rng.randint(100, 9999) / 100 for _ in range(rows)]
+    vats = [rng.choice([0, 5]) for _ in range(rows)]
+
+    def scalar():
+        for q, r, v in zip(quantities, rates, vats):
+            calculate_totals(q, r, v)
+
+    for key, label, func in (
+        ('scalar', "scalar loop", scalar),
+        ('batch', "batch", lambda: calculate_totals_batch(quantities, rates, vats)),
+        ('batch_no_words', "batch, no words", lambda: calculate_totals_batch(quantities, rates, vats, words=False)),
+    ):
+        elapsed = timed(func, repeat=3)
+        record(f"totals.{key}", elapsed * 1000, 'ms')
+        print(f"   {label:<16} {elapsed * 1000:8.2f} ms")
+
+
+def _recursive_int_to_words(n):
+    """The original recursive converter, kept as the benchmark baseline"""
+    to19 = ['Zero','One','Two','Three','Four','Five','Six','Seven','Eight','Nine','Ten','Eleven','Twelve','Thirteen','Fourteen','Fifteen','Sixteen','Seventeen','Eighteen','Nineteen']
+    tens = ['','','Twenty','Thirty','Forty','Fifty','Sixty','Seventy','Eighty','Ninety']
+
+    def words(num):
+        if num < 20:
+            return to19[num]
+        if num < 100:
+            return tens[num//10] + ('' if num%10==0 else ' ' + to19[num%10])
+        if num < 1000:
+            return to19[num//100] + ' Hundred' + ('' if num%100==0 else ' ' + words(num%100))
+        for p, w in [(10**9, 'Billion'), (10**6, 'Million'), (1000, 'Thousand')]:
+            if num >= p:
+                return words(num//p) + ' ' + w + ('' if num%p==0 else ' ' + words(num%p))
+        return ''
+    return words(n)
+
+
+def bench_amount_words(count=50000):
+    """Amount-to-words: original recursion against the table-driven converter"""
+    print(f"🔤 amount_words ({count:,} amounts)")
+    rng = random.Random(0)
+    values = [rng.randint(0, 10**9) for _ in range(count)]
+    # Month-end totals repeat a lot; model a column with 2,000 distinct amounts
+    column = [rng.randint(0, 2000) * 1250 for _ in range(count)]
+
+    def cold():
+        int_to_words.cache_clear()
+        for value in values:
+            int_to_words(value)
+
+    for key, label, func in (
+        ('recursive', "recursive", lambda: [_recursive_int_to_words(value) for value in values]),
+        ('table_cold', "table, cold", cold),
+        ('table_warm', "table, warm", lambda: [int_to_words(value) for value in values]),
+        ('batch_column', "batch column", lambda: amounts_in_words(column)),
+    ):
+        elapsed = timed(func, repeat=3)
+        record(f"amount_words.{key}", elapsed * 1000, 'ms')
+        print(f"   {label:<16} {elapsed * 1000:8.2f} ms")
+
+
+def bench_invoice_reader(files=50):
+    """Field values of saved invoices: full workbook load against the XML fast path"""
+    print(f"🔎 Reading invoice fields ({files} files)")
+    sample = os.path.join(OUTPUT_FOLDER, 'INV-FY2526-101.xlsx')
+
+    def full():
+        for _ in range(files):
+            handler = ExcelHandler(sample)
+            handler.workbook = load_workbook(sample)
+            handler.worksheet = handler.workbook['Invoice']
+            handler.get_all_template_values()
+            handler.close()
+
+    full_time = timed(full, repeat=2)
+    fast_time = timed(lambda: [read_invoice_values(sample) for _ in range(files)], repeat=3)
+    record('invoice_reader.load_workbook', full_time / files * 1000, 'ms/file')
+    record('invoice_reader.fast_path', fast_time / files * 1000, 'ms/file')
+    print(f"   load_workbook: {full_time / files * 1000:8.2f} ms/file")
+    print(f"   fast path:     {fast_time / files * 1000:8.2f} ms/file  ({full_time / fast_time:,.0f}x)")
+
+
+def bench_indexer(files=300):
+    """Invoice indexer: first scan of a folder against a rescan with nothing changed"""
+    print(f"🗂️  InvoiceIndexer ({files} invoice files)")
+    sample = os.path.join(OUTPUT_FOLDER, 'INV-FY2526-101.xlsx')
+    with tempfile.TemporaryDirectory() as folder:
+        invoices = os.path.join(folder, 'invoices')
+        os.mkdir(invoices)
+        for index in range(files):
+            os.link(sample, os.path.join(invoices, f"invoice_{index:05d}.xlsx"))
+        db_path = os.path.join(folder, 'register.db')
+        indexer = InvoiceIndexer(invoices, InvoiceRegister(db_path, register_file=None), db_path)
+
+        first = indexer.scan()['seconds']
+        rescan = timed(indexer.scan, repeat=5)
+        record('indexer.first_scan', files / first, 'files/s', better='higher')
+        record('indexer.rescan', rescan * 1000, 'ms')
+        print(f"   first scan: {first * 1000:8.2f} ms  ({files / first:,.0f} files/s)")
+        print(f"   rescan:     {rescan * 1000:8.2f} ms")
+
+
+def bench_invoice_pdf(files=200):
+    """Invoice PDFs: compiled layout against recompiling per file, and batch throughput"""
+    print(f"📄 Invoice PDF ({files} invoice files)")
+    sample = os.path.join(OUTPUT_FOLDER, 'INV-FY2526-101.xlsx')
+
+    def cold():
+        invoice_pdf._layouts.clear()
+        invoice_pdf.invoice_pdf_bytes(sample)
+
+    cold_time = timed(cold, repeat=5)
+    invoice_pdf.compile_layout()
+    warm_time = timed(lambda: invoice_pdf.invoice_pdf_bytes(sample), repeat=50)
+    record('invoice_pdf.layout_per_file', cold_time * 1000, 'ms/file')
+    record('invoice_pdf.compiled_layout', warm_time * 1000, 'ms/file')
+    print(f"   layout per file:  {cold_time * 1000:8.2f} ms/file")
+    print(f"   compiled layout:  {warm_time * 1000:8.2f} ms/file  ({cold_time / warm_time:,.0f}x)")
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for index in range(files):
+            path = os.path.join(folder, f"invoice_{index:05d}.xlsx")
+            os.link(sample, path)
+            paths.append(path)
+        for workers in sorted({1, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            invoice_pdf.convert_invoices(paths, os.path.join(folder, 'pdf'), workers=workers)
+            elapsed = time.perf_counter() - start
+            record(f"invoice_pdf.batch_workers_{workers}", files / elapsed, 'files/s', better='higher')
+            print(f"   batch, {workers} worker(s): {files / elapsed:8,.0f} files/s")
+
+
+def bench_metrics(count=200000):
+    """Stage timer cost with metrics on and off, against an empty block"""
+    print(f"📈 Metrics ({count:,} timed blocks)")
+
+    def blocks():
+        for _ in range(count):
+            with metrics.stage('benchmark', 'noop'):
+                pass
+
+    def bare():
+        for _ in range(count):
+            pass
+
+    was_enabled = metrics.enabled()
+    try:
+        base = timed(bare, repeat=3)
+        metrics.set_enabled(True)
+        on = timed(blocks, repeat=3)
+        metrics.set_enabled(False)
+        off = timed(blocks, repeat=3)
+    finally:
+        metrics.set_enabled(was_enabled)
+        metrics.STAGE_SECONDS.clear()
+    record('metrics.stage_enabled', max(on - base, 0) / count * 1e9, 'ns')
+    record('metrics.stage_disabled', max(off - base, 0) / count * 1e9, 'ns')
+    print(f"   enabled:  {(on - base) / count * 1e9:8.0f} ns/stage")
+    print(f"   disabled: {(off - base) / count * 1e9:8.0f} ns/stage")
+
+
+def _prepared_invoice():
+    """SAMPLE_INVOICE with the calculated fields the API fills in before saving"""
+    totals = calculate_totals(SAMPLE_INVOICE['quantity'], SAMPLE_INVOICE['rate'], 5)
+    return dict(
+        SAMPLE_INVOICE,
+        vat_rate='VAT(5%)',
+        due_date='19/02/2026',
+        budget=totals['budget'],
+        vat_amount=totals['vat_amount'],
+        total_amount=totals['total_amount'],
+        total_in_words=totals['total_in_words'],
+    )
+
+
+def bench_excel_handler(repeat=30):
+    """ExcelHandler: template load (cold and cached), fill and save for each writer backend"""
+    print("📊 ExcelHandler load / fill / save")
+    data = _prepared_invoice()
+
+    def cold_load():
+        template_cache.clear()
+        ExcelHandler().load_template()
+
+    cold = timed(cold_load, repeat=3)
+    record('excel_handler.load_cold', cold * 1000, 'ms')
+    print(f"   template parse (cold): {cold * 1000:8.2f} ms")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for writer in ('xml', 'openpyxl'):
+            handler = ExcelHandler(writer=writer, output_folder=folder)
+            load = timed(handler.load_template, repeat=repeat)
+            fill = timed(lambda: handler.update_invoice(data), repeat=repeat)
+            save = timed(lambda: handler.save_invoice('bench.xlsx'), repeat=repeat)
+            for stage, elapsed in (('load', load), ('fill', fill), ('save', save)):
+                # Microsecond steps are reported but too noisy to gate on
+                record(f"excel_handler.{writer}_{stage}", elapsed * 1000, 'ms', gate=elapsed > 0.0005)
+            print(f"   {writer:<8} load {load * 1000:7.2f} ms   fill {fill * 1000:7.2f} ms   "
+                  f"save {save * 1000:7.2f} ms")
+
+
+def bench_validator(rows=20000):
+    """Invoice validation: InvoiceValidator row by row against one validate_batch call"""
+    print(f"✅ Validator ({rows:,} invoices)")
+    rng = random.Random(0)
+    data = _prepared_invoice()
+    invoices = []
+    for index in range(rows):
+        row = dict(data, invoice_no=f"INV-BENCH-{index:05d}", quantity=rng.randint(1, 500) * 1000)
+        if index % 10 == 0:
+            row['quantity'] = -1
+        invoices.append(row)
+
+    def per_row():
+        validator = InvoiceValidator()
+        return sum(1 for row in invoices if not validator.validate_all(row))
+
+    row_time = timed(per_row, repeat=3)
+    batch_time = timed(lambda: compiled_validator.validate_batch(invoices), repeat=3)
+    record('validator.per_row', rows / row_time, 'rows/s', better='higher')
+    record('validator.batch', rows / batch_time, 'rows/s', better='higher')
+    print(f"   InvoiceValidator: {rows / row_time:12,.0f} rows/s")
+    print(f"   validate_batch:   {rows / batch_time:12,.0f} rows/s")
+
+
+def bench_api_save(requests=200):
+    """End-to-end POST /api/invoice/save through the Flask test client, with the stage breakdown"""
+    print(f"🌐 POST /api/invoice/save ({requests} requests)")
+    import api
+    from client_manager import SQLiteClientManager
+
+    was_enabled = metrics.enabled()
+    saved = (api.client_manager, api.invoice_register, api._new_excel_handler)
+    with tempfile.TemporaryDirectory() as folder:
+        # Point the app at throwaway state so the real register and counter are untouched
+        db_path = os.path.join(folder, 'data.db')
+        api.client_manager = SQLiteClientManager(db_path)
+        api.invoice_register = InvoiceRegister(db_path, register_file=None)
+
+        def new_handler():
+            handler = ExcelHandler(output_folder=folder)
+            handler.load_template()
+            return handler
+
+        api._new_excel_handler = new_handler
+        try:
+            metrics.set_enabled(True)
+            metrics.REGISTRY.clear()
+            client = api.app.test_client()
+            # Saves without a number are numbered by the server
+            payloads = [dict(SAMPLE_INVOICE, invoice_no='') for _ in range(requests)]
+            client.post('/api/invoice/save', json=dict(SAMPLE_INVOICE, invoice_no=''))
+            metrics.REGISTRY.clear()
+
+            start = time.perf_counter()
+            for payload in payloads:
+                response = client.post('/api/invoice/save', json=payload)
+                assert response.status_code == 200, response.get_json()
+            elapsed = time.perf_counter() - start
+
+            record('api_save.requests', requests / elapsed, 'req/s', better='higher')
+            print(f"   {requests / elapsed:8.1f} req/s  ({elapsed / requests * 1000:.2f} ms/request)")
+            stages = ('validate', 'date_math', 'totals', 'allocate_number', 'load_template', 'update_invoice',
+                      'serialize', 'write', 'register')
+            for stage in stages:
+                mean = metrics.STAGE_SECONDS.total('save_invoice', stage) / requests
+                record(f"api_save.stage_{stage}", mean * 1000, 'ms', gate=False)
+                print(f"     {stage:<17} {mean * 1000:7.3f} ms")
+        finally:
+            api.client_manager, api.invoice_register, api._new_excel_handler = saved
+            metrics.set_enabled(was_enabled)
+            metrics.REGISTRY.clear()
+
+
+def import_time(module, data_db_file=None):
+    """
+    Cold import of a module in a fresh interpreter, from ``python -X importtime``
+
+    Args:
+        module: Module to import
+        data_db_file: Point config.DATA_DB_FILE here first (e.g. a missing
+            file, to time the import on a fresh install)
+
+    Returns:
+        Tuple of (milliseconds, set of every module imported on the way)
+    """
+    code = f'import {module}'
+    if data_db_file:
+        code = f'import config; config.DATA_DB_FILE = {data_db_file!r}; {code}'
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+    )
+    milliseconds = None
+    modules = set()
+    for line in process.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        modules.add(name)
+        if name == module:
+            milliseconds = int(parts[1]) / 1000
+    return milliseconds, modules
+
+
+def bench_startup(runs=3):
+    """Cold import time of the entry points (best of ``runs`` fresh interpreters)"""
+    print(f"🚀 Entry point import time (best of {runs})")
+    for module, budget in IMPORT_BUDGETS.items():
+        readings = [import_time(module) for _ in range(runs)]
+        milliseconds = min(reading[0] for reading in readings)
+        heavy = sorted(set(LAZY_MODULES) & readings[0][1])
+        record(f"startup.import_{module}", milliseconds, 'ms')
+        print(f"   {module:<12} {milliseconds:8.1f} ms  (budget {budget} ms)"
+              + (f"  loads {', '.join(heavy)}" if heavy else ''))
+
+
+# Suites in run order
+SUITES = OrderedDict([
+    ('startup', bench_startup),
+    ('excel_handler', bench_excel_handler),
+    ('api_save', bench_api_save),
+    ('validator', bench_validator),
+    ('bo_parser', bench_bo_parser),
+    ('bo_ingest', bench_bo_ingest),
+    ('bo_cache', bench_bo_cache),
+    ('totals', bench_totals),
+    ('amount_words', bench_amount_words),
+    ('invoice_reader', bench_invoice_reader),
+    ('indexer', bench_indexer),
+    ('invoice_pdf', bench_invoice_pdf),
+    ('metrics', bench_metrics),
+])
+
+
+def _better(current, previous):
+    """The better of two readings of one metric"""
+    if current['better'] == 'higher':
+        return current if current['value'] >= previous['value'] else previous
+    return current if current['value'] <= previous['value'] else previous
+
+
+def run_suites(names, runs=1):
+    """
+    Run suites ``runs`` times each, keeping every metric's best reading
+
+    Results already in RESULTS (from an earlier pass) are merged the same way.
+    """
+    for _ in range(runs):
+        previous = dict(RESULTS)
+        for name in names:
+            SUITES[name]()
+        for metric, reading in previous.items():
+            RESULTS[metric] = _better(RESULTS[metric], reading)
+
+
+def _environment():
+    """Where the numbers were taken, for the report header"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare measurements with a baseline
+
+    Args:
+        results: Dict of name -> {'value', 'unit', 'better'} for this run
+        baseline: Same shape, from the stored baseline
+        tolerance: Allowed slowdown as a fraction (0.3 = 30% worse)
+
+    Returns:
+        List of {'name', 'unit', 'baseline', 'current', 'change', 'regression'}
+        dicts for the metrics present in both; ``change`` is positive when
+        the run is slower (or lower throughput) than the baseline
+    """
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get('value') or not current['value']:
+            continue
+        if current.get('better', 'lower') == 'higher':
+            change = previous['value'] / current['value'] - 1
+        else:
+            change = current['value'] / previous['value'] - 1
+        rows.append({
+            'name': name,
+            'unit': current['unit'],
+            'baseline': previous['value'],
+            'current': current['value'],
+            'change': round(change, 4),
+            'regression': current.get('gate', True) and change > tolerance,
+        })
+    return rows
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Run the invoice automation benchmarks")
+    parser.add_argument('suites', nargs='*', metavar='suite',
+                        help=f"Suites to run (default: all of {', '.join(SUITES)})")
+    parser.add_argument('--json', dest='json_file', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', nargs='?', const=BASELINE_FILE,
+                        help="Compare with a baseline JSON file (default file: benchmark_baseline.json)")
+    parser.add_argument('--save-baseline', nargs='?', const=BASELINE_FILE,
+                        help="Store this run as the baseline (default file: benchmark_baseline.json)")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown before a metric counts as a regression (0.5 = 50%%)")
+    parser.add_argument('--runs', type=int, default=1,
+                        help="Run every suite this many times and keep the best readings")
+    parser.add_argument('--no-confirm', action='store_true',
+                        help="Do not re-run suites that look regressed before reporting them")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.suites if name not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(unknown)}")
+
+    RESULTS.clear()
+    run_suites(args.suites or list(SUITES), max(1, args.runs))
+
+    report = {'environment': _environment(), 'results': dict(RESULTS)}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(RESULTS, baseline['results'], args.tolerance)
+        for _ in range(0 if args.no_confirm else CONFIRM_RUNS):
+            suspects = sorted({row['name'].split('.')[0] for row in rows if row['regression']} & set(SUITES))
+            if not suspects:
+                break
+            # One noisy run should not fail the check: re-run and keep each metric's better reading
+            print(f"\n🔁 Re-running {', '.join(suspects)} to confirm")
+            run_suites(suspects)
+            rows = compare(RESULTS, baseline['results'], args.tolerance)
+        report['results'] = dict(RESULTS)
+        report['comparison'] = {'baseline': args.baseline, 'tolerance': args.tolerance, 'metrics': rows}
+        print(f"\n📏 Against {os.path.basename(args.baseline)} ({baseline['environment'].get('commit')}, "
+              f"tolerance {args.tolerance:.0%})")
+        for row in rows:
+            flag = '❌' if row['regression'] else ('🟢' if row['change'] < -args.tolerance else '  ')
+            print(f"   {flag} {row['name']:<36} {row['baseline']:>12,.3f} -> {row['current']:>12,.3f} "
+                  f"{row['unit']:<8} {row['change']:+7.1%}")
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': report['environment'], 'results': report['results']}, f, indent=2)
+            f.write('\n')
+        print(f"\n💾 Baseline written to {args.save_baseline}")
+
+    regressions = [row['name'] for row in report.get('comparison', {}).get('metrics', []) if row['regression']]
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
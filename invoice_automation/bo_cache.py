@@ -0,0 +1,150 @@
+"""
+On-disk cache for BO PDF text extraction and parse results
+Entries are keyed by the SHA-256 of the PDF bytes, so re-uploading the same
+BO skips both pypdf and the BOPDFParser passes
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+
+import bo_pdf_parser
+from config import BO_CACHE_FILE, BO_CACHE_MAX_BYTES
+
+
+def parser_fingerprint():
+    """
+    Identify the current parser rules
+
+    Combines PARSER_VERSION with every compiled pattern and limit in
+    bo_pdf_parser, so editing a pattern invalidates cached parse results
+    without a manual version bump.
+    """
+    parts = [str(bo_pdf_parser.PARSER_VERSION)]
+    for name in sorted(vars(bo_pdf_parser)):
+        value = getattr(bo_pdf_parser, name)
+        patterns = value if isinstance(value, list) else [value]
+        for pattern in patterns:
+            if hasattr(pattern, 'pattern') and hasattr(pattern, 'flags'):
+                parts.append(f"{name}:{pattern.flags}:{pattern.pattern}")
+        if name.startswith('MAX_'):
+            parts.append(f"{name}={value}")
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _text_extractor_version():
+    """Version of the PDF text extractor, part of the text cache key"""
+    try:
+        import pypdf
+        return f"pypdf-{pypdf.__version__}"
+    except ImportError:
+        return "pypdf-missing"
+
+
+class BOParseCache:
+    """SQLite-backed LRU cache of extracted BO text and parse results"""
+
+    def __init__(self, db_path=BO_CACHE_FILE, max_bytes=BO_CACHE_MAX_BYTES):
+        """
+        Initialize the cache
+
+        Args:
+            db_path: SQLite database file for the cache
+            max_bytes: Total size of stored entries before the least recently
+                used ones are evicted
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.parser_key = parser_fingerprint()
+        self.text_key = _text_extractor_version()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS bo_cache ("
+                    "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                    "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_bo_cache_last_used ON bo_cache (last_used)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """Open a connection; each call gets its own so processes never share one"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _get(self, key):
+        """Fetch and decode an entry, marking it as recently used"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM bo_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            with conn:
+                conn.execute("UPDATE bo_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+        finally:
+            conn.close()
+
+    def _put(self, key, value):
+        """Store an entry and evict least recently used ones over the size cap"""
+        blob = zlib.compress(json.dumps(value, default=str).encode('utf-8'))
+        if len(blob) > self.max_bytes:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO bo_cache (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), time.time()),
+                )
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM bo_cache").fetchone()[0]
+                if total > self.max_bytes:
+                    rows = conn.execute(
+                        "SELECT key, size FROM bo_cache WHERE key != ? ORDER BY last_used", (key,)
+                    ).fetchall()
+                    evict = []
+                    for old_key, size in rows:
+                        if total <= self.max_bytes:
+                            break
+                        evict.append((old_key,))
+                        total -= size
+                    conn.executemany("DELETE FROM bo_cache WHERE key = ?", evict)
+        finally:
+            conn.close()
+
+    def get_text(self, digest):
+        """Cached (pages, text) for a PDF digest, or None"""
+        value = self._get(f"text:{self.text_key}:{digest}")
+        return (value['pages'], value['text']) if value else None
+
+    def put_text(self, digest, pages, text):
+        """Store extracted text for a PDF digest"""
+        self._put(f"text:{self.text_key}:{digest}", {'pages': pages, 'text': text})
+
+    def get_parsed(self, digest):
+        """Cached (pages, extract_all_data result without raw_text) for a PDF digest, or None"""
+        value = self._get(f"parsed:{self.parser_key}:{digest}")
+        return (value['pages'], value['data']) if value else None
+
+    def put_parsed(self, digest, pages, data):
+        """Store an extract_all_data result (without raw_text) for a PDF digest"""
+        self._put(f"parsed:{self.parser_key}:{digest}", {'pages': pages, 'data': data})
+
+    def clear(self):
+        """Remove every cached entry"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM bo_cache")
+        finally:
+            conn.close()
+
+
+def pdf_digest(data):
+    """SHA-256 hex digest of PDF bytes"""
+    return hashlib.sha256(data).hexdigest()
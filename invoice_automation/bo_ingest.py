@@ -0,0 +1,259 @@
+"""
+Bulk ingestion of Business Order (BO) PDFs into invoice drafts
+Extracts text with pypdf and runs BOPDFParser over many files in parallel
+
+Usage:
+    python bo_ingest.py <folder-or-zip> [--workers N] [--output drafts.jsonl] [--include-text] [--no-cache]
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from bo_pdf_parser import BOPDFParser
+from bo_cache import BOParseCache, pdf_digest
+from config import API_WORKERS
+
+
+# Opened lazily, once per process (each pool worker gets its own)
+_cache = None
+
+# Worker pool shared by API requests (see get_executor)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_cache():
+    """Get this process's BO parse cache"""
+    global _cache
+    if _cache is None:
+        _cache = BOParseCache()
+    return _cache
+
+
+def extract_pdf_text(data):
+    """
+    Extract text from PDF bytes, page by page
+
+    Returns:
+        Tuple of (page count, text with pages joined by newlines)
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    pages = [page.extract_text() or '' for page in reader.pages]
+    return len(pages), '\n'.join(pages)
+
+
+def parse_bo_pdf_bytes(data, include_text=False, cache=None):
+    """
+    Extract and parse one BO PDF, reusing cached work for known files
+
+    Args:
+        data: PDF bytes
+        include_text: Keep the extracted text as ``raw_text``
+        cache: Optional BOParseCache
+
+    Returns:
+        Tuple of (page count, extract_all_data result)
+    """
+    if cache is None:
+        pages, text = extract_pdf_text(data)
+        parsed = BOPDFParser(text).extract_all_data()
+        if not include_text:
+            parsed.pop('raw_text', None)
+        return pages, parsed
+
+    digest = pdf_digest(data)
+    cached = cache.get_parsed(digest)
+    if cached is not None and not include_text:
+        return cached
+
+    text_entry = cache.get_text(digest)
+    if text_entry is None:
+        text_entry = extract_pdf_text(data)
+        cache.put_text(digest, *text_entry)
+    pages, text = text_entry
+
+    if cached is not None:
+        parsed = cached[1]
+    else:
+        parsed = BOPDFParser(text).extract_all_data()
+        parsed.pop('raw_text', None)
+        cache.put_parsed(digest, pages, parsed)
+    if include_text:
+        parsed['raw_text'] = text
+    return pages, parsed
+
+
+def find_bo_pdfs(source):
+    """
+    List the PDFs to ingest from a folder (recursively) or a .zip archive
+
+    Returns:
+        Sorted list of (source path, zip member name or None) jobs
+    """
+    if os.path.isdir(source):
+        jobs = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith('.pdf'):
+                    jobs.append((os.path.join(root, name), None))
+        return sorted(jobs)
+
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            members = [
+                info.filename for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith('.pdf')
+            ]
+        return [(source, member) for member in sorted(members)]
+
+    if source.lower().endswith('.pdf') and os.path.isfile(source):
+        return [(source, None)]
+
+    raise ValueError(f"Not a folder, zip archive or PDF: {source}")
+
+
+def ingest_bo_pdf(job, include_text=False, use_cache=True):
+    """
+    Extract and parse a single BO PDF
+
+    Failures are reported in the result instead of raised, so one bad file
+    never stops a bulk run.
+
+    Args:
+        job: (source path, zip member name or None) as returned by find_bo_pdfs
+        include_text: Keep the extracted text in the result
+        use_cache: Reuse and store results in the on-disk BO cache
+
+    Returns:
+        Result dict with the file name and either parsed data or an error
+    """
+    path, member = job
+    name = member if member else path
+    try:
+        if member:
+            with zipfile.ZipFile(path) as archive:
+                data = archive.read(member)
+        else:
+            with open(path, 'rb') as f:
+                data = f.read()
+
+        cache = _get_cache() if use_cache else None
+        pages, parsed = parse_bo_pdf_bytes(data, include_text=include_text, cache=cache)
+        return {'file': name, 'success': True, 'pages': pages, 'data': parsed}
+    except Exception as e:
+        return {'file': name, 'success': False, 'error': f"{type(e).__name__}: {str(e)}"}
+
+
+def get_executor():
+    """
+    Get the worker pool shared by API requests
+
+    Created once under a lock, since API request threads may ask for it
+    together. Workers are spawned rather than forked from the threaded API
+    process, and each API worker gets its share of the cores.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=max(1, (os.cpu_count() or 1) // max(1, API_WORKERS)),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def shutdown_executor():
+    """Stop the shared worker pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def ingest_bo_pdfs(source, workers=None, include_text=False, use_cache=True, executor=None):
+    """
+    Ingest every BO PDF in a folder or zip archive
+
+    Results are yielded as soon as they are ready, in file order, so callers
+    can stream them out as JSON Lines.
+
+    Args:
+        source: Folder, .zip archive or single PDF
+        workers: Worker processes of a pool created for this call (default:
+            one per core); ignored when ``executor`` is given
+        include_text: Keep the extracted text in each result
+        use_cache: Reuse and store results in the on-disk BO cache
+        executor: Existing pool to run on (e.g. get_executor())
+
+    Yields:
+        One result dict per PDF
+    """
+    jobs = find_bo_pdfs(source)
+    if not jobs:
+        return
+    if executor is not None:
+        workers = getattr(executor, '_max_workers', 1) or 1
+    workers = workers or os.cpu_count() or 1
+    worker = partial(ingest_bo_pdf, include_text=include_text, use_cache=use_cache)
+
+    if workers == 1 or len(jobs) == 1:
+        for job in jobs:
+            yield worker(job)
+        return
+
+    chunksize = max(1, len(jobs) // (workers * 8))
+    if executor is not None:
+        yield from executor.map(worker, jobs, chunksize=chunksize)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        for result in executor.map(worker, jobs, chunksize=chunksize):
+            yield result
+
+
+def write_jsonl(results, stream):
+    """Write result dicts as JSON Lines, flushing after each one"""
+    count = failed = 0
+    for result in results:
+        stream.write(json.dumps(result, default=str) + '\n')
+        stream.flush()
+        count += 1
+        failed += 0 if result['success'] else 1
+    return count, failed
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Parse a folder or zip of BO PDFs into JSON Lines")
+    parser.add_argument('source', help="Folder, .zip archive or single PDF")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument('--output', '-o', default=None, help="Output .jsonl file (default: stdout)")
+    parser.add_argument('--include-text', action='store_true', help="Include the extracted text in each result")
+    parser.add_argument('--no-cache', action='store_true', help="Ignore and do not update the BO parse cache")
+    args = parser.parse_args(argv)
+
+    results = ingest_bo_pdfs(
+        args.source, workers=args.workers, include_text=args.include_text, use_cache=not args.no_cache
+    )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            count, failed = write_jsonl(results, f)
+    else:
+        count, failed = write_jsonl(results, sys.stdout)
+
+    print(f"Ingested {count} PDF(s), {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,22 +4,92 @@ Extracts relevant invoice data from PDF files
 """
 
 import re
+from functools import wraps
 from typing import Dict, List, Optional, Tuple
 
 
+# Bump whenever an extraction rule changes; cached parse results from an
+# older parser are then ignored (pattern edits are detected automatically)
+PARSER_VERSION = 2
+
+# Pattern 1 for BO numbers: PD25|2041|4 style (order format from screenshot)
+_BO_INLINE_RE = re.compile(r'(?:PD|PO|BO|Schedule)\d{2}\|?\d+\|?\d+', re.IGNORECASE)
+# Pattern 2 for BO numbers: key-value format
+_BO_KEY_VALUE_RES = [
+    re.compile(r'(?:Order\s*No|BO\s*No|PO\s*No|Schedule\s*No)[:\s]+([A-Za-z0-9\-|]+)', re.IGNORECASE),
+    re.compile(r'(?:BONumber|PONumber|ScheduleNumber)[:\s]+([A-Za-z0-9\-|]+)', re.IGNORECASE),
+    re.compile(r'(?:Order\s*Number)[:\s]+([A-Za-z0-9\-|]+)', re.IGNORECASE),
+]
+
+_CLIENT_RES = [
+    re.compile(r'(?:Attention|Client|Customer|Recipient|Company)[:\s]+([^\n]+)', re.IGNORECASE),
+    re.compile(r'(?:Attention|Client|Customer)[:\s]+([^\n]+)', re.IGNORECASE),
+]
+
+_TRN_RES = [
+    re.compile(r'(?:VAT\s*(?:Registration|No|Number|ID)|TRN|Tax\s*(?:ID|Registration))[:\s]+([0-9\s\-]+)', re.IGNORECASE),
+    re.compile(r'(?:TRN|VAT)[:\s]+([0-9\s\-]+)', re.IGNORECASE),
+    re.compile(r'VAT\s*REGISTRATION\s*No[.:]?\s*([0-9\s]+)', re.IGNORECASE),
+]
+
+# Item descriptions like "Mixed Placement" or "Clickable In-Game Banners"
+_DETAIL_RES = [
+    re.compile(r'(?:Mixed\s+Placement|Clickable|Banner|Video|Impression|Campaign|Ad\s+(?:Space|Placement))[^\n]*'),
+    re.compile(r'([A-Z][A-Za-z\s]{10,}(?:Placement|Banner|Video|Campaign|Ad))[^\n]*'),
+]
+_DETAILS_SECTION_RE = re.compile(r'Details[:\s]+([^\n]+(?:\n[^\n]*){0,5})', re.IGNORECASE)
+
+_QUANTITY_RE = re.compile(r'(?:Volume|Quantity|QTY|Units?)[:\s]+(\d+(?:,\d{3})*(?:\.\d+)?)', re.IGNORECASE)
+_RATE_RE = re.compile(
+    r'(?:Rate|Unit\s*Cost|Unit\s*Price|Price)[:\s]+(?:\$|USD\s*)?(\d+(?:,\d{3})*(?:\.\d+)?)',
+    re.IGNORECASE,
+)
+_CURRENCY_RES = [
+    re.compile(r'\$\s*(\d+(?:,\d{3})*(?:\.\d+)?)'),
+    re.compile(r'USD\s+(\d+(?:,\d{3})*(?:\.\d+)?)'),
+]
+
+_DIGIT_RE = re.compile(r'\d+')
+_NUMBER_TOKEN_RE = re.compile(r'\b(\d+(?:,\d{3})*)\b')
+_LEADING_NUMBERS_RE = re.compile(r'^[\d\-\|]+\s*')
+_MULTI_SPACE_RE = re.compile(r'\s{2,}')
+_NON_DIGIT_RE = re.compile(r'\D')
+
+MAX_DESCRIPTIONS = 5
+MAX_QUANTITIES = 10
+MAX_RATES = 10
+
+
+def _cached(method):
+    """Compute an extraction once per parser instance
+
+    List results are copied on the way out so callers cannot alter the cache.
+    """
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self):
+        if name not in self._cache:
+            self._cache[name] = method(self)
+        value = self._cache[name]
+        return list(value) if isinstance(value, list) else value
+    return wrapper
+
+
 class BOPDFParser:
     """Parse Business Order PDFs and extract invoice-relevant data"""
-    
+
     def __init__(self, extracted_text: str):
         """
         Initialize parser with extracted PDF text
-        
+
         Args:
             extracted_text: Raw text extracted from PDF
         """
         self.text = extracted_text
         self.lines = extracted_text.split('\n')
-    
+        self._cache = {}
+
     def extract_all_data(self) -> Dict:
         """Extract all BO data"""
         return {
@@ -31,201 +101,202 @@ class BOPDFParser:
             'rates': self.extract_rates(),
             'raw_text': self.text
         }
-    
+
+    @_cached
+    def _scan_lines(self) -> Tuple[List[str], List[float]]:
+        """
+        Single pass over the text lines collecting table-row candidates
+
+        Returns description candidates (cleaned table rows) and quantity
+        candidates (numbers between 1 and 100,000), each unique and in order
+        of appearance. The pass stops as soon as both lists hold more than
+        any extractor can use: earlier sources contribute at most
+        MAX_DESCRIPTIONS / MAX_QUANTITIES distinct values, so twice the cap
+        is always enough to fill the result.
+        """
+        description_limit = 2 * MAX_DESCRIPTIONS
+        quantity_limit = 2 * MAX_QUANTITIES
+        descriptions = []
+        seen_descriptions = set()
+        quantities = []
+        seen_quantities = set()
+
+        for line in self.lines:
+            if len(descriptions) < description_limit and len(line) > 20 and _DIGIT_RE.search(line):
+                # Remove leading numbers and common separators
+                cleaned = _LEADING_NUMBERS_RE.sub('', line)
+                if cleaned and len(cleaned) > 10 and any(c.isalpha() for c in cleaned):
+                    cleaned = cleaned.strip()
+                    if len(cleaned) < 200 and cleaned not in seen_descriptions:
+                        seen_descriptions.add(cleaned)
+                        descriptions.append(cleaned)
+
+            if len(quantities) < quantity_limit:
+                # Numbers that might be quantities (usually medium-sized numbers)
+                for num_str in _NUMBER_TOKEN_RE.findall(line):
+                    num = float(num_str.replace(',', ''))
+                    # Filter: quantities are usually between 1 and 100,000
+                    if 1 <= num <= 100000 and num not in seen_quantities:
+                        seen_quantities.add(num)
+                        quantities.append(num)
+                        if len(quantities) >= quantity_limit:
+                            break
+
+            if len(descriptions) >= description_limit and len(quantities) >= quantity_limit:
+                break
+
+        return descriptions, quantities
+
+    @_cached
     def extract_bo_number(self) -> Optional[str]:
         """
         Extract BO/PO/Schedule number
         Looks for patterns like: PD25|2041|4, BONumber:, ScheduleNo:, PONo:, OrderNo:
         """
-        # Pattern 1: PD25|2041|4 style (order format from screenshot)
-        match = re.search(r'(?:PD|PO|BO|Schedule)\d{2}\|?\d+\|?\d+', self.text, re.IGNORECASE)
+        match = _BO_INLINE_RE.search(self.text)
         if match:
             return match.group().strip()
-        
-        # Pattern 2: Key-value format
-        patterns = [
-            r'(?:Order\s*No|BO\s*No|PO\s*No|Schedule\s*No)[:\s]+([A-Za-z0-9\-|]+)',
-            r'(?:BONumber|PONumber|ScheduleNumber)[:\s]+([A-Za-z0-9\-|]+)',
-            r'(?:Order\s*Number)[:\s]+([A-Za-z0-9\-|]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, self.text, re.IGNORECASE)
+
+        for pattern in _BO_KEY_VALUE_RES:
+            match = pattern.search(self.text)
             if match:
                 return match.group(1).strip()
-        
+
         return None
-    
+
+    @_cached
     def extract_client_name(self) -> Optional[str]:
         """
         Extract client/customer name
         Looks for patterns like: Client:, Customer:, Attention:, Recipient:
         """
-        patterns = [
-            r'(?:Attention|Client|Customer|Recipient|Company)[:\s]+([^\n]+)',
-            r'(?:Attention|Client|Customer)[:\s]+([^\n]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, self.text, re.IGNORECASE)
+        for pattern in _CLIENT_RES:
+            match = pattern.search(self.text)
             if match:
                 value = match.group(1).strip()
                 # Clean up common artifacts
-                value = re.sub(r'\s{2,}', ' ', value)
+                value = _MULTI_SPACE_RE.sub(' ', value)
                 if value and len(value) < 150:  # Reasonable length for client name
                     return value
-        
+
         return None
-    
+
+    @_cached
     def extract_trn_number(self) -> Optional[str]:
         """
         Extract TRN (Tax Registration Number) / VAT number
         Looks for patterns like: TRN, VAT ID, VAT Registration, Tax ID
         """
-        patterns = [
-            r'(?:VAT\s*(?:Registration|No|Number|ID)|TRN|Tax\s*(?:ID|Registration))[:\s]+([0-9\s\-]+)',
-            r'(?:TRN|VAT)[:\s]+([0-9\s\-]+)',
-            r'VAT\s*REGISTRATION\s*No[.:]?\s*([0-9\s]+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, self.text, re.IGNORECASE)
+        for pattern in _TRN_RES:
+            match = pattern.search(self.text)
             if match:
                 value = match.group(1).strip()
                 # Extract only numbers
-                numbers = re.sub(r'\D', '', value)
+                numbers = _NON_DIGIT_RE.sub('', value)
                 if numbers and len(numbers) >= 8:  # TRN/VAT usually have many digits
                     return numbers
-        
+
         return None
-    
+
+    @_cached
     def extract_descriptions(self) -> List[str]:
         """
         Extract item descriptions from PDF
         Looks for section like "Details", "Items", or table with descriptions
         """
         descriptions = []
-        
-        # Look for patterns like "Mixed Placement" or "Clickable In-Game Banners"
+        seen = set()
+
+        def add(desc):
+            if desc not in seen:
+                seen.add(desc)
+                descriptions.append(desc)
+            return len(descriptions) >= MAX_DESCRIPTIONS
+
         # This could be in a table or list format
-        detail_patterns = [
-            r'(?:Mixed\s+Placement|Clickable|Banner|Video|Impression|Campaign|Ad\s+(?:Space|Placement))[^\n]*',
-            r'([A-Z][A-Za-z\s]{10,}(?:Placement|Banner|Video|Campaign|Ad))[^\n]*',
-        ]
-        
-        for pattern in detail_patterns:
-            matches = re.findall(pattern, self.text)
-            for match in matches:
-                desc = match.strip()
+        for pattern in _DETAIL_RES:
+            for match in pattern.finditer(self.text):
+                desc = (match.group(1) if pattern.groups else match.group()).strip()
                 if desc and len(desc) < 200:  # Reasonable description length
-                    if desc not in descriptions:
-                        descriptions.append(desc)
-        
+                    if add(desc):
+                        return descriptions
+
         # Look for "Details" section followed by content
-        details_section = re.search(r'Details[:\s]+([^\n]+(?:\n[^\n]*){0,5})', self.text, re.IGNORECASE)
+        details_section = _DETAILS_SECTION_RE.search(self.text)
         if details_section:
             detail_text = details_section.group(1)
             # Extract meaningful portions
             detail_lines = [line.strip() for line in detail_text.split('\n') if line.strip()]
             for line in detail_lines[:5]:  # Limit to first 5 lines
-                if line and len(line) > 5 and line not in descriptions:
-                    descriptions.append(line)
-        
-        # Look in table rows (detect by looking for numeric values)
-        lines_with_numbers = []
-        for line in self.lines:
-            if re.search(r'\d+', line) and len(line) > 20:
-                lines_with_numbers.append(line)
-        
-        # Try to extract description from lines that might be table rows
-        for line in lines_with_numbers:
-            # Remove leading numbers and common separators
-            cleaned = re.sub(r'^[\d\-\|]+\s*', '', line)
-            if cleaned and len(cleaned) > 10 and any(c.isalpha() for c in cleaned):
-                cleaned = cleaned.strip()
-                if cleaned not in descriptions and len(cleaned) < 200:
-                    descriptions.append(cleaned)
-        
-        return descriptions[:5]  # Return top 5 descriptions
-    
+                if line and len(line) > 5:
+                    if add(line):
+                        return descriptions
+
+        # Table rows (lines with numeric values), from the shared line scan
+        for cleaned in self._scan_lines()[0]:
+            if add(cleaned):
+                break
+
+        return descriptions[:MAX_DESCRIPTIONS]  # Return top 5 descriptions
+
+    @_cached
     def extract_quantities(self) -> List[float]:
         """
         Extract quantities/volumes
         Looks for patterns like: Volume:, Quantity:, QTY, Units
         """
         quantities = []
-        
+
         # Look for "Volume", "Quantity", "Units" followed by numbers
-        patterns = [
-            r'(?:Volume|Quantity|QTY|Units?)[:\s]+(\d+(?:,\d{3})*(?:\.\d+)?)',
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, self.text, re.IGNORECASE)
-            for match in matches:
-                try:
-                    # Remove commas and convert to float
-                    value = float(match.replace(',', ''))
-                    if value > 0:
-                        quantities.append(value)
-                except ValueError:
-                    pass
-        
-        # Look in lines that look like table data (contain multiple numbers)
-        for line in self.lines:
-            # Extract numbers that might be quantities (usually medium-sized numbers)
-            numbers = re.findall(r'\b(\d+(?:,\d{3})*)\b', line)
-            for num_str in numbers:
-                try:
-                    num = float(num_str.replace(',', ''))
-                    # Filter: quantities are usually between 1 and 100,000
-                    if 1 <= num <= 100000 and num not in quantities:
-                        quantities.append(num)
-                except ValueError:
-                    pass
-        
-        return quantities[:10]  # Return top 10 quantities
-    
+        for match in _QUANTITY_RE.finditer(self.text):
+            # Remove commas and convert to float
+            value = float(match.group(1).replace(',', ''))
+            if value > 0:
+                quantities.append(value)
+                if len(quantities) >= MAX_QUANTITIES:
+                    return quantities
+
+        # Numbers from lines that look like table data, from the shared line scan
+        seen = set(quantities)
+        for num in self._scan_lines()[1]:
+            if num not in seen:
+                seen.add(num)
+                quantities.append(num)
+                if len(quantities) >= MAX_QUANTITIES:
+                    break
+
+        return quantities[:MAX_QUANTITIES]  # Return top 10 quantities
+
+    @_cached
     def extract_rates(self) -> List[float]:
         """
         Extract unit rates/unit costs
         Looks for patterns like: Rate:, Unit Cost:, Price:, Amount:
         """
         rates = []
-        
+
         # Look for "Rate", "Unit Cost", "Price" followed by numbers with currency
-        patterns = [
-            r'(?:Rate|Unit\s*Cost|Unit\s*Price|Price)[:\s]+(?:\$|USD\s*)?(\d+(?:,\d{3})*(?:\.\d+)?)',
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, self.text, re.IGNORECASE)
-            for match in matches:
-                try:
-                    value = float(match.replace(',', ''))
-                    if value > 0:
-                        rates.append(value)
-                except ValueError:
-                    pass
-        
+        for match in _RATE_RE.finditer(self.text):
+            value = float(match.group(1).replace(',', ''))
+            if value > 0:
+                rates.append(value)
+                if len(rates) >= MAX_RATES:
+                    return rates
+
         # Look for currency amounts that might be rates
-        currency_patterns = [
-            r'\$\s*(\d+(?:,\d{3})*(?:\.\d+)?)',
-            r'USD\s+(\d+(?:,\d{3})*(?:\.\d+)?)',
-        ]
-        
-        for pattern in currency_patterns:
-            matches = re.findall(pattern, self.text)
-            for match in matches:
-                try:
-                    value = float(match.replace(',', ''))
-                    if 1 <= value <= 1000000 and value not in rates:  # Reasonable rate range
-                        rates.append(value)
-                except ValueError:
-                    pass
-        
-        return rates[:10]  # Return top 10 rates
-    
+        seen = set(rates)
+        for pattern in _CURRENCY_RES:
+            for match in pattern.finditer(self.text):
+                value = float(match.group(1).replace(',', ''))
+                if 1 <= value <= 1000000 and value not in seen:  # Reasonable rate range
+                    seen.add(value)
+                    rates.append(value)
+                    if len(rates) >= MAX_RATES:
+                        return rates
+
+        return rates[:MAX_RATES]  # Return top 10 rates
+
+    @_cached
     def extract_line_items(self) -> List[Dict]:
         """
         Extract complete line items (description, quantity, rate) together
@@ -234,7 +305,7 @@ class BOPDFParser:
         descriptions = self.extract_descriptions()
         quantities = self.extract_quantities()
         rates = self.extract_rates()
-        
+
         # Pair them together
         max_items = max(len(descriptions), len(quantities), len(rates))
         for i in range(max_items):
@@ -244,5 +315,5 @@ class BOPDFParser:
                 'rate': rates[i] if i < len(rates) else None,
             }
             items.append(item)
-        
+
         return items
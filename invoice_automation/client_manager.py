@@ -5,7 +5,15 @@ Manages predefined client names with addresses and custom client additions
 
 import json
 import os
-from config import BASE_DIR
+import sqlite3
+import threading
+from config import BASE_DIR, DATA_DB_FILE, CLIENT_STORE, INVOICE_NUMBER_PREFIX
+from invoice_numbers import InvoiceNumberAllocator
+
+
+def _search_terms(query):
+    """Split a search query into case-insensitive terms"""
+    return (query or '').casefold().split()
 
 
 class ClientManager:
@@ -13,7 +21,13 @@ class ClientManager:
     
     def __init__(self):
         self.clients_file = os.path.join(BASE_DIR, 'clients.json')
+        self._lock = threading.Lock()
         self.clients = self._load_clients()
+        # The counter lives in SQLite; next_invoice_number in clients.json only
+        # seeds it the first time the database is created
+        self.invoice_numbers = InvoiceNumberAllocator(
+            initial_value=self.clients.get('next_invoice_number', 1)
+        )
     
     def _load_clients(self):
         """Load clients from JSON file"""
@@ -82,24 +96,55 @@ class ClientManager:
         client_name = client_name.strip()
         client_address = client_address.strip() if client_address else ""
         
-        # Check if already exists
-        all_clients = self.get_all_clients()
-        if client_name in all_clients:
-            raise ValueError(f"Client '{client_name}' already exists")
-        
-        # Add to custom list
-        self.clients['custom'][client_name] = client_address
-        self._save_clients(self.clients)
+        with self._lock:
+            # Check if already exists
+            all_clients = self.get_all_clients()
+            if client_name in all_clients:
+                raise ValueError(f"Client '{client_name}' already exists")
+            
+            # Add to custom list
+            self.clients['custom'][client_name] = client_address
+            self._save_clients(self.clients)
         return client_name
     
     def remove_custom_client(self, client_name):
         """Remove a custom client"""
-        if client_name in self.clients.get('custom', {}):
-            del self.clients['custom'][client_name]
-            self._save_clients(self.clients)
-            return True
+        with self._lock:
+            if client_name in self.clients.get('custom', {}):
+                del self.clients['custom'][client_name]
+                self._save_clients(self.clients)
+                return True
         return False
     
+    def get_clients_with_addresses(self):
+        """Get all clients as name/address dicts (predefined first)"""
+        return [{'name': name, 'address': self.get_client_address(name)}
+                for name in self.get_all_clients()]
+
+    def search_clients(self, query='', limit=None, offset=0):
+        """Find clients whose name contains every word of the query
+
+        Names starting with the query are listed first.
+        Returns a (page of name/address dicts, total matches) tuple.
+        """
+        terms = _search_terms(query)
+        prefix = ' '.join(terms)
+        matches = []
+        for client in self.get_clients_with_addresses():
+            key = client['name'].casefold()
+            if all(term in key for term in terms):
+                matches.append((not key.startswith(prefix), key, client))
+        matches.sort(key=lambda m: (m[0], m[1]))
+        end = None if limit is None else offset + limit
+        return [m[2] for m in matches[offset:end]], len(matches)
+
+    def get_clients_version(self):
+        """Value that changes whenever the client list does (clients.json's modification time)"""
+        try:
+            return os.stat(self.clients_file).st_mtime_ns
+        except OSError:
+            return None
+
     def get_predefined_clients(self):
         """Get only predefined client names"""
         return list(self.clients.get('predefined', {}).keys())
@@ -110,13 +155,231 @@ class ClientManager:
     
     def get_next_invoice_number(self):
         """Get the next invoice number in format 001, 002, etc."""
-        next_num = self.clients.get('next_invoice_number', 1)
+        next_num = self.invoice_numbers.peek()
         invoice_number = f"{next_num:03d}"
         return invoice_number
     
     def increment_invoice_number(self):
         """Increment the invoice number counter after saving an invoice"""
-        current = self.clients.get('next_invoice_number', 1)
-        self.clients['next_invoice_number'] = current + 1
-        self._save_clients(self.clients)
+        self.invoice_numbers.reserve(1)
+
+    def allocate_invoice_number(self):
+        """Atomically claim the next invoice number and return it formatted"""
+        return self.reserve_invoice_numbers(1)[0]
+
+    def claim_invoice_number(self, invoice_no=''):
+        """Claim the number of one invoice being issued
+
+        A blank ``invoice_no`` gets the next number. A given one (the number
+        previewed by get_next_invoice_number, with INVOICE_NUMBER_PREFIX) is
+        accepted only while it is still the next number, and claimed
+        atomically, so two invoices never get the same number.
+        Returns the full invoice number, or None when ``invoice_no`` is
+        already issued or is not the next number.
+        """
+        invoice_no = str(invoice_no or '').strip()
+        if not invoice_no:
+            return f"{INVOICE_NUMBER_PREFIX}{self.allocate_invoice_number()}"
+        digits = invoice_no[len(INVOICE_NUMBER_PREFIX):] if invoice_no.startswith(INVOICE_NUMBER_PREFIX) else ''
+        if (digits.isdigit() and invoice_no == f"{INVOICE_NUMBER_PREFIX}{int(digits):03d}"
+                and self.invoice_numbers.claim(int(digits))):
+            return invoice_no
+        return None
+
+    def reserve_invoice_numbers(self, count):
+        """Reserve a contiguous block of invoice numbers in one step
+
+        Returns the reserved numbers formatted like get_next_invoice_number.
+        Numbers are unique across threads and processes.
+        """
+        if count <= 0:
+            return []
+        start = self.invoice_numbers.reserve(count)
+        return [f"{n:03d}" for n in range(start, start + count)]
+
+
+class SQLiteClientManager(ClientManager):
+    """ClientManager backed by an indexed SQLite table
+
+    Lookups by name use the table's unique index and prefix searches use an
+    index on the case-folded name, so large client lists never have to be
+    loaded into memory. The existing clients.json is imported automatically
+    the first time the table is created.
+    """
+
+    def __init__(self, db_path=DATA_DB_FILE):
+        self.clients_file = os.path.join(BASE_DIR, 'clients.json')
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # clients.json is only read to seed an empty database
+        seed = self._load_clients()
+        self._init_db(seed)
+        self.invoice_numbers = InvoiceNumberAllocator(
+            db_path, initial_value=seed.get('next_invoice_number', 1)
+        )
+
+    def _connect(self):
+        """Open a connection; each call gets its own so threads never share one"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self, seed):
+        """Create the clients table and import clients.json if it is empty"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS clients ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "name TEXT NOT NULL UNIQUE, "
+                "name_key TEXT NOT NULL, "
+                "address TEXT NOT NULL DEFAULT '', "
+                "kind TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_clients_name_key ON clients (name_key)")
+            if conn.execute("SELECT COUNT(*) FROM clients").fetchone()[0] == 0:
+                rows = []
+                for kind in ('predefined', 'custom'):
+                    for name, address in seed.get(kind, {}).items():
+                        rows.append((name, name.casefold(), address or '', kind))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO clients (name, name_key, address, kind) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _query(self, sql, params=()):
+        """Run a read query and return all rows"""
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def get_all_clients(self):
+        """Get all client names (predefined + custom) as a single list"""
+        rows = self._query("SELECT name FROM clients ORDER BY kind = 'custom', id")
+        return [row[0] for row in rows]
+
+    def get_clients_with_addresses(self):
+        """Get all clients as name/address dicts (predefined first)"""
+        rows = self._query("SELECT name, address FROM clients ORDER BY kind = 'custom', id")
+        return [{'name': name, 'address': address} for name, address in rows]
+
+    def get_client_address(self, client_name):
+        """Get address for a specific client"""
+        rows = self._query("SELECT address FROM clients WHERE name = ?", (client_name,))
+        return rows[0][0] if rows else ""
+
+    def add_custom_client(self, client_name, client_address=""):
+        """Add a new custom client with address"""
+        if not client_name or client_name.strip() == '':
+            raise ValueError("Client name cannot be empty")
+
+        client_name = client_name.strip()
+        client_address = client_address.strip() if client_address else ""
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO clients (name, name_key, address, kind) VALUES (?, ?, ?, 'custom')",
+                    (client_name, client_name.casefold(), client_address),
+                )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Client '{client_name}' already exists")
+        finally:
+            conn.close()
+        return client_name
+
+    def remove_custom_client(self, client_name):
+        """Remove a custom client"""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM clients WHERE name = ? AND kind = 'custom'", (client_name,)
+                )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def get_clients_version(self):
+        """Value that changes whenever the client list does
+
+        Ids are never reused (AUTOINCREMENT), so every insert raises the
+        largest id and every delete lowers the count; saving invoices does
+        not change it.
+        """
+        return tuple(self._query("SELECT COUNT(*), MAX(id) FROM clients")[0])
+
+    def get_predefined_clients(self):
+        """Get only predefined client names"""
+        rows = self._query("SELECT name FROM clients WHERE kind = 'predefined' ORDER BY id")
+        return [row[0] for row in rows]
+
+    def get_custom_clients(self):
+        """Get only custom client names"""
+        rows = self._query("SELECT name FROM clients WHERE kind = 'custom' ORDER BY id")
+        return [row[0] for row in rows]
+
+    def search_clients(self, query='', limit=None, offset=0, fuzzy=True):
+        """Find clients by name, one page at a time
+
+        With ``fuzzy`` every word of the query must appear somewhere in the
+        name; names starting with the query are listed first and read with
+        an indexed range scan, so only pages past them scan for the rest.
+        Without it only the prefix match is used.
+        Returns a (page of name/address dicts, total matches) tuple.
+        """
+        terms = _search_terms(query)
+        prefix = ' '.join(terms)
+        # Indexed range scan over names starting with prefix
+        in_prefix = "name_key >= ? AND name_key < ?"
+        prefix_range = [prefix, prefix + '\U0010ffff']
+        page_size = -1 if limit is None else limit
+
+        if not terms:
+            total = self._query("SELECT COUNT(*) FROM clients")[0][0]
+            rows = self._query(
+                "SELECT name, address FROM clients ORDER BY kind = 'custom', id LIMIT ? OFFSET ?",
+                [page_size, offset],
+            )
+        elif not fuzzy:
+            total = self._query(f"SELECT COUNT(*) FROM clients WHERE {in_prefix}", prefix_range)[0][0]
+            rows = self._query(
+                f"SELECT name, address FROM clients WHERE {in_prefix} ORDER BY name_key LIMIT ? OFFSET ?",
+                prefix_range + [page_size, offset],
+            )
+        else:
+            # Every prefix match contains every term, so the prefix matches
+            # are the first part of the fuzzy results
+            matches_all = " AND ".join("instr(name_key, ?) > 0" for _ in terms)
+            total = self._query(f"SELECT COUNT(*) FROM clients WHERE {matches_all}", terms)[0][0]
+            prefix_total = self._query(f"SELECT COUNT(*) FROM clients WHERE {in_prefix}", prefix_range)[0][0]
+            rows = []
+            if offset < prefix_total:
+                rows = self._query(
+                    f"SELECT name, address FROM clients WHERE {in_prefix} ORDER BY name_key LIMIT ? OFFSET ?",
+                    prefix_range + [page_size, offset],
+                )
+            if limit is None or len(rows) < limit:
+                rows += self._query(
+                    f"SELECT name, address FROM clients WHERE {matches_all} AND NOT ({in_prefix}) "
+                    f"ORDER BY name_key LIMIT ? OFFSET ?",
+                    terms + prefix_range + [-1 if limit is None else limit - len(rows),
+                                            max(0, offset - prefix_total)],
+                )
+        return [{'name': name, 'address': address} for name, address in rows], total
 
+def create_client_manager():
+    """Create the client manager for the store configured in CLIENT_STORE"""
+    if CLIENT_STORE == 'sqlite':
+        return SQLiteClientManager()
+    return ClientManager()
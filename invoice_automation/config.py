@@ -104,14 +104,64 @@ INVOICE_FIELDS = {
     }
 }
 
+# Line items (ExcelHandler.set_line_items): first and last template row of the
+# item table, and the column of each item field. More items than rows insert
+# rows above the last one, moving the totals block down.
+LINE_ITEM_ROWS = (21, 24)
+LINE_ITEM_COLUMNS = {
+    'sno': 'B',
+    'description': 'C',
+    'quantity': 'D',
+    'rate': 'E',
+    'budget': 'F',
+}
+
 # Header merged cell (B1 across B-F) that contains license/invoice/tax info
 INVOICE_HEADER_CELL = 'B1'
 
+# Prefix for auto-generated invoice numbers (e.g. INV-FY2526-001)
+INVOICE_NUMBER_PREFIX = 'INV-FY2526-'
+
+# Invoice writer backend: 'xml' patches the mapped cells straight into the
+# template file, 'openpyxl' round-trips the whole workbook object model
+EXCEL_WRITER = 'xml'
+
 # File paths (resolve relative to this config file so paths work regardless of CWD)
 import os
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 TEMPLATE_FILE = os.path.abspath(os.path.join(BASE_DIR, '..', 'Yazle_Invoice_Template_Final.xlsx'))
 OUTPUT_FOLDER = os.path.join(BASE_DIR, 'generated_invoices')
+# Invoice register (one row per issued invoice); indexed copy lives in DATA_DB_FILE
+REGISTER_FILE = os.path.abspath(os.path.join(BASE_DIR, '..', 'Yazle_Invoices_List.xlsx'))
+REGISTER_SHEET = 'Sales Invoices'
+# SQLite database for shared state (invoice number counter, ...)
+DATA_DB_FILE = os.path.join(BASE_DIR, 'invoice_data.db')
+
+# Cache of extracted BO PDF text and parse results, keyed by file hash
+BO_CACHE_FILE = os.path.join(BASE_DIR, 'bo_cache.db')
+BO_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Background jobs: worker processes started by the API (0 = run `python job_queue.py worker`
+# separately), items claimed per chunk, and seconds before a dead worker's items are retried
+JOBS_FOLDER = os.path.join(BASE_DIR, 'job_files')
+JOB_WORKERS = min(4, os.cpu_count() or 1)
+JOB_CHUNK_SIZE = 20
+JOB_LEASE_SECONDS = 600
+
+# Record API request and invoice pipeline timings, served at GET /metrics in the
+# Prometheus text format (False turns every timer into a no-op)
+METRICS_ENABLED = True
+
+# Client store backend: 'sqlite' (indexed, imports clients.json on first start) or 'json'
+CLIENT_STORE = 'sqlite'
+
+# Production API server (`python server.py`): preforked worker processes, seconds a
+# stopping worker waits for in-flight requests, and idle keep-alive timeout
+API_HOST = '0.0.0.0'
+API_PORT = 8000
+API_WORKERS = min(4, os.cpu_count() or 1)
+API_GRACEFUL_TIMEOUT = 30
+API_KEEPALIVE_SECONDS = 5
 
 # Validation rules
 VALIDATION_RULES = {
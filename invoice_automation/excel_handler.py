@@ -2,23 +2,279 @@
 Excel handler for reading and writing invoice data
 """
 
+import io
 import os
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
+import pickle
+import threading
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
 from config import TEMPLATE_FILE, INVOICE_FIELDS, OUTPUT_FOLDER
 import re
-from config import INVOICE_HEADER_CELL
+from config import INVOICE_HEADER_CELL, EXCEL_WRITER, LINE_ITEM_COLUMNS, LINE_ITEM_ROWS
+from field_layout import FIELD_LAYOUT, TemplateLayoutError, cell_ref, check_layout, split_lines
+from xlsx_patcher import XlsxCellPatcher, UnsupportedValueError, shift_refs
+
+# Rows below the template's item rows scanned for inserted line items when reading
+MAX_INSERTED_ROWS = 1000
+
+
+def _line_item_cells():
+    """Cell references of every line item row in the template"""
+    first, last = LINE_ITEM_ROWS
+    return [f"{column}{row}" for row in range(first, last + 1) for column in LINE_ITEM_COLUMNS.values()]
+
+
+def _mapped_cells():
+    """All cell references the invoice fields, line items and header may write to"""
+    return list(dict.fromkeys(FIELD_LAYOUT.refs + tuple(_line_item_cells())))
+
+
+def _row_insertion(extra_rows):
+    """(at, count, prototype row) of the rows inserted for ``extra_rows`` more line items"""
+    first, last = LINE_ITEM_ROWS
+    # Above the last item row, so its styling (bottom border) stays last and
+    # ranges over the item rows, like SUM(F21:F24), grow with them
+    return last, extra_rows, max(first, last - 1)
+
+
+@lru_cache(maxsize=256)
+def _placements(extra_rows):
+    """
+    Where every field's cells are after ``extra_rows`` inserted line item rows
+
+    Returns:
+        Mapping of field key -> ((template row, row, column, A1 ref), ...)
+    """
+    at, count, _ = _row_insertion(extra_rows)
+    placements = {}
+    for plan in FIELD_LAYOUT.fields:
+        cells = []
+        for (row, column), ref in zip(plan.cells, plan.refs):
+            if count and row >= at:
+                cells.append((row, row + count, column, cell_ref(row + count, column)))
+            else:
+                cells.append((row, row, column, ref))
+        placements[plan.key] = tuple(cells)
+    return MappingProxyType(placements)
+
+
+def overflow_cell():
+    """Serial number cell just below the template's item rows; only filled when rows were inserted"""
+    return f"{LINE_ITEM_COLUMNS['sno']}{LINE_ITEM_ROWS[1] + 1}"
+
+
+def insert_rows(worksheet, at, count, prototype_row):
+    """
+    Insert styled blank rows into an openpyxl worksheet, like XlsxCellPatcher.insert_rows
+
+    openpyxl's insert_rows only moves cell values and styles, so merged
+    ranges, formulas, row heights, images and the print area are shifted here.
+    """
+    from copy import copy
+
+    merged = [str(cell_range) for cell_range in worksheet.merged_cells.ranges]
+    for cell_range in merged:
+        worksheet.unmerge_cells(cell_range)
+    prototype = [(cell.column, copy(cell._style)) for cell in worksheet[prototype_row]]
+
+    worksheet.insert_rows(at, count)
+
+    for cell_range in merged:
+        worksheet.merge_cells(shift_refs(cell_range, at, count))
+    for row in worksheet.iter_rows():
+        for cell in row:
+            if cell.data_type == 'f' and isinstance(cell.value, str):
+                cell.value = shift_refs(cell.value, at, count)
+    dimensions = worksheet.row_dimensions
+    for row in sorted((row for row in dimensions if row >= at), reverse=True):
+        dimension = dimensions.pop(row)
+        dimension.index = row + count
+        dimensions[row + count] = dimension
+    for row in range(at, at + count):
+        if prototype_row in dimensions:
+            dimensions[row] = copy(dimensions[prototype_row])
+            dimensions[row].index = row
+        for column, style in prototype:
+            worksheet.cell(row=row, column=column)._style = copy(style)
+    for image in worksheet._images:
+        # Anchor rows are 0-based
+        for marker in (getattr(image.anchor, '_from', None), getattr(image.anchor, 'to', None)):
+            if marker is not None and marker.row >= at - 1:
+                marker.row += count
+    if worksheet.print_area:
+        worksheet.print_area = shift_refs(worksheet.print_area.split('!')[-1], at, count)
+
+
+def _invoice_sheet(workbook):
+    """Get the 'Invoice' sheet, or the first sheet if the template has none"""
+    sheet_name = 'Invoice' if 'Invoice' in workbook.sheetnames else workbook.sheetnames[0]
+    return workbook[sheet_name]
+
+
+def invoice_filename(invoice_no):
+    """Build a safe .xlsx filename from an invoice number"""
+    safe_name = str(invoice_no).strip().replace('/', '-').replace('\n', '_')
+    return f"{safe_name}.xlsx"
+
+
+def _join_cells(parts):
+    """Value of a multi-cell field: its cells joined with newlines"""
+    return "\n".join('' if v is None else str(v) for v in parts).strip()
+
+
+def _field_values(read_cell):
+    """Map every invoice field to its value, the way get_all_template_values does"""
+    values = {}
+    for plan in FIELD_LAYOUT.fields:
+        if plan.multi:
+            values[plan.key] = _join_cells([read_cell(ref) for ref in plan.refs])
+        else:
+            values[plan.key] = read_cell(plan.refs[0])
+    return values
+
+
+def read_invoice_values(path):
+    """
+    Read the invoice field values from a saved invoice file
+
+    Only the mapped cells are read, straight from the sheet XML, and
+    parsing stops once the last of them has been seen. Returns the same
+    dict as get_all_template_values on the loaded file, formulas included
+    as their text (e.g. '=F25+F26').
+    Invoices with inserted line item rows are read at the moved cells.
+    """
+    from xlsx_reader import read_cells
+
+    cells = _mapped_cells()
+    values = read_cells(path, cells + [overflow_cell()])
+    if values.get(overflow_cell()) is not None:
+        # Count the inserted rows by their serial numbers, then read the moved cells
+        first_row = LINE_ITEM_ROWS[1] + 1
+        column = LINE_ITEM_COLUMNS['sno']
+        serials = read_cells(path, [f"{column}{row}" for row in range(first_row, first_row + MAX_INSERTED_ROWS)])
+        extra_rows = 0
+        while serials.get(f"{column}{first_row + extra_rows}") is not None:
+            extra_rows += 1
+        at, count, _ = _row_insertion(extra_rows)
+        moved = {cell: shift_refs(cell, at, count) for cell in cells}
+        values = read_cells(path, list(moved.values()))
+        values = {cell: values.get(ref) for cell, ref in moved.items()}
+    return _field_values(values.get)
+
+
+def iter_invoice_values(paths):
+    """
+    Read the invoice field values from many saved invoice files
+
+    Yields:
+        Tuple of (path, field values dict or None, error message or None);
+        a file that cannot be read does not stop the others
+    """
+    for path in paths:
+        try:
+            yield path, read_invoice_values(path), None
+        except Exception as e:
+            yield path, None, f"{type(e).__name__}: {str(e)}"
+
+
+class TemplateCache:
+    """Parse each template once and hand out cheap, isolated workbook copies.
+
+    Entries are keyed by absolute path and modification time, so editing the
+    template on disk triggers a reparse on the next request. The parsed
+    workbook is kept as a pickled snapshot: unpickling a copy is an order of
+    magnitude cheaper than ``load_workbook`` and never shares state between
+    callers.
+    """
+
+    def __init__(self):
+        self._snapshots = {}
+        self._patchers = {}
+        self._lock = threading.Lock()
+
+    def _snapshot(self, template_path):
+        """Return the pickled workbook for the current version of the file"""
+        path = os.path.abspath(template_path)
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            entry = self._snapshots.get(path)
+            if entry is None or entry[0] != mtime:
+                # openpyxl is only imported once a template is parsed
+                from openpyxl import load_workbook
+                workbook = load_workbook(path)
+                # A cell reference that does not fit fails here, not mid-batch
+                check_layout(_invoice_sheet(workbook), FIELD_LAYOUT, _line_item_cells())
+                entry = (mtime, pickle.dumps(workbook, protocol=pickle.HIGHEST_PROTOCOL))
+                workbook.close()
+                self._snapshots[path] = entry
+            return entry[1]
+
+    def get(self, template_path):
+        """Get a private copy of the parsed template workbook"""
+        return pickle.loads(self._snapshot(template_path))
+
+    def get_patcher(self, template_path, extra_rows=0):
+        """
+        Get the compiled XML patcher and original mapped-cell values for a template
+
+        With ``extra_rows``, the patcher has that many line item rows inserted
+        and the values are keyed by the moved cells (new cells are None).
+        """
+        path = os.path.abspath(template_path)
+        snapshot = self._snapshot(path)
+        with self._lock:
+            entry = self._patchers.get(path)
+            if entry is None or entry[0] is not snapshot:
+                worksheet = _invoice_sheet(pickle.loads(snapshot))
+                cells = _mapped_cells()
+                patcher = XlsxCellPatcher(path, cells, sheet_name=worksheet.title)
+                values = {c: worksheet[c].value for c in cells}
+                # Expanded layouts by number of inserted rows
+                entry = (snapshot, patcher, values, {})
+                self._patchers[path] = entry
+            if not extra_rows:
+                return entry[1], entry[2]
+
+            expanded = entry[3].get(extra_rows)
+            if expanded is None:
+                at, count, prototype_row = _row_insertion(extra_rows)
+                patcher = entry[1].insert_rows(at, count, prototype_row)
+                values = dict.fromkeys(ref for ref, _, _ in patcher._slots)
+                for cell, value in entry[2].items():
+                    if isinstance(value, str) and value.startswith('='):
+                        value = shift_refs(value, at, count)
+                    values[shift_refs(cell, at, count)] = value
+                expanded = entry[3][extra_rows] = (patcher, values)
+            return expanded
+
+    def clear(self):
+        """Drop all cached templates"""
+        with self._lock:
+            self._snapshots.clear()
+            self._patchers.clear()
+
+
+# Shared by every ExcelHandler in the process
+template_cache = TemplateCache()
 
 
 class ExcelHandler:
     """Handle Excel operations for invoice template"""
     
-    def __init__(self, template_path=TEMPLATE_FILE):
-        """Initialize with template path"""
+    def __init__(self, template_path=TEMPLATE_FILE, writer=EXCEL_WRITER, output_folder=OUTPUT_FOLDER):
+        """Initialize with template path, writer backend ('xml' or 'openpyxl') and output folder"""
         self.template_path = template_path
+        self.writer = writer
+        self.output_folder = output_folder
         self.workbook = None
         self.worksheet = None
+        # State for the 'xml' writer: pending cell writes over the template values
+        self._patcher = None
+        self._template_values = {}
+        self._cell_values = {}
+        # Rows inserted for line items beyond the template's capacity
+        self._extra_rows = 0
         
     def load_template(self):
         """Load the template Excel file"""
@@ -26,13 +282,52 @@ class ExcelHandler:
             if not os.path.exists(self.template_path):
                 raise FileNotFoundError(f"Template file not found: {self.template_path}")
             
-            self.workbook = load_workbook(self.template_path)
+            self._cell_values = {}
+            self._extra_rows = 0
+            if self.writer == 'xml':
+                try:
+                    self._patcher, self._template_values = template_cache.get_patcher(self.template_path)
+                    self.workbook = None
+                    self.worksheet = None
+                    return True
+                except TemplateLayoutError:
+                    raise
+                except ValueError:
+                    # Template layout the patcher cannot handle; use openpyxl
+                    self._patcher = None
+
+            # Each load gets a fresh copy of the cached template, so values
+            # written for a previous invoice never leak into the next one
+            self.workbook = template_cache.get(self.template_path)
             # Get the first sheet or 'Invoice' sheet
-            sheet_name = 'Invoice' if 'Invoice' in self.workbook.sheetnames else self.workbook.sheetnames[0]
-            self.worksheet = self.workbook[sheet_name]
+            self.worksheet = _invoice_sheet(self.workbook)
             return True
         except Exception as e:
             raise Exception(f"Error loading template: {str(e)}")
+
+    def _read_cell(self, ref):
+        """Read a single cell from the workbook or the pending XML writes"""
+        if self.worksheet is not None:
+            return self.worksheet[ref].value
+        if ref in self._cell_values:
+            return self._cell_values[ref]
+        return self._template_values[ref]
+
+    def _write_cell(self, ref, value):
+        """Write a single cell to the workbook or the pending XML writes"""
+        if self.worksheet is not None:
+            self.worksheet[ref].value = value
+        else:
+            if ref not in self._template_values:
+                raise KeyError(f"{ref} is not a mapped invoice cell")
+            self._cell_values[ref] = value
+
+    def _layout_ref(self, ref):
+        """Where a template cell is now, after any inserted line item rows"""
+        if not self._extra_rows:
+            return ref
+        at, count, _ = _row_insertion(self._extra_rows)
+        return shift_refs(ref, at, count)
     
     def get_cell_value(self, cell_ref):
         """Get value from a specific cell"""
@@ -41,10 +336,11 @@ class ExcelHandler:
             if isinstance(cell_ref, (list, tuple)):
                 values = []
                 for c in cell_ref:
-                    values.append(self.worksheet[c].value if self.worksheet[c].value is not None else '')
+                    value = self._read_cell(self._layout_ref(c))
+                    values.append(value if value is not None else '')
                 # join with newline for multi-line fields
-                return "\n".join(str(v) for v in values).strip()
-            return self.worksheet[cell_ref].value
+                return _join_cells(values)
+            return self._read_cell(self._layout_ref(cell_ref))
         except Exception as e:
             raise Exception(f"Error reading cell {cell_ref}: {str(e)}")
     
@@ -53,58 +349,104 @@ class ExcelHandler:
         try:
             # support list of cells
             if isinstance(cell_ref, (list, tuple)):
-                # If value is a string with newlines, split into lines
-                if isinstance(value, str) and "\n" in value:
-                    parts = value.splitlines()
-                # If value is a list/tuple, use it directly
-                elif isinstance(value, (list, tuple)):
-                    parts = [str(v) for v in value]
-                else:
-                    # single scalar: write the same value to all target cells
-                    parts = [value]
-
-                # write parts into cells in order; if fewer parts than cells, fill remaining with empty string
-                # If only one part provided and multiple target cells, duplicate it
-                if len(parts) == 1 and len(cell_ref) > 1:
-                    parts = [parts[0]] * len(cell_ref)
-
-                for idx, c in enumerate(cell_ref):
-                    v = parts[idx] if idx < len(parts) else ''
-                    self.worksheet[c].value = v
+                # One line (or list item) per cell; a single value goes to every cell
+                for c, v in zip(cell_ref, split_lines(value, len(cell_ref))):
+                    self._write_cell(self._layout_ref(c), v)
                 return
-            self.worksheet[cell_ref].value = value
+            self._write_cell(self._layout_ref(cell_ref), value)
         except Exception as e:
             raise Exception(f"Error writing to cell {cell_ref}: {str(e)}")
     
+    def _read_field(self, plan):
+        """Read one field through its compiled plan"""
+        if self.worksheet is not None:
+            parts = [self.worksheet.cell(row=row, column=column).value
+                     for _, row, column, _ in _placements(self._extra_rows)[plan.key]]
+        else:
+            parts = [self._read_cell(ref) for _, _, _, ref in _placements(self._extra_rows)[plan.key]]
+        return _join_cells(parts) if plan.multi else parts[0]
+
     def get_all_template_values(self):
         """Get all template field values"""
         values = {}
         try:
-            for field_key, field_config in INVOICE_FIELDS.items():
-                cell_ref = field_config['cell']
+            for plan in FIELD_LAYOUT.fields:
                 try:
-                    values[field_key] = self.get_cell_value(cell_ref)
-                except:
-                    values[field_key] = ''
+                    values[plan.key] = self._read_field(plan)
+                except Exception:
+                    values[plan.key] = ''
             return values
         except Exception as e:
             raise Exception(f"Error reading template values: {str(e)}")
     
+    def set_line_items(self, items):
+        """
+        Write line items into the item rows (LINE_ITEM_ROWS)
+
+        More items than the template has rows for insert rows above the last
+        item row, moving the totals block and everything below it down.
+        Unused item rows are cleared. Amounts are written as given; use
+        invoice_totals.calculate_line_items to fill in each budget.
+
+        Args:
+            items: Dicts keyed like LINE_ITEM_COLUMNS (sno defaults to the item number)
+        """
+        try:
+            first, last = LINE_ITEM_ROWS
+            extra_rows = max(0, len(items) - (last - first + 1))
+            if extra_rows != self._extra_rows:
+                if self._extra_rows:
+                    raise ValueError("Line item rows were already inserted; load the template again first")
+                self._insert_item_rows(extra_rows)
+            for index in range(last - first + 1 + extra_rows):
+                item = items[index] if index < len(items) else {}
+                for key, column in LINE_ITEM_COLUMNS.items():
+                    value = item.get(key, index + 1 if key == 'sno' and item else None)
+                    self._write_cell(f"{column}{first + index}", value)
+        except Exception as e:
+            raise Exception(f"Error writing line items: {str(e)}")
+
+    def _insert_item_rows(self, extra_rows):
+        """Insert the rows for ``extra_rows`` more line items, moving pending writes with them"""
+        at, count, prototype_row = _row_insertion(extra_rows)
+        if self.worksheet is not None:
+            insert_rows(self.worksheet, at, count, prototype_row)
+        else:
+            self._patcher, self._template_values = template_cache.get_patcher(self.template_path, extra_rows)
+            self._cell_values = {shift_refs(ref, at, count): value for ref, value in self._cell_values.items()}
+        self._extra_rows = extra_rows
+
     def update_invoice(self, data_dict):
-        """Update invoice with provided data"""
+        """Update invoice with provided data (``line_items``: see set_line_items)"""
         try:
+            line_items = data_dict.get('line_items')
+            if line_items:
+                # Rows are laid out first, so every field below lands in its moved cell
+                self.set_line_items(line_items)
+            # Read-only fields are not in the write plan
+            writes = FIELD_LAYOUT.writes
+            placements = _placements(self._extra_rows)
+            first, last = LINE_ITEM_ROWS
+            worksheet = self.worksheet
             for field_key, value in data_dict.items():
-                if field_key in INVOICE_FIELDS:
-                    field_config = INVOICE_FIELDS[field_key]
-                    if not field_config.get('read_only', False):
-                        cell_ref = field_config['cell']
-                        # For date fields that may be strings, try to keep them as-is; the template will display string
-                        self.set_cell_value(cell_ref, value)
+                plan = writes.get(field_key)
+                if plan is None:
+                    continue
+                parts = plan.split(plan.coerce(value))
+                for (template_row, row, column, ref), part in zip(placements[field_key], parts):
+                    if line_items and first <= template_row <= last:
+                        # The item rows belong to the line items
+                        continue
+                    if worksheet is not None:
+                        worksheet.cell(row=row, column=column).value = part
+                    else:
+                        # Every planned cell is compiled into the patcher
+                        self._cell_values[ref] = part
             # If invoice_no provided, update the merged header cell by replacing existing invoice token
             inv = data_dict.get('invoice_no')
-            if inv and INVOICE_HEADER_CELL and self.worksheet is not None:
+            if inv and INVOICE_HEADER_CELL and (self.worksheet is not None or self._patcher is not None):
                 try:
-                    current = str(self.worksheet[INVOICE_HEADER_CELL].value or '')
+                    current = str(self._read_cell(INVOICE_HEADER_CELL) or '')
                     # replace first occurrence of pattern like INV-... with the new invoice
                     new_header = re.sub(r'INV-[A-Za-z0-9-]+', str(inv), current, count=1)
                     # if pattern not found, attempt to insert invoice between pipes if present
@@ -114,42 +456,68 @@ class ExcelHandler:
                         if len(parts) >= 3:
                             parts[1] = f" {inv} "
                             new_header = '|'.join(parts)
-                    self.worksheet[INVOICE_HEADER_CELL].value = new_header
+                    self._write_cell(INVOICE_HEADER_CELL, new_header)
                 except Exception:
                     pass
         except Exception as e:
             raise Exception(f"Error updating invoice: {str(e)}")
     
-    def save_invoice(self, output_filename=None):
-        """Save the modified invoice"""
+    def default_filename(self):
+        """Filename for the invoice, based on its invoice number when present"""
+        try:
+            inv_field = INVOICE_FIELDS.get('invoice_no', {})
+            inv_cell = inv_field.get('cell')
+            inv_val = None
+            if inv_cell:
+                inv_val = self.get_cell_value(inv_cell)
+            if inv_val:
+                safe_name = str(inv_val).strip().replace('/', '-').replace('\\\n', '_')
+                return f"{safe_name}.xlsx"
+        except Exception:
+            pass
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"Invoice_{timestamp}.xlsx"
+
+    def save_invoice(self, output_filename=None, data=None):
+        """Save the modified invoice (``data``: bytes already from render_bytes)"""
         try:
             # Create output folder if it doesn't exist
-            if not os.path.exists(OUTPUT_FOLDER):
-                os.makedirs(OUTPUT_FOLDER)
+            os.makedirs(self.output_folder, exist_ok=True)
             
             if output_filename is None:
                 # Try to use invoice_no from template as filename if present
-                try:
-                    inv_field = INVOICE_FIELDS.get('invoice_no', {})
-                    inv_cell = inv_field.get('cell')
-                    inv_val = None
-                    if inv_cell:
-                        inv_val = self.get_cell_value(inv_cell)
-                    if inv_val:
-                        safe_name = str(inv_val).strip().replace('/', '-').replace('\\\n', '_')
-                        output_filename = f"{safe_name}.xlsx"
-                    else:
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        output_filename = f"Invoice_{timestamp}.xlsx"
-                except Exception:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    output_filename = f"Invoice_{timestamp}.xlsx"
+                output_filename = self.default_filename()
             
-            output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-            self.workbook.save(output_path)
+            output_path = os.path.join(self.output_folder, output_filename)
+            with open(output_path, 'wb') as f:
+                f.write(self.render_bytes() if data is None else data)
             return output_path
         except Exception as e:
             raise Exception(f"Error saving invoice: {str(e)}")
+
+    def render_bytes(self):
+        """Serialize the invoice in memory, without touching the output folder"""
+        if self.worksheet is not None:
+            return self._save_workbook(self.workbook)
+
+        try:
+            return self._patcher.render(self._cell_values)
+        except UnsupportedValueError:
+            # e.g. datetime values need openpyxl's number-format handling
+            workbook = template_cache.get(self.template_path)
+            worksheet = _invoice_sheet(workbook)
+            if self._extra_rows:
+                insert_rows(worksheet, *_row_insertion(self._extra_rows))
+            for ref, value in self._cell_values.items():
+                worksheet[ref].value = value
+            return self._save_workbook(workbook)
+
+    @staticmethod
+    def _save_workbook(workbook):
+        """Save an openpyxl workbook to bytes"""
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
     
     def close(self):
         """Close the workbook"""
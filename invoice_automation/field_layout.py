@@ -0,0 +1,220 @@
+"""
+Compiled invoice field layout
+INVOICE_FIELDS is turned once into an immutable write plan: every field's
+cells as (row, column) integers, how a value is spread over a multi-cell
+field, the coercer for the field type and whether the field is written at
+all. ExcelHandler reuses the plan for every invoice instead of walking the
+config and parsing A1 references per cell, and checks it against the
+template when the template is loaded.
+"""
+
+import math
+import re
+from collections import namedtuple
+from functools import lru_cache, partial
+from types import MappingProxyType
+
+from config import INVOICE_FIELDS, INVOICE_HEADER_CELL
+
+
+_REF_RE = re.compile(r'^\$?([A-Z]{1,3})\$?([1-9]\d*)$')
+
+# Largest row and column of an .xlsx sheet
+MAX_ROW = 1048576
+MAX_COLUMN = 16384
+
+# One field: its cells (template coordinates, in config order), their A1
+# references, split(value) -> one value per cell, coerce(value) and writable
+FieldPlan = namedtuple('FieldPlan', 'key label cells refs multi split coerce writable')
+
+# The compiled layout: every field in config order, the writable ones by key,
+# the header cell ((row, column) or None) and all mapped references
+FieldLayout = namedtuple('FieldLayout', 'fields writes header header_ref refs')
+
+
+class TemplateLayoutError(ValueError):
+    """Raised when the field layout is invalid or does not fit the template"""
+
+
+def parse_ref(cell_ref):
+    """
+    Parse an A1 cell reference
+
+    Args:
+        cell_ref: e.g. 'F21' or '$F$21'
+
+    Returns:
+        Tuple of (row, column), both 1-based
+    """
+    match = _REF_RE.match(str(cell_ref))
+    if not match:
+        raise TemplateLayoutError(f"Invalid cell reference: {cell_ref!r}")
+    column = 0
+    for letter in match.group(1):
+        column = column * 26 + ord(letter) - 64
+    row = int(match.group(2))
+    if row > MAX_ROW or column > MAX_COLUMN:
+        raise TemplateLayoutError(f"Cell reference out of range: {cell_ref!r}")
+    return row, column
+
+
+@lru_cache(maxsize=None)
+def column_letter(column):
+    """Letters of a 1-based column number (6 -> 'F')"""
+    letters = ''
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def cell_ref(row, column):
+    """A1 reference of a (row, column) pair"""
+    return f"{column_letter(column)}{row}"
+
+
+def _keep(value):
+    """Coercer for text and date fields: values are written as given"""
+    return value
+
+
+def _to_number(value):
+    """Coercer for numeric fields: numeric text ('1,234.50') becomes a number, anything else is kept"""
+    if isinstance(value, str):
+        text = value.strip().replace(',', '')
+        if text and not text.startswith('='):
+            try:
+                number = int(text) if text.lstrip('+-').isdigit() else float(text)
+            except ValueError:
+                return value
+            if math.isfinite(number):
+                return number
+    return value
+
+
+_COERCERS = {
+    'numeric': _to_number,
+}
+
+
+def _single(value):
+    """Split strategy for one-cell fields"""
+    return (value,)
+
+
+def split_lines(value, count):
+    """
+    Split strategy for multi-cell fields
+
+    Text is written one line per cell and a list one item per cell, with
+    the remaining cells blanked; a single value is repeated in every cell.
+    """
+    if isinstance(value, str) and '\n' in value:
+        parts = value.splitlines()
+    elif isinstance(value, (list, tuple)):
+        parts = [str(v) for v in value]
+    else:
+        parts = [value]
+    if len(parts) == 1:
+        return (parts[0],) * count
+    return tuple(parts[index] if index < len(parts) else '' for index in range(count))
+
+
+def _compile_field(field_key, field_config):
+    """Build the plan for one field"""
+    cells = field_config.get('cell')
+    multi = isinstance(cells, (list, tuple))
+    refs = tuple(cells) if multi else (cells,)
+    if not refs:
+        raise TemplateLayoutError(f"Field {field_key} has no cells")
+    try:
+        coordinates = tuple(parse_ref(ref) for ref in refs)
+    except TemplateLayoutError as e:
+        raise TemplateLayoutError(f"Field {field_key}: {str(e)}")
+    return FieldPlan(
+        key=field_key,
+        label=field_config.get('label', field_key),
+        cells=coordinates,
+        refs=tuple(cell_ref(row, column) for row, column in coordinates),
+        multi=multi,
+        split=partial(split_lines, count=len(refs)) if multi else _single,
+        coerce=_COERCERS.get(field_config.get('type'), _keep),
+        writable=not field_config.get('read_only', False),
+    )
+
+
+def compile_field_layout(fields=INVOICE_FIELDS, header_cell=INVOICE_HEADER_CELL):
+    """
+    Compile the field config into a write plan
+
+    Args:
+        fields: Field config, as INVOICE_FIELDS
+        header_cell: Header cell rewritten with the invoice number (or None)
+
+    Returns:
+        FieldLayout
+
+    Raises:
+        TemplateLayoutError: For a bad cell reference or a cell written by two fields
+    """
+    plans = tuple(_compile_field(field_key, field_config) for field_key, field_config in fields.items())
+
+    owners = {}
+    for plan in plans:
+        for ref in plan.refs:
+            if plan.writable and owners.setdefault(ref, plan.key) != plan.key:
+                raise TemplateLayoutError(f"Cell {ref} is written by both {owners[ref]} and {plan.key}")
+
+    header = parse_ref(header_cell) if header_cell else None
+    header_ref = cell_ref(*header) if header else None
+    refs = ([header_ref] if header_ref else []) + [ref for plan in plans for ref in plan.refs]
+    return FieldLayout(
+        fields=plans,
+        writes=MappingProxyType({plan.key: plan for plan in plans if plan.writable}),
+        header=header,
+        header_ref=header_ref,
+        refs=tuple(dict.fromkeys(refs)),
+    )
+
+
+def check_layout(worksheet, layout, extra_refs=()):
+    """
+    Check that a layout fits a loaded template sheet
+
+    Every mapped cell must lie inside the sheet's used range and must not be
+    covered by a merged range it does not start, which openpyxl cannot write.
+
+    Args:
+        worksheet: openpyxl worksheet of the template
+        layout: FieldLayout
+        extra_refs: Other cells that will be written (e.g. line item cells)
+
+    Raises:
+        TemplateLayoutError: Listing every cell that does not fit
+    """
+    names = {}
+    for plan in layout.fields:
+        for ref in plan.refs:
+            names.setdefault(ref, plan.key)
+    if layout.header_ref:
+        names.setdefault(layout.header_ref, 'header')
+    for ref in extra_refs:
+        names.setdefault(ref, 'line items')
+
+    merged = [(r.min_row, r.min_col, r.max_row, r.max_col, str(r)) for r in worksheet.merged_cells.ranges]
+    problems = []
+    for ref, name in names.items():
+        row, column = parse_ref(ref)
+        if row > worksheet.max_row or column > worksheet.max_column:
+            problems.append(f"{ref} ({name}) is outside the sheet's used range A1:"
+                            f"{cell_ref(worksheet.max_row, worksheet.max_column)}")
+            continue
+        for min_row, min_col, max_row, max_col, text in merged:
+            if min_row <= row <= max_row and min_col <= column <= max_col and (row, column) != (min_row, min_col):
+                problems.append(f"{ref} ({name}) is inside merged range {text}")
+    if problems:
+        raise TemplateLayoutError(f"Invoice layout does not fit sheet {worksheet.title!r}: {'; '.join(problems)}")
+
+
+# Compiled once at import from config.py
+FIELD_LAYOUT = compile_field_layout()
@@ -0,0 +1,168 @@
+"""
+Batch invoice generation for month-end runs
+Spreads template fill and serialization over a pool of worker processes
+"""
+
+import csv
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from config import API_WORKERS
+from excel_handler import ExcelHandler
+
+
+# One handler per worker process, created by the pool initializer so the
+# template is parsed once per worker rather than once per invoice
+_worker_handler = None
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker():
+    """Warm up a worker process with its own template handler"""
+    global _worker_handler
+    _worker_handler = ExcelHandler()
+    _worker_handler.load_template()
+
+
+def render_invoice(job):
+    """
+    Fill and save a single invoice
+
+    Args:
+        job: Tuple of (row index, prepared invoice data, output filename)
+
+    Returns:
+        Result dict for the row
+    """
+    index, data, filename = job
+    handler = _worker_handler
+    if handler is None:
+        handler = ExcelHandler()
+    try:
+        handler.load_template()
+        handler.update_invoice(data)
+        output_path = handler.save_invoice(output_filename=filename)
+        return {
+            'row': index,
+            'success': True,
+            'invoice_no': data.get('invoice_no'),
+            'output_path': output_path,
+        }
+    except Exception as e:
+        return {
+            'row': index,
+            'success': False,
+            'invoice_no': data.get('invoice_no'),
+            'errors': [str(e)],
+        }
+
+
+def get_executor():
+    """
+    Get the shared worker pool
+
+    Created once under a lock, since API request threads may ask for it
+    together. Workers are spawned rather than forked from the threaded API
+    process, and each API worker gets its share of the cores.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=max(1, (os.cpu_count() or 1) // max(1, API_WORKERS)),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def render_invoices(jobs, executor=None):
+    """
+    Render many invoices in parallel
+
+    Args:
+        jobs: List of (row index, prepared invoice data, output filename)
+        executor: Optional executor to use instead of the shared pool
+
+    Returns:
+        List of result dicts in the same order as ``jobs``
+    """
+    if not jobs:
+        return []
+    if len(jobs) == 1 and executor is None:
+        # Not worth a round-trip through the pool
+        return [render_invoice(jobs[0])]
+
+    executor = executor or get_executor()
+    workers = getattr(executor, '_max_workers', 1) or 1
+    chunksize = max(1, len(jobs) // (workers * 4))
+    return list(executor.map(render_invoice, jobs, chunksize=chunksize))
+
+
+def shutdown_executor():
+    """Stop the shared worker pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _clean_row(row):
+    """Drop empty keys and normalize cell values from uploaded rows"""
+    cleaned = {}
+    for key, value in row.items():
+        if key is None or str(key).strip() == '':
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        elif isinstance(value, (datetime, date)):
+            # Spreadsheet dates arrive as objects; the API expects DD/MM/YYYY
+            value = value.strftime("%d/%m/%Y")
+        cleaned[str(key).strip()] = '' if value is None else value
+    return cleaned
+
+
+def read_invoice_rows(filename, stream):
+    """
+    Read invoice rows from an uploaded CSV or XLSX file
+
+    The first row holds the field keys (``invoice_no``, ``client_name``, ...).
+
+    Args:
+        filename: Uploaded filename, used to pick the format
+        stream: Binary file object
+
+    Returns:
+        List of row dicts
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+
+    if extension == '.csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+        return [_clean_row(row) for row in csv.DictReader(text)]
+
+    if extension in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(io.BytesIO(stream.read()), read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                return []
+            result = []
+            for values in rows:
+                if all(v is None or str(v).strip() == '' for v in values):
+                    continue
+                result.append(_clean_row(dict(zip(header, values))))
+            return result
+        finally:
+            workbook.close()
+
+    raise ValueError(f"Unsupported file type: {extension or filename}")
@@ -0,0 +1,302 @@
+"""
+Incremental indexer that backfills the invoice register from saved invoice files
+Each file's mtime and size are remembered, so a rescan only reads new or changed files
+
+Usage:
+    python invoice_indexer.py [folder] [--workers N] [--watch] [--interval SECONDS]
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from config import DATA_DB_FILE, OUTPUT_FOLDER
+from excel_handler import read_invoice_values
+from invoice_register import InvoiceRegister
+from invoice_totals import calculate_budget
+
+
+# Register rows are written in transactions of this many files
+BATCH_SIZE = 500
+
+_PERCENT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+
+
+def _number(value):
+    """A cell value as a float, or None for blanks, text and formulas"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        # Multi-cell fields are joined with newlines; the last cell holds the
+        # value (for budget, the subtotal below the line items)
+        text = value.split('\n')[-1].strip()
+        if text and not text.startswith('='):
+            try:
+                return float(text.replace(',', ''))
+            except ValueError:
+                return None
+    return None
+
+
+def _vat_percent(value):
+    """VAT percentage from a vat_rate cell: 5, '5', 'VAT(5%)' or 'VAT (5%)'"""
+    number = _number(value)
+    if number is not None:
+        return number
+    match = _PERCENT_RE.search(str(value or ''))
+    return float(match.group(1)) if match else 0.0
+
+
+def invoice_record(values):
+    """
+    Turn the field values of a saved invoice into a register record
+
+    Saved invoices often keep the template formulas (=F25+F26, =F12+30)
+    without cached results, so amounts and the due date are recomputed
+    from quantity, rate, VAT and date when the cell holds no number.
+    """
+    record = dict(values)
+    quantity = _number(values.get('quantity')) or 0.0
+    rate = _number(values.get('rate')) or 0.0
+    vat_percent = _vat_percent(values.get('vat_rate'))
+
+    budget = _number(values.get('budget'))
+    if budget is None:
+        budget = calculate_budget(quantity, rate)
+    vat_amount = _number(values.get('vat_amount'))
+    if vat_amount is None:
+        vat_amount = (budget * vat_percent) / 100
+    total_amount = _number(values.get('total_amount'))
+    if total_amount is None:
+        total_amount = budget + vat_amount
+    record.update({'budget': budget, 'vat_amount': vat_amount, 'total_amount': total_amount})
+
+    due_date = values.get('due_date')
+    if not due_date or (isinstance(due_date, str) and due_date.startswith('=')):
+        invoice_date = values.get('date')
+        if isinstance(invoice_date, str):
+            try:
+                invoice_date = datetime.strptime(invoice_date.strip(), "%d/%m/%Y")
+            except ValueError:
+                invoice_date = None
+        record['due_date'] = invoice_date + timedelta(days=30) if invoice_date else None
+    return record
+
+
+def read_invoice_file(path):
+    """
+    Read one saved invoice for the register
+
+    Failures are returned instead of raised, so one bad file never stops a scan.
+
+    Returns:
+        Tuple of (path, register record or None, error message or None)
+    """
+    try:
+        record = invoice_record(read_invoice_values(path))
+        if not record.get('invoice_no'):
+            return path, None, "No invoice number in file"
+        record['invoice_no'] = str(record['invoice_no']).strip()
+        return path, record, None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {str(e)}"
+
+
+class InvoiceIndexer:
+    """Keep the invoice register in step with a folder of saved invoices"""
+
+    def __init__(self, folder=OUTPUT_FOLDER, register=None, db_path=DATA_DB_FILE):
+        """
+        Initialize the indexer
+
+        Args:
+            folder: Folder of saved invoice .xlsx files
+            register: InvoiceRegister to fill (default: one on db_path)
+            db_path: SQLite database file holding the per-file state
+        """
+        self.folder = folder
+        self.db_path = db_path
+        self.register = register or InvoiceRegister(db_path)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS indexed_files ("
+                    "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, "
+                    "invoice_no TEXT, error TEXT, indexed_at TEXT NOT NULL)"
+                )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """Open a connection; each call gets its own so threads never share one"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _list_files(self):
+        """Map each invoice file in the folder to its (mtime_ns, size)"""
+        files = {}
+        if not os.path.isdir(self.folder):
+            return files
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                name = entry.name
+                # Skip Excel's ~$ lock files and anything that is not a workbook
+                if name.startswith('~$') or not name.lower().endswith('.xlsx') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files[os.path.abspath(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _known_files(self):
+        """Map each previously indexed file to its recorded (mtime_ns, size)"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT path, mtime_ns, size FROM indexed_files").fetchall()
+        finally:
+            conn.close()
+        return {path: (mtime_ns, size) for path, mtime_ns, size in rows}
+
+    def _save(self, results, files):
+        """Write one batch of read results to the register and the file state"""
+        records = [(path, record) for path, record, _ in results if record]
+        self.register.record_invoices([record for _, record in records], [path for path, _ in records])
+
+        now = datetime.now().isoformat(timespec='seconds')
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO indexed_files (path, mtime_ns, size, invoice_no, error, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (path, *files[path], record['invoice_no'] if record else None, error, now)
+                        for path, record, error in results
+                    ],
+                )
+        finally:
+            conn.close()
+
+    def scan(self, workers=None):
+        """
+        Index new and changed files and forget deleted ones
+
+        Args:
+            workers: Worker processes for reading files (default: one per core)
+
+        Returns:
+            Dict with counts of files seen, indexed, failed and removed, and
+            the elapsed seconds
+        """
+        start = time.perf_counter()
+        files = self._list_files()
+        known = self._known_files()
+
+        # Oldest first, so when two files carry the same invoice number the newest wins
+        changed = sorted((path for path, state in files.items() if known.get(path) != state),
+                         key=lambda path: files[path][0])
+        removed = [path for path in known if path not in files]
+
+        indexed = failed = 0
+        if changed:
+            workers = workers or os.cpu_count() or 1
+            if workers == 1 or len(changed) < 4:
+                results = map(read_invoice_file, changed)
+                executor = None
+            else:
+                executor = ProcessPoolExecutor(max_workers=min(workers, len(changed)))
+                chunksize = max(1, min(64, len(changed) // (workers * 4)))
+                results = executor.map(read_invoice_file, changed, chunksize=chunksize)
+            try:
+                batch = []
+                for result in results:
+                    batch.append(result)
+                    if len(batch) >= BATCH_SIZE:
+                        self._save(batch, files)
+                        batch = []
+                    if result[1]:
+                        indexed += 1
+                    else:
+                        failed += 1
+                if batch:
+                    self._save(batch, files)
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+
+        if removed:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany("DELETE FROM indexed_files WHERE path = ?", [(path,) for path in removed])
+            finally:
+                conn.close()
+
+        return {
+            'files': len(files),
+            'indexed': indexed,
+            'failed': failed,
+            'removed': len(removed),
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+
+    def watch(self, interval=2.0, workers=None, stop_event=None, on_scan=None):
+        """
+        Rescan the folder every ``interval`` seconds until stopped
+
+        Args:
+            interval: Seconds between scans
+            workers: Worker processes per scan
+            stop_event: Optional threading.Event that ends the loop
+            on_scan: Optional callback receiving each scan's result dict
+        """
+        while stop_event is None or not stop_event.is_set():
+            result = self.scan(workers=workers)
+            if on_scan:
+                on_scan(result)
+            if stop_event is not None:
+                stop_event.wait(interval)
+            else:
+                time.sleep(interval)
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Backfill the invoice register from saved invoice files")
+    parser.add_argument('folder', nargs='?', default=OUTPUT_FOLDER, help="Folder of invoice .xlsx files")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument('--watch', action='store_true', help="Keep rescanning for new and changed files")
+    parser.add_argument('--interval', type=float, default=2.0, help="Seconds between scans with --watch")
+    args = parser.parse_args(argv)
+
+    def report(result):
+        if result['indexed'] or result['failed'] or result['removed'] or not args.watch:
+            print(
+                f"{result['files']} file(s): {result['indexed']} indexed, {result['failed']} failed, "
+                f"{result['removed']} removed in {result['seconds']}s",
+                file=sys.stderr,
+            )
+
+    indexer = InvoiceIndexer(args.folder)
+    if args.watch:
+        try:
+            indexer.watch(interval=args.interval, workers=args.workers, on_scan=report)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    result = indexer.scan(workers=args.workers)
+    report(result)
+    return 1 if result['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
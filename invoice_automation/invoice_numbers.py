@@ -0,0 +1,101 @@
+"""
+Atomic invoice number allocation shared by the API, batch workers and UI
+Backed by a small SQLite table so numbers stay unique across processes
+"""
+
+import sqlite3
+from config import DATA_DB_FILE
+
+
+class InvoiceNumberAllocator:
+    """Claim invoice numbers (or blocks of them) in a single transaction"""
+
+    COUNTER = 'invoice'
+
+    def __init__(self, db_path=DATA_DB_FILE, initial_value=1):
+        """
+        Initialize the allocator
+
+        Args:
+            db_path: SQLite database file holding the counter
+            initial_value: Seed used only when the counter does not exist yet
+        """
+        self.db_path = db_path
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS counters ("
+                    "name TEXT PRIMARY KEY, next_value INTEGER NOT NULL)"
+                )
+                conn.execute(
+                    "INSERT OR IGNORE INTO counters (name, next_value) VALUES (?, ?)",
+                    (self.COUNTER, int(initial_value)),
+                )
+        finally:
+            conn.close()
+
+    def _connect(self):
+        """Open a connection; each call gets its own so threads never share one"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def peek(self):
+        """Get the next number that will be handed out, without claiming it"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT next_value FROM counters WHERE name = ?", (self.COUNTER,)
+            ).fetchone()
+            return row[0]
+        finally:
+            conn.close()
+
+    def reserve(self, count=1):
+        """
+        Claim ``count`` consecutive numbers
+
+        Returns:
+            The first number of the claimed block
+        """
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        conn = self._connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front, so the read and
+            # the increment cannot interleave with another process
+            conn.execute("BEGIN IMMEDIATE")
+            start = conn.execute(
+                "SELECT next_value FROM counters WHERE name = ?", (self.COUNTER,)
+            ).fetchone()[0]
+            conn.execute(
+                "UPDATE counters SET next_value = ? WHERE name = ?",
+                (start + count, self.COUNTER),
+            )
+            conn.commit()
+            return start
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, number):
+        """
+        Claim one given number, if it is the next one to be handed out
+
+        Returns:
+            True when the number was claimed, False when it was already
+            issued or is not the next one
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "UPDATE counters SET next_value = next_value + 1 WHERE name = ? AND next_value = ?",
+                    (self.COUNTER, int(number)),
+                )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
@@ -0,0 +1,637 @@
+"""
+PDF output for saved invoices
+The template's Invoice sheet is compiled once into a page layout: fills,
+borders and the fixed template text become a ready-made drawing stream,
+and only the mapped invoice cells are laid out per document. Writing a
+PDF then needs no Excel, LibreOffice or PDF library.
+
+Usage:
+    python invoice_pdf.py [files or folders ...] [--output DIR] [--workers N]
+"""
+
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from config import INVOICE_FIELDS, OUTPUT_FOLDER, TEMPLATE_FILE
+from excel_handler import _field_values, _invoice_sheet, _mapped_cells, overflow_cell
+from field_layout import FIELD_LAYOUT
+from invoice_indexer import invoice_record
+
+
+# A4 portrait, in points
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+
+# Advance widths (1/1000 em) of the standard Helvetica fonts for ' ' through '~'
+_HELVETICA = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+_HELVETICA_BOLD = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+)
+
+
+def _width_table(ascii_widths):
+    """Widths for every WinAnsi byte; bytes outside the table get the digit width"""
+    widths = [556] * 256
+    widths[32:127] = ascii_widths
+    widths[0x95] = 350  # bullet
+    widths[0xA0] = 278  # no-break space
+    return tuple(widths)
+
+
+# Font resource name and byte widths, by bold flag
+_FONTS = {False: (b'/F1', _width_table(_HELVETICA)), True: (b'/F2', _width_table(_HELVETICA_BOLD))}
+
+# Helvetica ascender and the gap kept between lines, as fractions of the font size
+_ASCENT = 0.718
+_LEADING = 1.2
+
+# Border line widths in points, by Excel border style
+_BORDER_WIDTHS = {
+    'hair': 0.25, 'thin': 0.5, 'dotted': 0.5, 'dashed': 0.5, 'dashDot': 0.5, 'dashDotDot': 0.5,
+    'medium': 1.0, 'mediumDashed': 1.0, 'mediumDashDot': 1.0, 'mediumDashDotDot': 1.0,
+    'slantDashDot': 1.0, 'double': 1.5, 'thick': 1.5,
+}
+
+# Excel character-width column units to points (7 px per character plus 5 px padding)
+_COLUMN_UNIT = 7 * 0.75
+_COLUMN_PADDING = 5 * 0.75
+_DEFAULT_COLUMN_WIDTH = 8.43
+
+_CELL_PADDING = 2.0
+
+# Mapped cell box: position (bottom-left, points), size and style
+LayoutCell = namedtuple('LayoutCell', 'ref x y width height size bold align valign wrap number_format')
+
+# A compiled page: drawing commands shared by every invoice, plus the mapped cell boxes
+InvoiceLayout = namedtuple('InvoiceLayout', 'background cells refs')
+
+_DATE_TOKEN_RE = re.compile(r'"[^"]*"|\\.|yyyy|yy|mmmm|mmm|mm|m|dddd|ddd|dd|d|hh|h|ss|s|am/pm|.', re.IGNORECASE)
+_DATE_TOKENS = {
+    'yyyy': '%Y', 'yy': '%y', 'mmmm': '%B', 'mmm': '%b', 'mm': '%m', 'dddd': '%A', 'ddd': '%a',
+    'dd': '%d', 'hh': '%H', 'ss': '%S', 'am/pm': '%p',
+}
+_BRACKET_RE = re.compile(r'\[[^\]]*\]')
+_CURRENCY_RE = re.compile(r'\[\$([^\]-]*)')
+_QUOTED_RE = re.compile(r'"[^"]*"')
+_DECIMALS_RE = re.compile(r'\.(0+)')
+
+# Cell reference -> invoice field, for mapped cells whose template value is a formula
+_FIELD_BY_CELL = {ref: plan.key for plan in FIELD_LAYOUT.fields for ref in plan.refs}
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def format_value(value, number_format='General'):
+    """
+    Display text of a cell value under an Excel number format
+
+    Covers what invoice templates use: fixed decimals, thousands
+    separators, percentages, currency symbols and date formats.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (datetime, date)):
+        return _format_date(value, number_format)
+    if not isinstance(value, (int, float)):
+        return str(value)
+
+    section = _QUOTED_RE.sub('', (number_format or 'General').split(';')[0])
+    if section == 'General' or not any(c in section for c in '0#'):
+        return f"{value:.11g}"
+    decimals = _DECIMALS_RE.search(section)
+    decimals = len(decimals.group(1)) if decimals else 0
+    if '%' in section:
+        return f"{value * 100:.{decimals}f}%"
+    text = f"{abs(value):,.{decimals}f}" if ',' in section else f"{abs(value):.{decimals}f}"
+    currency = _CURRENCY_RE.search(section)
+    symbol = currency.group(1) if currency else ('$' if '$' in _BRACKET_RE.sub('', section) else '')
+    if symbol:
+        text = f"{symbol} {text}"
+    return f"-{text}" if value < 0 else text
+
+
+def _format_date(value, number_format):
+    """Format a date with an Excel date format; day/month/year when the cell has none"""
+    from openpyxl.styles.numbers import is_date_format
+
+    if not number_format or not is_date_format(number_format):
+        return value.strftime('%d/%m/%Y')
+    parts = []
+    after_hour = False
+    for token in _DATE_TOKEN_RE.findall(_BRACKET_RE.sub('', number_format.split(';')[0])):
+        lower = token.lower()
+        if token.startswith('"'):
+            parts.append(token[1:-1])
+        elif token.startswith('\\'):
+            parts.append(token[1:])
+        elif lower in ('m', 'mm') and after_hour:
+            # After an hour, m/mm means minutes
+            parts.append(f"{getattr(value, 'minute', 0):02d}")
+        elif lower == 'm':
+            parts.append(str(value.month))
+        elif lower == 'd':
+            parts.append(str(value.day))
+        elif lower in ('h', 's'):
+            parts.append(str(getattr(value, 'hour' if lower == 'h' else 'second', 0)))
+        elif lower in _DATE_TOKENS:
+            parts.append(value.strftime(_DATE_TOKENS[lower]))
+        else:
+            parts.append(token)
+        if lower in ('h', 'hh'):
+            after_hour = True
+        elif lower[0] in 'yd':
+            after_hour = False
+    return ''.join(parts)
+
+
+def _encode(text):
+    """PDF string bytes for text, in the fonts' WinAnsi encoding"""
+    return text.replace('\u25cf', '\u2022').encode('cp1252', 'replace')
+
+
+def _escape(data):
+    """Escape bytes for a PDF literal string"""
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)').replace(b'\r', b'\\r')
+
+
+def _text_width(data, bold, size):
+    """Width of encoded text in points"""
+    widths = _FONTS[bold][1]
+    return sum(widths[byte] for byte in data) * size / 1000
+
+
+def _wrap(text, bold, size, width):
+    """Split text into lines no wider than ``width`` (single long words stay whole)"""
+    lines = []
+    for paragraph in text.split('\n'):
+        line = ''
+        for word in paragraph.split(' '):
+            candidate = f"{line} {word}" if line else word
+            if line and _text_width(_encode(candidate), bold, size) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+
+def _text_ops(cell, text, numeric):
+    """PDF text-drawing commands for one cell"""
+    size = cell.size
+    if cell.wrap:
+        lines = _wrap(text, cell.bold, size, cell.width - 2 * _CELL_PADDING)
+    else:
+        lines = text.split('\n')
+    leading = size * _LEADING
+    block = leading * len(lines)
+    if cell.valign == 'top':
+        block_top = cell.y + cell.height - _CELL_PADDING / 2
+    elif cell.valign in ('center', 'justify', 'distributed'):
+        block_top = cell.y + (cell.height + block) / 2
+    else:
+        block_top = cell.y + block + _CELL_PADDING / 2
+    align = cell.align or ('right' if numeric else 'left')
+
+    font = _FONTS[cell.bold][0]
+    ops = []
+    for index, line in enumerate(lines):
+        data = _encode(line.rstrip())
+        if not data:
+            continue
+        if align in ('right', 'center', 'centerContinuous'):
+            width = _text_width(data, cell.bold, size)
+            gap = cell.width - width
+            x = cell.x + (gap / 2 if align != 'right' else gap - _CELL_PADDING)
+        else:
+            x = cell.x + _CELL_PADDING
+        baseline = block_top - index * leading - (leading - size) / 2 - _ASCENT * size
+        ops.append(b'BT %s %.2f Tf %.2f %.2f Td (%s) Tj ET' % (font, size, x, baseline, _escape(data)))
+    return ops
+
+
+def compile_layout(template_path=TEMPLATE_FILE):
+    """
+    Get the compiled page layout of a template
+
+    Layouts are cached per process by path and modification time, so a
+    long-lived worker compiles the template once and picks up edits to it.
+
+    Args:
+        template_path: Path to the invoice template .xlsx
+
+    Returns:
+        InvoiceLayout
+    """
+    path = os.path.abspath(template_path)
+    mtime = os.stat(path).st_mtime_ns
+    with _layouts_lock:
+        entry = _layouts.get(path)
+        if entry is None or entry[0] != mtime:
+            try:
+                entry = (mtime, _compile(path))
+            except Exception as e:
+                raise Exception(f"Error compiling invoice layout: {str(e)}")
+            _layouts[path] = entry
+        return entry[1]
+
+
+def _print_bounds(worksheet):
+    """(min_col, min_row, max_col, max_row) of the drawn part of the sheet"""
+    from openpyxl.utils import range_boundaries
+
+    area = worksheet.print_area
+    if isinstance(area, (list, tuple)):
+        area = area[0] if area else None
+    if area:
+        min_col, min_row, max_col, max_row = range_boundaries(area.split('!')[-1].replace('$', ''))
+    else:
+        min_col, min_row, max_col, max_row = 1, 1, worksheet.max_column, worksheet.max_row
+
+    # Trim empty margins so the content is what gets centered on the page
+    used = [
+        (cell.column, cell.row)
+        for row in worksheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col)
+        for cell in row
+        if cell.value is not None or _fill_color(cell) or any(
+            getattr(cell.border, side).style for side in ('left', 'right', 'top', 'bottom')
+        )
+    ]
+    if not used:
+        return min_col, min_row, max_col, max_row
+    columns = [column for column, _ in used]
+    rows = [row for _, row in used]
+    return min(columns), min(rows), max(columns), max(rows)
+
+
+def _fill_color(cell):
+    """RGB fill of a cell as three 0-1 floats, or None for no or white fill"""
+    fill = cell.fill
+    if fill is None or fill.fill_type != 'solid' or fill.fgColor is None or fill.fgColor.type != 'rgb':
+        return None
+    rgb = str(fill.fgColor.rgb)[-6:].upper()
+    if rgb == 'FFFFFF' or not re.fullmatch(r'[0-9A-F]{6}', rgb):
+        return None
+    return tuple(int(rgb[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def _compile(path):
+    """Build the InvoiceLayout of a template file"""
+    from openpyxl import load_workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = load_workbook(path)
+    try:
+        worksheet = _invoice_sheet(workbook)
+        min_col, min_row, max_col, max_row = _print_bounds(worksheet)
+
+        column_widths = {}
+        default_width = worksheet.sheet_format.defaultColWidth or _DEFAULT_COLUMN_WIDTH
+        for dimension in worksheet.column_dimensions.values():
+            for column in range(dimension.min or 1, (dimension.max or dimension.min or 1) + 1):
+                column_widths[column] = 0 if dimension.hidden else (dimension.width or default_width)
+        default_height = worksheet.sheet_format.defaultRowHeight or 15
+
+        left = {}
+        x = 0.0
+        for column in range(min_col, max_col + 2):
+            left[column] = x
+            width = column_widths.get(column, default_width)
+            x += width * _COLUMN_UNIT + _COLUMN_PADDING if width else 0
+        top = {}
+        y = 0.0
+        for row in range(min_row, max_row + 2):
+            top[row] = y
+            dimension = worksheet.row_dimensions.get(row)
+            if dimension is None or not dimension.hidden:
+                y += (dimension.ht if dimension is not None and dimension.ht else None) or default_height
+
+        margins = worksheet.page_margins
+        margin_x = (margins.left if margins else 0.7) * 72
+        margin_y = (margins.top if margins else 0.75) * 72
+        content_width = left[max_col + 1]
+        content_height = top[max_row + 1]
+        scale = min(1.0, (PAGE_WIDTH - 2 * margin_x) / content_width, (PAGE_HEIGHT - 2 * margin_y) / content_height)
+        origin_x = (PAGE_WIDTH - content_width * scale) / 2
+        origin_y = PAGE_HEIGHT - margin_y
+
+        def box(min_c, min_r, max_c, max_r):
+            """(x, y, width, height) in page points of a cell range"""
+            x0 = origin_x + left[min_c] * scale
+            y0 = origin_y - top[max_r + 1] * scale
+            return x0, y0, (left[max_c + 1] - left[min_c]) * scale, (top[max_r + 1] - top[min_r]) * scale
+
+        merged = {}
+        hidden = set()
+        for cell_range in worksheet.merged_cells.ranges:
+            merged[(cell_range.min_row, cell_range.min_col)] = (
+                cell_range.min_col, cell_range.min_row, cell_range.max_col, cell_range.max_row
+            )
+            for row, column in cell_range.cells:
+                if (row, column) != (cell_range.min_row, cell_range.min_col):
+                    hidden.add((row, column))
+
+        mapped = set(_mapped_cells())
+        fills = []
+        lines = {}
+        static_text = []
+        cells = []
+        for row in worksheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+            for cell in row:
+                x0, y0, width, height = box(cell.column, cell.row, cell.column, cell.row)
+                color = _fill_color(cell)
+                if color and (cell.row, cell.column) not in hidden:
+                    bounds = merged.get((cell.row, cell.column), (cell.column, cell.row, cell.column, cell.row))
+                    fills.append((color, box(*bounds)))
+
+                # Shared edges of neighbouring cells are drawn once
+                border = cell.border
+                for side, segment in (
+                    ('left', (x0, y0, x0, y0 + height)),
+                    ('right', (x0 + width, y0, x0 + width, y0 + height)),
+                    ('top', (x0, y0 + height, x0 + width, y0 + height)),
+                    ('bottom', (x0, y0, x0 + width, y0)),
+                ):
+                    style = getattr(border, side).style
+                    if style:
+                        key = tuple(round(value, 2) for value in segment)
+                        lines[key] = max(lines.get(key, 0), _BORDER_WIDTHS.get(style, 0.5) * scale)
+
+                if (cell.row, cell.column) in hidden:
+                    continue
+                coordinate = f"{get_column_letter(cell.column)}{cell.row}"
+                if cell.value is None and coordinate not in mapped:
+                    continue
+                bounds = merged.get((cell.row, cell.column), (cell.column, cell.row, cell.column, cell.row))
+                alignment = cell.alignment
+                layout_cell = LayoutCell(
+                    coordinate, *box(*bounds),
+                    size=(cell.font.sz or 11) * scale,
+                    bold=bool(cell.font.b),
+                    align=None if alignment.horizontal in (None, 'general') else alignment.horizontal,
+                    valign=alignment.vertical,
+                    wrap=bool(alignment.wrap_text),
+                    number_format=cell.number_format,
+                )
+                if coordinate in mapped:
+                    cells.append(layout_cell)
+                elif not (isinstance(cell.value, str) and cell.value.startswith('=')):
+                    static_text.extend(_text_ops(
+                        layout_cell, format_value(cell.value, cell.number_format),
+                        isinstance(cell.value, (int, float, date)) and not isinstance(cell.value, bool),
+                    ))
+    finally:
+        workbook.close()
+
+    ops = []
+    for (red, green, blue), (x0, y0, width, height) in fills:
+        ops.append(b'%.3f %.3f %.3f rg %.2f %.2f %.2f %.2f re f' % (red, green, blue, x0, y0, width, height))
+    ops.append(b'0 g 0 G')
+    current_width = None
+    for (x1, y1, x2, y2), width in sorted(lines.items(), key=lambda item: item[1]):
+        if width != current_width:
+            ops.append(b'%.2f w' % width)
+            current_width = width
+        ops.append(b'%.2f %.2f m %.2f %.2f l S' % (x1, y1, x2, y2))
+    ops.extend(static_text)
+    return InvoiceLayout(
+        background=b'\n'.join(ops),
+        cells=tuple(cells),
+        refs=tuple(cell.ref for cell in cells),
+    )
+
+
+def _resolve_formulas(values):
+    """
+    Replace formulas in mapped cells with their results
+
+    Saved invoices keep the template formulas without cached results, so
+    budget, VAT, total and due date are recomputed like the indexer does.
+    """
+    formulas = [ref for ref, value in values.items() if isinstance(value, str) and value.startswith('=')]
+    if not formulas:
+        return values
+    record = invoice_record(_field_values(values.get))
+    values = dict(values)
+    for ref in formulas:
+        value = record.get(_FIELD_BY_CELL.get(ref))
+        values[ref] = None if isinstance(value, str) and value.startswith('=') else value
+    return values
+
+
+_PDF_HEADER = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+_PDF_OBJECTS = (
+    b'<< /Type /Catalog /Pages 2 0 R >>',
+    b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+    b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] '
+    b'/Resources << /Font << /F1 5 0 R /F2 6 0 R >> >> /Contents 4 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT),
+    None,  # page content stream
+    b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    None,  # document info
+)
+
+
+def render_pdf(values, layout, title=None):
+    """
+    Write a one-page invoice PDF
+
+    Args:
+        values: Dict of mapped cell reference -> value (formulas already resolved)
+        layout: InvoiceLayout from compile_layout
+        title: Optional document title
+
+    Returns:
+        PDF file bytes
+    """
+    ops = [layout.background]
+    for cell in layout.cells:
+        value = values.get(cell.ref)
+        if value is None or value == '':
+            continue
+        numeric = isinstance(value, (int, float, date)) and not isinstance(value, bool)
+        ops.extend(_text_ops(cell, format_value(value, cell.number_format), numeric))
+    content = zlib.compress(b'\n'.join(ops), 6)
+
+    objects = list(_PDF_OBJECTS)
+    objects[3] = b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(content), content)
+    objects[6] = b'<< /Title (%s) /Producer (Invoice Automation) >>' % _escape(_encode(title or 'Invoice'))
+
+    pdf = bytearray(_PDF_HEADER)
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    pdf += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R /Info 7 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def invoice_pdf_bytes(source, template_path=TEMPLATE_FILE):
+    """
+    Render a saved invoice as PDF
+
+    Args:
+        source: Path (or binary file object) of the invoice .xlsx
+        template_path: Template whose layout the invoice was made from
+
+    Returns:
+        PDF file bytes
+    """
+    from xlsx_reader import read_cells
+
+    layout = compile_layout(template_path)
+    values = read_cells(source, layout.refs + (overflow_cell(),))
+    if values.pop(overflow_cell(), None) is not None:
+        raise ValueError("Invoices with more line items than the template's item rows cannot be rendered as PDF")
+    values = _resolve_formulas(values)
+    invoice_no = values.get(INVOICE_FIELDS['invoice_no']['cell'])
+    return render_pdf(values, layout, title=str(invoice_no) if invoice_no else None)
+
+
+def pdf_filename(xlsx_path):
+    """Name of the PDF for an invoice file (same name, .pdf extension)"""
+    return os.path.splitext(os.path.basename(xlsx_path))[0] + '.pdf'
+
+
+def save_invoice_pdf(xlsx_path, pdf_path=None, template_path=TEMPLATE_FILE):
+    """
+    Render a saved invoice to a PDF file
+
+    Args:
+        xlsx_path: Path of the invoice .xlsx
+        pdf_path: Output path (default: next to the .xlsx with a .pdf extension)
+        template_path: Template whose layout the invoice was made from
+
+    Returns:
+        Path of the written PDF
+    """
+    pdf_path = pdf_path or os.path.join(os.path.dirname(os.path.abspath(xlsx_path)), pdf_filename(xlsx_path))
+    try:
+        data = invoice_pdf_bytes(xlsx_path, template_path)
+        with open(pdf_path, 'wb') as f:
+            f.write(data)
+        return pdf_path
+    except Exception as e:
+        raise Exception(f"Error writing invoice PDF: {str(e)}")
+
+
+def convert_invoice(job):
+    """
+    Convert one invoice, returning failures instead of raising them
+
+    Args:
+        job: Tuple of (xlsx path, pdf path or None, template path)
+
+    Returns:
+        Tuple of (xlsx path, pdf path or None, error message or None)
+    """
+    xlsx_path, pdf_path, template_path = job
+    try:
+        return xlsx_path, save_invoice_pdf(xlsx_path, pdf_path, template_path), None
+    except Exception as e:
+        return xlsx_path, None, str(e)
+
+
+def _init_worker(template_path):
+    """Compile the layout once when a worker process starts"""
+    compile_layout(template_path)
+
+
+def convert_invoices(paths, output_folder=None, workers=None, template_path=TEMPLATE_FILE):
+    """
+    Convert many saved invoices to PDF
+
+    The layout is compiled once per worker process and reused for every
+    file that worker converts.
+
+    Args:
+        paths: Invoice .xlsx paths
+        output_folder: Folder for the PDFs (default: next to each .xlsx)
+        workers: Worker processes (default: one per core)
+        template_path: Template whose layout the invoices were made from
+
+    Returns:
+        List of (xlsx path, pdf path or None, error message or None) in
+        the order of ``paths``
+    """
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+    jobs = [
+        (path, os.path.join(output_folder, pdf_filename(path)) if output_folder else None, template_path)
+        for path in paths
+    ]
+    if not jobs:
+        return []
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 4:
+        return [convert_invoice(job) for job in jobs]
+
+    workers = min(workers, len(jobs))
+    chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(template_path,)) as executor:
+        return list(executor.map(convert_invoice, jobs, chunksize=chunksize))
+
+
+def _invoice_files(targets):
+    """Expand files and folders into invoice .xlsx paths"""
+    paths = []
+    for target in targets:
+        if os.path.isdir(target):
+            paths.extend(
+                os.path.join(target, name) for name in sorted(os.listdir(target))
+                if name.lower().endswith('.xlsx') and not name.startswith('~$')
+            )
+        else:
+            paths.append(target)
+    return paths
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Convert saved invoices to PDF")
+    parser.add_argument('targets', nargs='*', default=[OUTPUT_FOLDER], help="Invoice .xlsx files or folders")
+    parser.add_argument('--output', default=None, help="Folder for the PDFs (default: next to each invoice)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = convert_invoices(_invoice_files(args.targets), args.output, args.workers)
+    failed = [(path, error) for path, pdf_path, error in results if not pdf_path]
+    for path, error in failed:
+        print(f"{path}: {error}", file=sys.stderr)
+    print(
+        f"{len(results) - len(failed)} PDF(s) written, {len(failed)} failed "
+        f"in {time.perf_counter() - start:.3f}s",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
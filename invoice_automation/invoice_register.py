@@ -0,0 +1,404 @@
+"""
+Invoice register: one row per issued invoice
+Kept in an indexed SQLite table and exported in bulk to Yazle_Invoices_List.xlsx
+
+Usage:
+    python invoice_register.py export [output.xlsx]
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+from copy import copy
+from datetime import date, datetime
+
+from config import DATA_DB_FILE, REGISTER_FILE, REGISTER_SHEET
+
+
+# Register columns in Yazle_Invoices_List.xlsx, in sheet order
+REGISTER_COLUMNS = [
+    'Invoice #', 'BO Numbers', 'Invoice Date', 'Agency', 'Campaign Name', 'Due Date',
+    'Base Value', 'Invoice Value', 'Overdue Days', 'Delivery Month', 'Comments',
+]
+
+_FIELDS = [
+    'invoice_no', 'bo_no', 'invoice_date', 'client_name', 'description', 'due_date',
+    'budget', 'vat_amount', 'total_amount', 'delivery_month', 'comments', 'output_path',
+]
+
+_AMOUNT_RE = re.compile(r'-?[\d,]*\.?\d+')
+
+
+def _iso_date(value):
+    """Normalize a date (object, DD/MM/YYYY or YYYY-MM-DD) to YYYY-MM-DD"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if not value:
+        return None
+    text = str(value).strip()
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def _month_key(value):
+    """Normalize a delivery month (date, MM/YYYY, YYYY-MM, "September 2025") to YYYY-MM"""
+    if isinstance(value, (datetime, date)):
+        return f"{value.year:04d}-{value.month:02d}"
+    if not value:
+        return None
+    text = str(value).strip()
+    for fmt in ("%m/%Y", "%Y-%m", "%d/%m/%Y", "%B %Y", "%b %Y"):
+        try:
+            parsed = datetime.strptime(text, fmt)
+            return f"{parsed.year:04d}-{parsed.month:02d}"
+        except ValueError:
+            pass
+    return None
+
+
+def _amount(value):
+    """Read an amount given as a number or text like 'USD 4,734.97'"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _AMOUNT_RE.search(str(value))
+    return float(match.group().replace(',', '')) if match else None
+
+
+def _usd(value):
+    """Format an amount the way the register sheet shows it"""
+    return None if value is None else f"USD {value:,.2f}"
+
+
+def _sheet_date(value):
+    """YYYY-MM-DD (or YYYY-MM) text back to a datetime for the sheet"""
+    if not value:
+        return None
+    if len(value) == 7:
+        value += '-01'
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+class InvoiceRegister:
+    """Indexed register of issued invoices
+
+    Lookups by invoice number use the primary key; client, BO, date and
+    delivery month filters each have their own index, so searches never
+    open the generated .xlsx files. The existing register workbook is
+    imported automatically the first time the table is created.
+    """
+
+    def __init__(self, db_path=DATA_DB_FILE, register_file=REGISTER_FILE):
+        """
+        Initialize the register
+
+        Args:
+            db_path: SQLite database file holding the index
+            register_file: Register workbook used for the first import and exports
+        """
+        self.db_path = db_path
+        self.register_file = register_file
+        self._export_lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        """Open a connection; each call gets its own so threads never share one"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        """Create the invoices table and import the register workbook if it is empty"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS invoices ("
+                "invoice_no TEXT PRIMARY KEY, "
+                "bo_no TEXT, "
+                "invoice_date TEXT, "
+                "client_name TEXT, "
+                "client_key TEXT, "
+                "description TEXT, "
+                "due_date TEXT, "
+                "budget REAL, "
+                "vat_amount REAL, "
+                "total_amount REAL, "
+                "delivery_month TEXT, "
+                "comments TEXT, "
+                "output_path TEXT, "
+                "updated_at TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_client_key ON invoices (client_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_bo_no ON invoices (bo_no)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_invoice_date ON invoices (invoice_date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_delivery_month ON invoices (delivery_month)")
+            if conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0] == 0:
+                self._upsert(conn, self._read_workbook(self.register_file), keep_comments=False)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _read_workbook(path):
+        """Read register rows from a workbook (empty list if it does not exist)"""
+        if not path or not os.path.exists(path):
+            return []
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            if REGISTER_SHEET not in workbook.sheetnames:
+                return []
+            rows = workbook[REGISTER_SHEET].iter_rows(min_row=2, values_only=True)
+            records = []
+            for values in rows:
+                values = (list(values) + [None] * len(REGISTER_COLUMNS))[:len(REGISTER_COLUMNS)]
+                invoice_no, bo_no, invoice_date, client, campaign, due, base, total, _, month, comments = values
+                if not invoice_no:
+                    continue
+                base, total = _amount(base), _amount(total)
+                records.append({
+                    'invoice_no': str(invoice_no).strip(),
+                    'bo_no': bo_no,
+                    'date': invoice_date,
+                    'client_name': client,
+                    'description': campaign,
+                    'due_date': due,
+                    'budget': base,
+                    'vat_amount': None if base is None or total is None else round(total - base, 2),
+                    'total_amount': total,
+                    'delivery_month': month,
+                    'comments': comments,
+                })
+            return records
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _row(data, output_path=None):
+        """Turn invoice data (as filled into the template) into a table row"""
+        client = data.get('client_name')
+        return (
+            str(data['invoice_no']).strip(),
+            str(data['bo_no']).strip() if data.get('bo_no') else None,
+            _iso_date(data.get('date')),
+            client,
+            client.casefold() if client else None,
+            data.get('description'),
+            _iso_date(data.get('due_date')),
+            _amount(data.get('budget')),
+            _amount(data.get('vat_amount')),
+            _amount(data.get('total_amount')),
+            _month_key(data.get('delivery_month')),
+            data.get('comments'),
+            output_path or data.get('output_path'),
+            datetime.now().isoformat(timespec='seconds'),
+        )
+
+    def _upsert(self, conn, records, keep_comments=True, output_paths=None):
+        """Insert or update rows; comments typed into the register survive re-saves"""
+        output_paths = output_paths or [None] * len(records)
+        rows = [self._row(data, path) for data, path in zip(records, output_paths) if data.get('invoice_no')]
+        comments = "COALESCE(excluded.comments, invoices.comments)" if keep_comments else "excluded.comments"
+        conn.executemany(
+            "INSERT INTO invoices (invoice_no, bo_no, invoice_date, client_name, client_key, description, "
+            "due_date, budget, vat_amount, total_amount, delivery_month, comments, output_path, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(invoice_no) DO UPDATE SET "
+            "bo_no = excluded.bo_no, invoice_date = excluded.invoice_date, "
+            "client_name = excluded.client_name, client_key = excluded.client_key, "
+            "description = excluded.description, due_date = excluded.due_date, "
+            "budget = excluded.budget, vat_amount = excluded.vat_amount, "
+            "total_amount = excluded.total_amount, delivery_month = excluded.delivery_month, "
+            f"comments = {comments}, "
+            "output_path = COALESCE(excluded.output_path, invoices.output_path), "
+            "updated_at = excluded.updated_at",
+            rows,
+        )
+        return len(rows)
+
+    def record_invoice(self, data, output_path=None):
+        """Add (or update) the register row for one saved invoice"""
+        self.record_invoices([data], [output_path])
+
+    def record_invoices(self, records, output_paths=None):
+        """
+        Add or update register rows for many invoices in one transaction
+
+        Args:
+            records: Invoice data dicts (invoice_no, client_name, bo_no, date, ...)
+            output_paths: Optional saved file path for each record
+
+        Returns:
+            Number of rows written
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                return self._upsert(conn, list(records), output_paths=output_paths)
+        finally:
+            conn.close()
+
+    def _query(self, sql, params=()):
+        """Run a read query and return all rows as dicts"""
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def get_invoice(self, invoice_no):
+        """Get the register row for an invoice number, or None"""
+        rows = self._query(
+            f"SELECT {', '.join(_FIELDS)} FROM invoices WHERE invoice_no = ?", (str(invoice_no).strip(),)
+        )
+        return rows[0] if rows else None
+
+    def search(self, invoice_no=None, client=None, bo_no=None, month_from=None, month_to=None,
+               date_from=None, date_to=None, limit=50, offset=0):
+        """
+        Find register rows, one page at a time
+
+        Args:
+            invoice_no: Invoice number prefix
+            client: Client name prefix (case-insensitive)
+            bo_no: Exact BO number
+            month_from / month_to: Delivery month range, inclusive (MM/YYYY or YYYY-MM)
+            date_from / date_to: Invoice date range, inclusive (DD/MM/YYYY or YYYY-MM-DD)
+            limit / offset: Page size and start; limit None returns every match
+
+        Returns:
+            Tuple of (page of row dicts ordered by invoice number, total matches)
+        """
+        conditions, params = [], []
+
+        def prefix(column, value):
+            # Indexed range scan over values starting with ``value``
+            conditions.append(f"{column} >= ? AND {column} < ?")
+            params.extend([value, value + '\U0010ffff'])
+
+        def bound(column, op, value, normalize, name):
+            normalized = normalize(value)
+            if normalized is None:
+                raise ValueError(f"Invalid {name}: {value}")
+            conditions.append(f"{column} {op} ?")
+            params.append(normalized)
+
+        if invoice_no:
+            prefix('invoice_no', str(invoice_no).strip())
+        if client:
+            prefix('client_key', str(client).strip().casefold())
+        if bo_no:
+            conditions.append("bo_no = ?")
+            params.append(str(bo_no).strip())
+        if month_from:
+            bound('delivery_month', '>=', month_from, _month_key, 'month_from')
+        if month_to:
+            bound('delivery_month', '<=', month_to, _month_key, 'month_to')
+        if date_from:
+            bound('invoice_date', '>=', date_from, _iso_date, 'date_from')
+        if date_to:
+            bound('invoice_date', '<=', date_to, _iso_date, 'date_to')
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        total = self._query(f"SELECT COUNT(*) AS n FROM invoices {where}", params)[0]['n']
+        rows = self._query(
+            f"SELECT {', '.join(_FIELDS)} FROM invoices {where} ORDER BY invoice_no LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset],
+        )
+        return rows, total
+
+    def export_xlsx(self, output=None, as_of=None):
+        """
+        Write every register row to the register workbook in one pass
+
+        The existing workbook is used as the layout, so its other sheets
+        (e.g. Credit Notes), header and cell styles are kept.
+
+        Args:
+            output: Path or binary file object (default: the register file itself)
+            as_of: Date used for Overdue Days (default: today)
+
+        Returns:
+            Number of rows exported
+        """
+        from openpyxl import Workbook, load_workbook
+
+        rows = self._query(f"SELECT {', '.join(_FIELDS)} FROM invoices ORDER BY invoice_no")
+        as_of = as_of or date.today()
+
+        with self._export_lock:
+            if self.register_file and os.path.exists(self.register_file):
+                workbook = load_workbook(self.register_file)
+            else:
+                workbook = Workbook()
+                workbook.active.title = REGISTER_SHEET
+            if REGISTER_SHEET not in workbook.sheetnames:
+                workbook.create_sheet(REGISTER_SHEET, 0)
+            sheet = workbook[REGISTER_SHEET]
+
+            # Reuse the first data row's styles for every exported row
+            styles = [copy(cell._style) for cell in sheet[2]] if sheet.max_row >= 2 else []
+            if sheet.max_row >= 2:
+                sheet.delete_rows(2, sheet.max_row - 1)
+            for column, header in enumerate(REGISTER_COLUMNS, 1):
+                sheet.cell(row=1, column=column, value=header)
+
+            for row_index, row in enumerate(rows, 2):
+                due = _sheet_date(row['due_date'])
+                overdue = max(0, (as_of - due.date()).days) if due else None
+                values = [
+                    row['invoice_no'], row['bo_no'], _sheet_date(row['invoice_date']),
+                    row['client_name'], row['description'], due,
+                    _usd(row['budget']), _usd(row['total_amount']), overdue,
+                    _sheet_date(row['delivery_month']), row['comments'],
+                ]
+                for column, value in enumerate(values, 1):
+                    cell = sheet.cell(row=row_index, column=column, value=value)
+                    if column <= len(styles):
+                        cell._style = copy(styles[column - 1])
+
+            if output is None or isinstance(output, str):
+                # Write next to the target and swap it in, so readers never see half a file
+                path = output or self.register_file
+                handle, temp_path = tempfile.mkstemp(suffix='.xlsx', dir=os.path.dirname(os.path.abspath(path)))
+                os.close(handle)
+                try:
+                    workbook.save(temp_path)
+                    os.replace(temp_path, path)
+                except Exception:
+                    os.unlink(temp_path)
+                    raise
+            else:
+                workbook.save(output)
+        return len(rows)
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != 'export':
+        print(__doc__.strip().split('\n\n')[-1], file=sys.stderr)
+        return 2
+    count = InvoiceRegister().export_xlsx(argv[1] if len(argv) > 1 else None)
+    print(f"Exported {count} invoice(s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
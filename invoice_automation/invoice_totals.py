@@ -0,0 +1,163 @@
+"""
+Invoice totals shared by the API, the batch endpoint and the Streamlit UI
+Budget, VAT, total and amount-in-words for one invoice or whole columns
+(numpy and pandas are only imported by the column functions)
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from amount_words import amount_in_words, amounts_in_words
+
+
+_CENT = Decimal(1)
+
+# Totals at or above this are not held as whole cents in the batch path's
+# Int64 column (half the int64 range, clear of float rounding at the edge)
+_MAX_BATCH_AMOUNT = 2 ** 62 / 100
+
+
+def round_cents(amount):
+    """
+    Round an amount to whole cents, half away from zero
+
+    The float is read as the decimal it prints as (so 1.005 is 101 cents,
+    not 100), which keeps the wording in line with what the sheet shows.
+    """
+    scaled = Decimal(repr(abs(float(amount)))) * 100
+    return int(scaled.quantize(_CENT, rounding=ROUND_HALF_UP))
+
+
+def calculate_budget(quantity, rate):
+    """Budget for a CPM line: quantity * rate / 1000"""
+    return (float(quantity) * float(rate)) / 1000
+
+
+def calculate_totals(quantity, rate, vat_percent, currency='USD'):
+    """
+    Calculate the derived amounts for one invoice
+
+    Args:
+        quantity: Impressions/units
+        rate: Rate per thousand
+        vat_percent: VAT percentage (0 or 5)
+        currency: Currency code used for total_in_words
+
+    Returns:
+        Dict with budget, vat_amount, total_amount, total_cents and
+        total_in_words
+    """
+    budget = calculate_budget(quantity, rate)
+    vat_amount = (budget * vat_percent) / 100
+    total_amount = budget + vat_amount
+    total_cents = round_cents(total_amount)
+    return {
+        'budget': budget,
+        'vat_amount': vat_amount,
+        'total_amount': total_amount,
+        'total_cents': total_cents,
+        'total_in_words': amount_in_words(total_cents, currency),
+    }
+
+
+def calculate_line_items(items, vat_percent, currency='USD'):
+    """
+    Calculate every line's budget and the invoice totals in one pass
+
+    Args:
+        items: Dicts with quantity and rate (other keys are kept)
+        vat_percent: VAT percentage (0 or 5)
+        currency: Currency code used for total_in_words
+
+    Returns:
+        Dict like calculate_totals, with budget as the subtotal of the
+        lines, plus 'items': copies of the items with their budget
+    """
+    lines = []
+    subtotal = 0.0
+    for item in items:
+        budget = calculate_budget(item.get('quantity', 0) or 0, item.get('rate', 0) or 0)
+        subtotal += budget
+        lines.append({**item, 'budget': budget})
+    vat_amount = (subtotal * vat_percent) / 100
+    total_amount = subtotal + vat_amount
+    total_cents = round_cents(total_amount)
+    return {
+        'budget': subtotal,
+        'vat_amount': vat_amount,
+        'total_amount': total_amount,
+        'total_cents': total_cents,
+        'total_in_words': amount_in_words(total_cents, currency),
+        'items': lines,
+    }
+
+
+def round_cents_array(amounts):
+    """
+    Vectorized round_cents
+
+    Rounds with float arithmetic, then recomputes only the values that sit
+    close enough to a half cent for float error to matter with round_cents,
+    so the result always equals the scalar path. NaN stays NaN.
+    """
+    import numpy as np
+
+    amounts = np.asarray(amounts, dtype=float).ravel()
+    scaled = np.abs(amounts) * 100
+    cents = np.floor(scaled + 0.5)
+    tolerance = np.maximum(1e-7, scaled * 1e-12)
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= tolerance
+    for index in np.flatnonzero(near_half):
+        cents[index] = round_cents(amounts[index])
+    return cents
+
+
+def calculate_totals_batch(quantity, rate, vat_percent, words=True, currency='USD'):
+    """
+    Calculate the derived amounts for many invoices at once
+
+    Inputs are columns (lists, arrays or Series) of equal length; a scalar
+    vat_percent applies to every row. Values that are not finite numbers
+    give NaN in every output column for that row. The arithmetic matches
+    calculate_totals exactly, row for row.
+
+    Args:
+        quantity: Quantity column
+        rate: Rate column
+        vat_percent: VAT percentage column or scalar
+        words: Also build the total_in_words column
+        currency: Currency code used for total_in_words
+
+    Returns:
+        DataFrame with budget, vat_amount, total_amount, total_cents and
+        (optionally) total_in_words, indexed like ``quantity``
+    """
+    import numpy as np
+    import pandas as pd
+
+    index = quantity.index if isinstance(quantity, pd.Series) else None
+    quantity = pd.to_numeric(pd.Series(quantity, index=index), errors='coerce').to_numpy(dtype=float)
+    rate = pd.to_numeric(pd.Series(rate, index=index), errors='coerce').to_numpy(dtype=float)
+    if np.ndim(vat_percent):
+        vat_percent = pd.to_numeric(pd.Series(vat_percent, index=index), errors='coerce').to_numpy(dtype=float)
+
+    budget = (quantity * rate) / 1000
+    vat_amount = (budget * vat_percent) / 100
+    total_amount = budget + vat_amount
+    # Infinite inputs ('inf', '1e400') and totals too large for whole cents
+    # in int64 are not usable amounts either
+    unusable = ~(np.abs(total_amount) < _MAX_BATCH_AMOUNT)
+    if unusable.any():
+        budget, vat_amount, total_amount = (np.where(unusable, np.nan, column)
+                                            for column in (budget, vat_amount, total_amount))
+    total_cents = round_cents_array(total_amount)
+
+    result = pd.DataFrame({
+        'budget': budget,
+        'vat_amount': vat_amount,
+        'total_amount': total_amount,
+        'total_cents': pd.array(total_cents, dtype='Int64'),
+    }, index=index)
+
+    if words:
+        result['total_in_words'] = amounts_in_words(result['total_cents'], currency)
+    return result
@@ -0,0 +1,627 @@
+"""
+Background jobs for long-running invoice work (batches, BO ingestion, register exports, PDFs)
+Jobs and their items persist in SQLite; worker processes claim items in small
+chunks, so one large job is shared by every worker and progress is per item
+
+Usage:
+    python job_queue.py worker [--workers N]
+"""
+
+import argparse
+import atexit
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from config import DATA_DB_FILE, JOBS_FOLDER, JOB_CHUNK_SIZE, JOB_LEASE_SECONDS, JOB_WORKERS
+
+
+# Item states; 'invalid' items failed validation when the job was submitted and are never retried
+PENDING, RUNNING, SUCCEEDED, FAILED, INVALID, CANCELLED = (
+    'pending', 'running', 'succeeded', 'failed', 'invalid', 'cancelled'
+)
+
+# kind -> (function(payloads, params) -> [(result, error or None)], on_finish(job) or None)
+HANDLERS = {}
+
+
+def register_handler(kind, run, on_finish=None):
+    """
+    Register the function that processes one chunk of a job kind's items
+
+    Args:
+        kind: Job kind name
+        run: Function taking (list of item payloads, job params plus
+            'job_id') and returning one (result, error message or None)
+            tuple per payload
+        on_finish: Optional function called with the job dict once the job
+            has no items left to process
+    """
+    HANDLERS[kind] = (run, on_finish)
+
+
+def _now():
+    """Current time as an ISO string for the job tables"""
+    return datetime.now().isoformat(timespec='seconds')
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue
+
+    Every method opens its own connection, so one instance can be shared by
+    request threads, and any number of processes can use the same database.
+    """
+
+    def __init__(self, db_path=DATA_DB_FILE):
+        """
+        Initialize the queue
+
+        Args:
+            db_path: SQLite database file holding the job tables
+        """
+        self.db_path = db_path
+        self._init_db()
+
+    def _connect(self):
+        """Open a connection; each call gets its own so threads never share one"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """Create the job tables"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    "id TEXT PRIMARY KEY, "
+                    "kind TEXT NOT NULL, "
+                    "status TEXT NOT NULL, "
+                    "params TEXT NOT NULL, "
+                    "cancel_requested INTEGER NOT NULL DEFAULT 0, "
+                    "created_at TEXT NOT NULL, "
+                    "started_at TEXT, "
+                    "finished_at TEXT)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS job_items ("
+                    "job_id TEXT NOT NULL, "
+                    "item_index INTEGER NOT NULL, "
+                    "status TEXT NOT NULL, "
+                    "payload TEXT NOT NULL, "
+                    "result TEXT, "
+                    "error TEXT, "
+                    "attempts INTEGER NOT NULL DEFAULT 0, "
+                    "claim TEXT, "
+                    "lease_until REAL, "
+                    "PRIMARY KEY (job_id, item_index))"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items (status)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at)")
+        finally:
+            conn.close()
+
+    def submit(self, kind, payloads, params=None, invalid=None):
+        """
+        Queue a job
+
+        Args:
+            kind: Registered job kind
+            payloads: JSON-serializable payload for each item
+            params: JSON-serializable parameters shared by every item
+            invalid: Optional {item index: error message} for items that are
+                recorded as failed without being processed
+
+        Returns:
+            The new job id
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        invalid = invalid or {}
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, kind, 'queued', json.dumps(params or {}, default=str), _now()),
+                )
+                conn.executemany(
+                    "INSERT INTO job_items (job_id, item_index, status, payload, error) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (job_id, index, INVALID if index in invalid else PENDING,
+                         json.dumps(payload, default=str), invalid.get(index))
+                        for index, payload in enumerate(payloads)
+                    ],
+                )
+                finished = self._refresh(conn, job_id)
+        finally:
+            conn.close()
+        if finished:
+            _run_on_finish(finished)
+        return job_id
+
+    def _refresh(self, conn, job_id):
+        """
+        Recompute a job's status from its items (inside the caller's transaction)
+
+        Returns:
+            The job dict if it just reached a final state, else None
+        """
+        job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+        ).fetchall())
+
+        if counts.get(PENDING, 0) + counts.get(RUNNING, 0):
+            status = 'running' if job['started_at'] else 'queued'
+        elif job['cancel_requested'] and counts.get(CANCELLED, 0):
+            status = 'cancelled'
+        elif counts.get(FAILED, 0) + counts.get(INVALID, 0):
+            status = 'failed'
+        else:
+            status = 'succeeded'
+
+        final = status in ('succeeded', 'failed', 'cancelled')
+        if status == job['status'] and (not final or job['finished_at']):
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?",
+            (status, _now() if final else None, job_id),
+        )
+        if final:
+            job = dict(job)
+            job.update(status=status, params=json.loads(job['params']))
+            return job
+        return None
+
+    def claim(self, chunk_size=JOB_CHUNK_SIZE, lease_seconds=JOB_LEASE_SECONDS):
+        """
+        Claim the next chunk of items to process, oldest job first
+
+        Items whose lease ran out (their worker died) are claimed again.
+
+        Returns:
+            Tuple of (job dict, claim token, list of (item index, payload)),
+            or None when there is nothing to do
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            first = conn.execute(
+                "SELECT job_id FROM job_items "
+                "WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY rowid LIMIT 1",
+                (PENDING, RUNNING, now),
+            ).fetchone()
+            if first is None:
+                conn.rollback()
+                return None
+            job_id = first['job_id']
+            items = conn.execute(
+                "SELECT item_index, payload FROM job_items "
+                "WHERE job_id = ? AND (status = ? OR (status = ? AND lease_until < ?)) "
+                "ORDER BY item_index LIMIT ?",
+                (job_id, PENDING, RUNNING, now, chunk_size),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE job_items SET status = ?, claim = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE job_id = ? AND item_index = ?",
+                [(RUNNING, token, now + lease_seconds, job_id, item['item_index']) for item in items],
+            )
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (_now(), job_id),
+            )
+            job = dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        job['params'] = json.loads(job['params'])
+        return job, token, [(item['item_index'], json.loads(item['payload'])) for item in items]
+
+    def complete(self, job_id, token, outcomes):
+        """
+        Store the outcome of claimed items
+
+        Items that were claimed again by another worker meanwhile are left alone.
+
+        Args:
+            job_id: Job the items belong to
+            token: Claim token returned by claim()
+            outcomes: List of (item index, result, error message or None)
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "UPDATE job_items SET status = ?, result = ?, error = ?, claim = NULL, lease_until = NULL "
+                    "WHERE job_id = ? AND item_index = ? AND claim = ?",
+                    [
+                        (FAILED if error else SUCCEEDED, json.dumps(result, default=str), error,
+                         job_id, index, token)
+                        for index, result, error in outcomes
+                    ],
+                )
+                finished = self._refresh(conn, job_id)
+        finally:
+            conn.close()
+        if finished:
+            _run_on_finish(finished)
+
+    def work_once(self, chunk_size=JOB_CHUNK_SIZE):
+        """
+        Claim and process one chunk of items
+
+        Returns:
+            Number of items processed (0 when the queue is empty)
+        """
+        claimed = self.claim(chunk_size)
+        if claimed is None:
+            return 0
+        job, token, items = claimed
+        indexes = [index for index, _ in items]
+        try:
+            run, _ = HANDLERS[job['kind']]
+            results = list(run([payload for _, payload in items], dict(job['params'], job_id=job['id'])))
+            outcomes = [(index, result, error) for index, (result, error) in zip(indexes, results)]
+            # A handler that returns too few results must not leave items claimed
+            outcomes += [
+                (index, None, f"Handler returned {len(results)} results for {len(items)} items")
+                for index in indexes[len(results):]
+            ]
+        except Exception as e:
+            outcomes = [(index, None, f"{type(e).__name__}: {str(e)}") for index in indexes]
+        self.complete(job['id'], token, outcomes)
+        return len(items)
+
+    def run_until_empty(self, chunk_size=JOB_CHUNK_SIZE):
+        """Process items in this process until none are left; returns how many were processed"""
+        total = 0
+        while True:
+            processed = self.work_once(chunk_size)
+            if not processed:
+                return total
+            total += processed
+
+    def get_job(self, job_id):
+        """
+        Get a job with its progress
+
+        Returns:
+            Job dict with per-status item counts and a 0-1 progress, or None
+        """
+        conn = self._connect()
+        try:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+        finally:
+            conn.close()
+        return self._summary(job, counts)
+
+    @staticmethod
+    def _summary(job, counts):
+        """Public view of a job row and its item counts"""
+        total = sum(counts.values())
+        done = total - counts.get(PENDING, 0) - counts.get(RUNNING, 0)
+        return {
+            'id': job['id'],
+            'kind': job['kind'],
+            'status': job['status'],
+            'total': total,
+            'succeeded': counts.get(SUCCEEDED, 0),
+            'failed': counts.get(FAILED, 0) + counts.get(INVALID, 0),
+            'cancelled': counts.get(CANCELLED, 0),
+            'pending': counts.get(PENDING, 0) + counts.get(RUNNING, 0),
+            'progress': round(done / total, 4) if total else 1.0,
+            'cancel_requested': bool(job['cancel_requested']),
+            'created_at': job['created_at'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at'],
+        }
+
+    def list_jobs(self, limit=20, offset=0):
+        """Most recent jobs first, with their progress"""
+        conn = self._connect()
+        try:
+            jobs = conn.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC, rowid DESC LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+            summaries = []
+            for job in jobs:
+                counts = dict(conn.execute(
+                    "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job['id'],)
+                ).fetchall())
+                summaries.append(self._summary(job, counts))
+        finally:
+            conn.close()
+        return summaries
+
+    def get_items(self, job_id, status=None, limit=100, offset=0):
+        """
+        Per-item results of a job, in item order
+
+        Args:
+            job_id: Job id
+            status: Optional item status filter ('failed' also returns invalid items)
+            limit: Page size
+            offset: Items to skip
+
+        Returns:
+            List of {'index', 'status', 'result', 'error', 'attempts'} dicts
+        """
+        where = "job_id = ?"
+        params = [job_id]
+        if status:
+            statuses = [FAILED, INVALID] if status == FAILED else [status]
+            where += f" AND status IN ({', '.join('?' * len(statuses))})"
+            params.extend(statuses)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT item_index, status, result, error, attempts FROM job_items WHERE {where} "
+                "ORDER BY item_index LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{
+            'index': row['item_index'],
+            'status': row['status'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'attempts': row['attempts'],
+        } for row in rows]
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: items not yet started are dropped, running ones finish
+
+        Returns:
+            Number of items cancelled, or None if the job does not exist
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                if conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is None:
+                    return None
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                cancelled = conn.execute(
+                    "UPDATE job_items SET status = ? WHERE job_id = ? AND status = ?",
+                    (CANCELLED, job_id, PENDING),
+                ).rowcount
+                finished = self._refresh(conn, job_id)
+        finally:
+            conn.close()
+        if finished:
+            _run_on_finish(finished)
+        return cancelled
+
+    def retry(self, job_id):
+        """
+        Queue a job's failed items again (items that failed validation are not retried)
+
+        Returns:
+            Number of items queued again, or None if the job does not exist
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                if conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is None:
+                    return None
+                retried = conn.execute(
+                    "UPDATE job_items SET status = ?, result = NULL, error = NULL WHERE job_id = ? AND status = ?",
+                    (PENDING, job_id, FAILED),
+                ).rowcount
+                if retried:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', cancel_requested = 0, finished_at = NULL WHERE id = ?",
+                        (job_id,),
+                    )
+        finally:
+            conn.close()
+        return retried
+
+
+def _run_on_finish(job):
+    """Call the job kind's finish hook; a failing hook never breaks the queue"""
+    _, on_finish = HANDLERS.get(job['kind'], (None, None))
+    if on_finish:
+        try:
+            on_finish(job)
+        except Exception as e:
+            print(f"Error finishing job {job['id']}: {str(e)}", file=sys.stderr)
+
+
+def job_folder(job_id):
+    """Folder for a job's uploaded inputs and produced files"""
+    return os.path.join(JOBS_FOLDER, job_id)
+
+
+# Job kinds. Heavy modules are imported inside the handlers, so the API
+# process pays for them only when it processes items itself.
+
+def _run_invoice_batch(payloads, params):
+    """Render prepared invoices and record the saved ones in the register"""
+    from invoice_batch import render_invoice
+    from invoice_register import InvoiceRegister
+
+    results = [render_invoice((payload['row'], payload['data'], payload['filename'])) for payload in payloads]
+    saved = [(payload['data'], result['output_path'])
+             for payload, result in zip(payloads, results) if result['success']]
+    if saved:
+        InvoiceRegister(params.get('db_path', DATA_DB_FILE)).record_invoices(
+            [data for data, _ in saved], [path for _, path in saved]
+        )
+    return [(result, None if result['success'] else '; '.join(result['errors'])) for result in results]
+
+
+def _run_bo_ingest(payloads, params):
+    """Parse uploaded BO PDFs"""
+    from bo_ingest import ingest_bo_pdf
+
+    outcomes = []
+    for payload in payloads:
+        result = ingest_bo_pdf((payload['path'], payload.get('member')), include_text=params.get('include_text', False))
+        result['file'] = payload['name']
+        outcomes.append((result, None if result['success'] else result['error']))
+    return outcomes
+
+
+def _finish_bo_ingest(job):
+    """Drop the uploaded PDFs unless some failed and may be retried"""
+    if job['status'] != 'failed':
+        shutil.rmtree(job['params'].get('folder') or job_folder(job['id']), ignore_errors=True)
+
+
+def _run_register_export(payloads, params):
+    """Write the register workbook into the job folder"""
+    from invoice_register import InvoiceRegister
+    from config import REGISTER_FILE
+
+    register_file = params.get('register_file', REGISTER_FILE)
+    register = InvoiceRegister(params.get('db_path', DATA_DB_FILE), register_file)
+    filename = os.path.basename(register_file)
+    folder = job_folder(params['job_id'])
+    os.makedirs(folder, exist_ok=True)
+    rows = register.export_xlsx(os.path.join(folder, filename))
+    return [({'rows': rows, 'filename': filename}, None) for _ in payloads]
+
+
+def _run_invoice_pdf(payloads, params):
+    """Convert saved invoices to PDFs in the job folder"""
+    from invoice_pdf import convert_invoice, pdf_filename
+    from config import TEMPLATE_FILE
+
+    folder = job_folder(params['job_id'])
+    os.makedirs(folder, exist_ok=True)
+    outcomes = []
+    for payload in payloads:
+        filename = pdf_filename(payload['path'])
+        _, pdf_path, error = convert_invoice((payload['path'], os.path.join(folder, filename), TEMPLATE_FILE))
+        outcomes.append(({'invoice_no': payload['invoice_no'], 'filename': filename}, None) if pdf_path
+                        else (None, error))
+    return outcomes
+
+
+register_handler('invoice_batch', _run_invoice_batch)
+register_handler('bo_ingest', _run_bo_ingest, _finish_bo_ingest)
+register_handler('register_export', _run_register_export)
+register_handler('invoice_pdf', _run_invoice_pdf)
+
+
+# Worker processes
+
+def run_worker(db_path=DATA_DB_FILE, stop_event=None, poll_interval=0.5):
+    """
+    Process queued items until ``stop_event`` is set
+
+    Args:
+        db_path: SQLite database file holding the job tables
+        stop_event: Event that ends the loop (runs forever when None)
+        poll_interval: Seconds to wait when the queue is empty
+    """
+    queue = JobQueue(db_path)
+    while stop_event is None or not stop_event.is_set():
+        try:
+            processed = queue.work_once()
+        except sqlite3.OperationalError as e:
+            # A busy database is retried on the next poll rather than killing the worker
+            print(f"Job worker error: {str(e)}", file=sys.stderr)
+            processed = 0
+        if not processed:
+            if stop_event is not None:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+
+
+_workers = []
+_stop_event = None
+# Request threads may start workers together (job submit and retry)
+_workers_lock = threading.Lock()
+
+
+def start_workers(count=JOB_WORKERS, db_path=DATA_DB_FILE):
+    """
+    Start the worker processes once per process (later calls are no-ops)
+
+    Workers are spawned rather than forked, since the API process runs
+    request threads. They are stopped when the interpreter exits.
+
+    Returns:
+        Number of running workers
+    """
+    global _stop_event
+    with _workers_lock:
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        if _workers or count <= 0:
+            return len(_workers)
+
+        context = multiprocessing.get_context('spawn')
+        _stop_event = context.Event()
+        for _ in range(count):
+            worker = context.Process(target=run_worker, args=(db_path, _stop_event), name='invoice-job-worker')
+            worker.start()
+            _workers.append(worker)
+        return len(_workers)
+
+
+@atexit.register
+def stop_workers(timeout=30):
+    """Ask the workers to finish their current chunk and exit"""
+    with _workers_lock:
+        if _stop_event is not None:
+            _stop_event.set()
+        for worker in _workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        _workers.clear()
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument('command', choices=['worker'])
+    parser.add_argument('--workers', type=int, default=JOB_WORKERS, help="Worker processes")
+    args = parser.parse_args(argv)
+
+    if args.workers <= 1:
+        try:
+            run_worker()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    start_workers(args.workers)
+    try:
+        for worker in list(_workers):
+            worker.join()
+    except KeyboardInterrupt:
+        stop_workers()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
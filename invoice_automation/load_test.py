@@ -0,0 +1,193 @@
+"""
+Load test for the production API server
+Starts `server.py` with each requested number of workers, drives it from
+concurrent keep-alive clients for a fixed time and reports requests/sec and
+latency percentiles per worker count. Nothing is saved: the mix renders
+invoices with /api/invoice/download (not persisted), validates them and
+searches clients.
+
+Usage:
+    python load_test.py [--workers 1 2 4] [--concurrency 8] [--duration 10] [--json FILE]
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_INVOICE = {
+    'invoice_no': 'INV-LOAD-00001',
+    'client_name': 'Optimum Media Direction FZ-LLC',
+    'client_address': 'Dubai Media City, Dubai, United Arab Emirates',
+    'client_trn': '100041433200003',
+    'date': '20/01/2026',
+    'bo_no': 'OD25|25113|1',
+    'delivery_month': 'Oct-25',
+    'description': "APAC K-Celeb W2 Youku | Oct'2025",
+    'quantity': 172859,
+    'rate': 22.23,
+    'vat_rate': 'UAE GCC (5%)',
+}
+
+# name -> (method, path, JSON body)
+REQUESTS = {
+    'download': ('POST', '/api/invoice/download', SAMPLE_INVOICE),
+    'validate': ('POST', '/api/invoice/validate', SAMPLE_INVOICE),
+    'clients': ('GET', '/api/clients?q=dub&limit=20', None),
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def start_server(workers, port=0):
+    """
+    Start server.py and wait until it answers /health
+
+    Returns:
+        (process, port)
+    """
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, 'server.py'), '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--job-workers', '0'],
+        cwd=BASE_DIR, stdout=subprocess.PIPE, text=True,
+    )
+    match = re.search(r':(\d+) ', process.stdout.readline())
+    if not match:
+        process.kill()
+        raise RuntimeError("server.py did not report its port")
+    port = int(match.group(1))
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process, port
+        except OSError:
+            if time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("server.py did not become healthy")
+            time.sleep(0.1)
+
+
+def stop_server(process, timeout=60):
+    """Stop the server gracefully and return its exit status"""
+    process.send_signal(signal.SIGTERM)
+    try:
+        return process.wait(timeout)
+    finally:
+        process.stdout.close()
+
+
+def _client(args):
+    """Send the request mix over one keep-alive connection until the deadline"""
+    port, names, deadline = args
+    latencies = []
+    errors = 0
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Content-Type': 'application/json'}
+    i = 0
+    while time.time() < deadline:
+        method, path, body = REQUESTS[names[i % len(names)]]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies, errors
+
+
+def run_load(port, concurrency=8, duration=10.0, names=tuple(REQUESTS)):
+    """
+    Drive a running server from ``concurrency`` client processes
+
+    Returns:
+        Dict with requests, errors, rps and p50/p90/p99 latency in ms
+    """
+    names = list(names)
+    # A short warm-up so every worker has served the mix once
+    _client((port, names, time.time() + 0.5))
+
+    context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    start = time.perf_counter()
+    deadline = time.time() + duration
+    with context.Pool(concurrency) as pool:
+        # Staggered request order, so clients do not move through the mix in lockstep
+        outcomes = pool.map(_client, [(port, names[i % len(names):] + names[:i % len(names)], deadline)
+                                      for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for result, _ in outcomes for latency in result)
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in outcomes),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Load test server.py against the number of workers")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="Worker counts to test")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent client connections")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per worker count")
+    parser.add_argument('--requests', nargs='+', default=list(REQUESTS), metavar='NAME',
+                        help=f"Request mix (default: {' '.join(REQUESTS)})")
+    parser.add_argument('--json', dest='json_file', help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.requests if name not in REQUESTS]
+    if unknown:
+        parser.error(f"unknown request(s): {', '.join(unknown)}")
+
+    print(f"🚦 {args.concurrency} clients for {args.duration:g}s each, mix: {', '.join(args.requests)} "
+          f"({os.cpu_count()} CPUs)")
+    print(f"   {'workers':>7} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    results = []
+    for workers in args.workers:
+        process, port = start_server(workers)
+        try:
+            result = run_load(port, args.concurrency, args.duration, args.requests)
+        finally:
+            status = stop_server(process)
+        result.update(workers=workers, shutdown_status=status)
+        results.append(result)
+        print(f"   {workers:>7} {result['requests']:>9,} {result['errors']:>7,} {result['rps']:>9,.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p90_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump({'concurrency': args.concurrency, 'duration': args.duration,
+                       'requests': args.requests, 'cpus': os.cpu_count(), 'results': results}, f, indent=2)
+    return 1 if any(result['errors'] or result['shutdown_status'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+In-process metrics exposed in the Prometheus text format
+Counters and histograms for API requests and the stages of the invoice
+pipeline; with METRICS_ENABLED off every timer is a shared no-op
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from config import METRICS_ENABLED
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_enabled = METRICS_ENABLED
+
+
+def _escape(value):
+    """Escape a label value for the text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=''):
+    """Render '{a="1",b="2"}' for a sample, or '' without labels"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    """Sample value as the text format writes it"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        """Add ``amount`` to the count for the given label values (in labelnames order)"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        """Current count for a label set"""
+        return self._values.get(labels, 0)
+
+    def clear(self):
+        """Forget every label set"""
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        """Sample lines in the text format"""
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labelnames, labels)} {_number(value)}" for labels, value in items]
+
+
+class Histogram:
+    """Bucketed observations per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """Record one observation for the given label values (in labelnames order)"""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels):
+        """Number of observations for a label set"""
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def total(self, *labels):
+        """Sum of the observations for a label set"""
+        entry = self._values.get(labels)
+        return entry[1] if entry else 0.0
+
+    def clear(self):
+        """Forget every label set"""
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        """Sample lines in the text format, with cumulative buckets"""
+        with self._lock:
+            items = sorted((labels, (list(entry[0]), entry[1], entry[2])) for labels, entry in self._values.items())
+        lines = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together for a scrape"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric (names must be unique) and return it"""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def clear(self):
+        """Reset every registered metric"""
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'invoice_api_requests_total', 'API requests by endpoint, method and status', ('endpoint', 'method', 'status')))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'invoice_api_request_seconds', 'API request latency by endpoint', ('endpoint',)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'invoice_stage_seconds', 'Time spent in each stage of an endpoint', ('endpoint', 'stage')))
+ERRORS = REGISTRY.register(Counter(
+    'invoice_errors_total', 'Failed requests by endpoint and the stage that failed', ('endpoint', 'stage')))
+INVOICES = REGISTRY.register(Counter(
+    'invoice_invoices_produced_total', 'Invoices rendered by endpoint', ('endpoint',)))
+
+
+class _StageTimer:
+    """Context manager observing the time of one stage; exceptions count as errors"""
+
+    __slots__ = ('endpoint', 'stage', 'start')
+
+    def __init__(self, endpoint, stage):
+        self.endpoint = endpoint
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.endpoint, self.stage)
+        if exc_type is not None:
+            ERRORS.inc(1, self.endpoint, self.stage)
+        return False
+
+
+class _NoOpTimer:
+    """Stand-in timer used while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_OP = _NoOpTimer()
+
+
+def enabled():
+    """Whether metrics are being recorded"""
+    return _enabled
+
+
+def set_enabled(flag):
+    """Turn recording on or off at runtime"""
+    global _enabled
+    _enabled = bool(flag)
+
+
+def stage(endpoint, name):
+    """
+    Time one stage of an endpoint
+
+    Usage:
+        with stage('save', 'update_invoice'):
+            handler.update_invoice(data)
+    """
+    return _StageTimer(endpoint, name) if _enabled else _NO_OP
+
+
+def count_error(endpoint, name):
+    """Count a failure that is reported without an exception (e.g. validation)"""
+    if _enabled:
+        ERRORS.inc(1, endpoint, name)
+
+
+def count_invoices(endpoint, amount=1):
+    """Count invoices produced by an endpoint"""
+    if _enabled and amount:
+        INVOICES.inc(amount, endpoint)
+
+
+def observe_request(endpoint, method, status, seconds):
+    """Record one finished API request"""
+    if _enabled:
+        REQUESTS.inc(1, endpoint, method, status)
+        REQUEST_SECONDS.observe(seconds, endpoint)
+
+
+def render():
+    """Current metrics in the Prometheus text format"""
+    return REGISTRY.render()
@@ -0,0 +1,236 @@
+"""
+Production server for the invoice API
+Preforks worker processes that share one listening socket. Each worker runs a
+threaded WSGI server over api.create_app(), warms the template cache and
+client store before it accepts a connection, and on SIGTERM stops accepting
+and drains its in-flight requests (saves included) before exiting.
+
+Job workers are started once by the master instead of by every API worker.
+Metrics at /metrics are per worker process.
+
+Usage:
+    python server.py [--host 0.0.0.0] [--port 8000] [--workers 4]
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+from config import (API_GRACEFUL_TIMEOUT, API_HOST, API_KEEPALIVE_SECONDS, API_PORT,
+                    API_WORKERS, JOB_WORKERS)
+
+
+class _RequestHandler(WSGIRequestHandler):
+    """Keep-alive handler that closes idle connections and stops reusing them while draining"""
+
+    protocol_version = 'HTTP/1.1'
+    timeout = API_KEEPALIVE_SECONDS
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.server.draining:
+            self.close_connection = True
+
+    def log_request(self, code='-', size='-'):
+        if self.server.access_log:
+            super().log_request(code, size)
+
+
+class DrainingWSGIServer(ThreadedWSGIServer):
+    """Threaded WSGI server that tracks open connections so shutdown can wait for them"""
+
+    def __init__(self, host, port, app, fd=None, access_log=False):
+        self.draining = False
+        self.access_log = access_log
+        self._active = 0
+        self._idle = threading.Condition()
+        super().__init__(host, port, app, handler=_RequestHandler, fd=fd)
+
+    def process_request(self, request, client_address):
+        # Counted before the handler thread starts, so drain() cannot miss it
+        with self._idle:
+            self._active += 1
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._done()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._done()
+
+    def _done(self):
+        with self._idle:
+            self._active -= 1
+            if self._active == 0:
+                self._idle.notify_all()
+
+    @property
+    def active(self):
+        """Connections currently being served"""
+        return self._active
+
+    def drain(self, timeout=API_GRACEFUL_TIMEOUT):
+        """
+        Stop accepting connections and wait for the open ones to finish
+
+        Args:
+            timeout: Seconds to wait for in-flight requests
+
+        Returns:
+            True if every request finished in time
+        """
+        self.draining = True
+        self.shutdown()
+        with self._idle:
+            return self._idle.wait_for(lambda: self._active == 0, timeout)
+
+
+def _run_worker(listener, graceful_timeout, access_log=False, job_workers=0):
+    """
+    Serve requests from the shared listener until SIGTERM/SIGINT
+
+    Returns:
+        Exit status (0 when every in-flight request drained)
+    """
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    from api import create_app
+    # Warm up before taking connections
+    app = create_app(job_workers=job_workers)
+    host, port = listener.getsockname()[:2]
+    server = DrainingWSGIServer(host, port, app, fd=listener.fileno(), access_log=access_log)
+    thread = threading.Thread(target=server.serve_forever, name='invoice-api-server', daemon=True)
+    thread.start()
+
+    while not stop.wait(0.5):
+        pass
+    drained = server.drain(graceful_timeout)
+    thread.join(graceful_timeout)
+    server.server_close()
+    if not drained:
+        print(f"Worker {os.getpid()}: {server.active} request(s) still running after "
+              f"{graceful_timeout}s", file=sys.stderr)
+    return 0 if drained else 1
+
+
+def _reap(children):
+    """Collect the workers that have exited, as {pid: exit code}"""
+    exited = {}
+    for pid in list(children):
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            children.discard(pid)
+            exited[pid] = os.waitstatus_to_exitcode(status)
+    return exited
+
+
+def _spawn(listener, graceful_timeout, access_log):
+    """Fork one API worker and return its pid"""
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            status = _run_worker(listener, graceful_timeout, access_log)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            # Skip the master's atexit hooks (they would stop its job workers)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+    return pid
+
+
+def serve(host=API_HOST, port=API_PORT, workers=API_WORKERS, graceful_timeout=API_GRACEFUL_TIMEOUT,
+          job_workers=JOB_WORKERS, access_log=False):
+    """
+    Run the API with preforked workers until SIGTERM/SIGINT
+
+    Workers that die are replaced. On shutdown every worker is sent SIGTERM
+    and given ``graceful_timeout`` seconds to drain before it is killed.
+
+    Args:
+        host: Interface to listen on
+        port: Port to listen on (0 picks a free one)
+        workers: API worker processes (1, or a platform without fork, serves in-process)
+        graceful_timeout: Seconds a stopping worker waits for in-flight requests
+        job_workers: Job worker processes started by the master
+        access_log: Log every request to stderr
+
+    Returns:
+        Exit status
+    """
+    import api
+    # Migrate the stores and load the template once, before forking: the
+    # workers inherit the warm caches and their own warm-up finds them ready
+    api.warm_up()
+    from job_queue import start_workers, stop_workers
+
+    listener = socket.create_server((host, port), backlog=1024)
+    print(f"Listening on http://{host}:{listener.getsockname()[1]} with "
+          f"{workers} worker(s)", flush=True)
+    try:
+        if workers <= 1 or not hasattr(os, 'fork'):
+            return _run_worker(listener, graceful_timeout, access_log, job_workers)
+
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+
+        children = set(_spawn(listener, graceful_timeout, access_log) for _ in range(workers))
+        # Job workers are spawned (not forked) after the API workers exist
+        start_workers(job_workers)
+
+        # Children are polled by pid: waiting on any child would also reap the job workers
+        while not stopping.wait(0.5):
+            for pid, code in _reap(children).items():
+                print(f"Worker {pid} exited with status {code}; restarting", file=sys.stderr)
+                children.add(_spawn(listener, graceful_timeout, access_log))
+
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+        status = 0
+        deadline = time.monotonic() + graceful_timeout + 5
+        while children and time.monotonic() < deadline:
+            if any(_reap(children).values()):
+                status = 1
+            time.sleep(0.1)
+        for pid in children:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            status = 1
+        stop_workers()
+        return status
+    finally:
+        listener.close()
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Serve the invoice API with preforked workers")
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT)
+    parser.add_argument('--workers', type=int, default=API_WORKERS, help="API worker processes")
+    parser.add_argument('--job-workers', type=int, default=JOB_WORKERS, help="Background job worker processes")
+    parser.add_argument('--graceful-timeout', type=float, default=API_GRACEFUL_TIMEOUT,
+                        help="Seconds to drain in-flight requests on shutdown")
+    parser.add_argument('--access-log', action='store_true', help="Log every request")
+    args = parser.parse_args(argv)
+    return serve(args.host, args.port, args.workers, args.graceful_timeout, args.job_workers, args.access_log)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -50,6 +50,12 @@ try:
     
     values = handler.get_all_template_values()
     print(f"   ✓ Retrieved {len(values)} field values from template")
+
+    # Reloading must hand out a clean copy, not the previously edited workbook
+    handler.set_cell_value('C12', 'Cache Isolation Check')
+    handler.load_template()
+    assert handler.get_cell_value('C12') == values['client_name']
+    print("   ✓ Cached template copies are isolated")
     handler.close()
 except Exception as e:
     print(f"   ❌ Error loading template: {e}")
@@ -129,6 +135,881 @@ except Exception as e:
     print(f"   ❌ Error with validator: {e}")
     sys.exit(1)
 
+# Test 7: Fast XML writer matches openpyxl output
+print("\n7️⃣ Testing XML cell-patching writer...")
+try:
+    import tempfile
+    import zipfile
+    from openpyxl import load_workbook
+
+    invoice_data = {
+        'invoice_no': 'INV-FY2526-777',
+        'client_name': 'A & B <Trading> LLC',
+        'client_address': 'Line 1\nLine 2\n Line 3 ',
+        'client_trn': '100041432',
+        'date': '01/02/2026',
+        'due_date': '03/03/2026',
+        'bo_no': 'PD25|2041|4',
+        'delivery_month': '02/2026',
+        'description': 'Mixed Placement',
+        'quantity': 172859,
+        'rate': 22.23,
+        'budget': 3842.65557,
+        'vat_rate': 'VAT(5%)',
+        'vat_amount': 192.1327785,
+        'total_in_words': 'FOUR THOUSAND THIRTY FOUR DOLLARS',
+        'total_amount': 4034.7883485,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        for writer in ('xml', 'openpyxl'):
+            handler = ExcelHandler(writer=writer)
+            handler.load_template()
+            handler.update_invoice(invoice_data)
+            outputs[writer] = os.path.join(tmp, f"{writer}.xlsx")
+            with open(outputs[writer], 'wb') as f:
+                f.write(handler.render_bytes())
+
+        fast = load_workbook(outputs['xml'])['Invoice']
+        slow = load_workbook(outputs['openpyxl'])['Invoice']
+        for row in slow.iter_rows():
+            for cell in row:
+                assert fast[cell.coordinate].value == cell.value, cell.coordinate
+        print("   ✓ Every cell matches the openpyxl writer")
+
+        # Everything except the patched sheet is copied byte for byte
+        with zipfile.ZipFile(TEMPLATE_FILE) as template, zipfile.ZipFile(outputs['xml']) as patched:
+            assert patched.testzip() is None
+            assert template.namelist() == patched.namelist()
+            for name in template.namelist():
+                if name != 'xl/worksheets/sheet1.xml':
+                    assert template.read(name) == patched.read(name), name
+        print("   ✓ Untouched zip members are byte-identical to the template")
+except Exception as e:
+    print(f"   ❌ Error with XML writer: {e!r}")
+    sys.exit(1)
+
+# Test 8: Concurrent saves stay isolated from each other
+print("\n8️⃣ Testing concurrent invoice saves...")
+try:
+    from concurrent.futures import ThreadPoolExecutor
+
+    def save_one(index, folder, writer):
+        handler = ExcelHandler(writer=writer, output_folder=folder)
+        handler.load_template()
+        handler.update_invoice({
+            'invoice_no': f"INV-STRESS-{index:03d}",
+            'client_name': f"Client {index}",
+            'client_address': f"Street {index}\nCity {index}",
+            'description': f"Placement {index}",
+            'quantity': index * 10,
+        })
+        return index, handler.save_invoice(output_filename=f"stress_{index:03d}.xlsx")
+
+    for writer in ('xml', 'openpyxl'):
+        with tempfile.TemporaryDirectory() as tmp:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                saved = list(pool.map(lambda i: save_one(i, tmp, writer), range(40)))
+            for index, path in saved:
+                sheet = load_workbook(path)['Invoice']
+                assert sheet['F11'].value == f"INV-STRESS-{index:03d}"
+                assert sheet['C12'].value == f"Client {index}"
+                assert sheet['C13'].value == f"Street {index}"
+                assert sheet['C14'].value == f"City {index}"
+                assert sheet['C21'].value == f"Placement {index}"
+                assert sheet['D21'].value == index * 10
+                assert f"INV-STRESS-{index:03d}" in sheet['B1'].value
+        print(f"   ✓ 40 parallel saves ({writer}) each hold only their own data")
+except Exception as e:
+    print(f"   ❌ Error with concurrent saves: {e!r}")
+    sys.exit(1)
+
+# Test 9: Invoice numbers are unique under concurrent allocation
+print("\n9️⃣ Testing invoice number allocator...")
+try:
+    from invoice_numbers import InvoiceNumberAllocator
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'numbers.db')
+        InvoiceNumberAllocator(db_path, initial_value=5)
+
+        def claim(worker):
+            # Separate allocator per worker, as separate processes would have
+            allocator = InvoiceNumberAllocator(db_path)
+            claimed = [allocator.reserve() for _ in range(25)]
+            start = allocator.reserve(10)
+            return claimed + list(range(start, start + 10))
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            numbers = [n for chunk in pool.map(claim, range(8)) for n in chunk]
+        assert sorted(numbers) == list(range(5, 5 + 8 * 35))
+        assert InvoiceNumberAllocator(db_path).peek() == 5 + 8 * 35
+    print("   ✓ 280 concurrent claims produced unique, gap-free numbers")
+
+    import api
+    from client_manager import SQLiteClientManager
+    from invoice_register import InvoiceRegister
+
+    saved = (api.client_manager, api.invoice_register, api._new_excel_handler)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'data.db')
+        api.client_manager = SQLiteClientManager(db_path)
+        api.invoice_register = InvoiceRegister(db_path, register_file=None)
+
+        def new_handler():
+            handler = ExcelHandler(output_folder=tmp)
+            handler.load_template()
+            return handler
+
+        api._new_excel_handler = new_handler
+        try:
+            preview = api.client_manager.get_next_invoice_number()
+            invoice = {'invoice_no': f"INV-FY2526-{preview}", 'client_name': 'Race LLC', 'date': '01/02/2026',
+                       'description': 'Race', 'quantity': 1000, 'rate': 2.5}
+
+            def save(body):
+                response = api.app.test_client().post('/api/invoice/save', json=body)
+                return response.status_code, response.get_json()
+
+            # Every client posts the same previewed number: one gets it, the rest are told
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                responses = list(pool.map(save, [dict(invoice) for _ in range(8)]))
+            assert sorted(status for status, _ in responses) == [200] + [409] * 7, responses
+            saved_invoice = next(body for status, body in responses if status == 200)
+            assert saved_invoice['invoice_no'] == invoice['invoice_no']
+            assert os.path.basename(saved_invoice['output_path']) == f"{invoice['invoice_no']}.xlsx"
+            assert api.client_manager.get_next_invoice_number() == f"{int(preview) + 1:03d}"
+
+            # Without a number each save gets the next one
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                responses = list(pool.map(save, [dict(invoice, invoice_no='') for _ in range(6)]))
+            assert all(status == 200 for status, _ in responses), responses
+            numbers = sorted(body['invoice_no'] for _, body in responses)
+            assert numbers == [f"INV-FY2526-{int(preview) + n:03d}" for n in range(1, 7)], numbers
+            assert sorted(os.path.basename(body['output_path']) for _, body in responses) == [f"{n}.xlsx" for n in numbers]
+            assert all(api.invoice_register.get_invoice(n)['client_name'] == 'Race LLC' for n in numbers)
+
+            # A typed number other than the next one is rejected, never replaced
+            following = int(api.client_manager.get_next_invoice_number())
+            for typed in (numbers[0], f"INV-FY2526-{following + 5:03d}", f"INV-FY2526-0{following:03d}", 'ACME-1'):
+                status, body = save(dict(invoice, invoice_no=typed))
+                assert status == 409 and typed in body['errors'][0], (typed, status, body)
+            assert int(api.client_manager.get_next_invoice_number()) == following
+
+            # Batch rows follow the same rule, row by row
+            rows = [dict(invoice, invoice_no=f"INV-FY2526-{following:03d}"), dict(invoice, invoice_no=numbers[0]),
+                    dict(invoice, invoice_no='')]
+            results, jobs = api._prepare_batch(rows)
+            assert results[1]['errors'][0].startswith(f"Invoice number {numbers[0]} ")
+            assert [(index, data['invoice_no']) for index, data, _ in jobs] == [
+                (0, f"INV-FY2526-{following:03d}"), (2, f"INV-FY2526-{following + 1:03d}")]
+
+            # A plain download keeps the request's number and records nothing
+            client = api.app.test_client()
+            following = int(api.client_manager.get_next_invoice_number())
+            draft = dict(invoice, invoice_no='INV-FY2526-DRAFT')
+            response = client.post('/api/invoice/download', json=draft)
+            assert response.status_code == 200 and 'INV-FY2526-DRAFT' in response.headers['Content-Disposition']
+            assert int(api.client_manager.get_next_invoice_number()) == following
+            assert api.invoice_register.get_invoice('INV-FY2526-DRAFT') is None
+            assert client.post('/api/invoice/download', json=dict(invoice, invoice_no='')).status_code == 400
+            # A persisted one issues its number like a save
+            assert client.post('/api/invoice/download?persist=1', json=draft).status_code == 409
+            response = client.post('/api/invoice/download?persist=1', json=dict(invoice, invoice_no=''))
+            assert os.path.basename(response.headers['X-Output-Path']) == f"INV-FY2526-{following:03d}.xlsx"
+            assert int(api.client_manager.get_next_invoice_number()) == following + 1
+            assert api.invoice_register.get_invoice(f"INV-FY2526-{following:03d}") is not None
+        finally:
+            api.client_manager, api.invoice_register, api._new_excel_handler = saved
+    print("   ✓ A previewed number is issued once; other saves get 409 or, without a number, the next one")
+    print("   ✓ Downloads claim and record a number only when persisted")
+except Exception as e:
+    print(f"   ❌ Error with invoice number allocator: {e!r}")
+    sys.exit(1)
+
+# Test 10: SQLite client store
+print("\n🔟 Testing SQLite client store...")
+try:
+    from client_manager import SQLiteClientManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteClientManager(os.path.join(tmp, 'clients.db'))
+        # clients.json is imported on first start, in the same order
+        assert store.get_all_clients() == manager.get_all_clients()
+        for name in manager.get_all_clients():
+            assert store.get_client_address(name) == manager.get_client_address(name)
+
+        for i in range(500):
+            store.add_custom_client(f"Bulk Client {i:03d}", f"Street {i}")
+        # Every word must match; names starting with the query come first
+        expected = sum(1 for i in range(500) if '1' in f"{i:03d}")
+        everything, total = store.search_clients('bulk client 1')
+        assert total == len(everything) == expected and everything[0]['name'] == "Bulk Client 100"
+        # Pages report the same total and join up without gaps or repeats,
+        # also across the end of the prefix matches
+        pages = [store.search_clients('bulk client 1', limit=20, offset=offset) for offset in range(0, total, 20)]
+        assert {page_total for _, page_total in pages} == {total}
+        assert [client for page, _ in pages for client in page] == everything
+        page, _ = store.search_clients('bulk client 1', limit=20, offset=95)
+        assert page[0]['name'] == "Bulk Client 195" and page[5]['name'] == "Bulk Client 001"
+        assert store.search_clients('client 1', limit=20)[1] == total
+        assert store.search_clients('client 499', limit=5)[0][0]['address'] == "Street 499"
+        assert store.search_clients('bulk', limit=10, offset=495, fuzzy=False)[1] == 500
+
+        # The client list's version (the UI's cache key) ignores invoice numbering
+        version = store.get_clients_version()
+        store.allocate_invoice_number()
+        assert store.get_clients_version() == version
+        store.add_custom_client("Versioned Client")
+        added = store.get_clients_version()
+        assert added != version
+        store.remove_custom_client("Bulk Client 000")
+        assert store.get_clients_version() not in (version, added)
+    print("   ✓ Import, lookup, paged prefix/fuzzy search and the client list version work")
+except Exception as e:
+    print(f"   ❌ Error with SQLite client store: {e!r}")
+    sys.exit(1)
+
+# Test 11: BO cache returns the same results without re-parsing
+print("\n1️⃣1️⃣ Testing BO parse cache...")
+try:
+    import bo_ingest
+    from bo_cache import BOParseCache
+    from benchmark import synthetic_bo_pdf
+
+    pdf = synthetic_bo_pdf(200, seed=3)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = BOParseCache(os.path.join(tmp, 'bo_cache.db'))
+        expected = bo_ingest.parse_bo_pdf_bytes(pdf, include_text=True)
+        assert bo_ingest.parse_bo_pdf_bytes(pdf, include_text=True, cache=cache) == expected
+
+        extract = bo_ingest.extract_pdf_text
+        bo_ingest.extract_pdf_text = None  # a hit must not touch pypdf
+        try:
+            assert bo_ingest.parse_bo_pdf_bytes(pdf, include_text=True, cache=cache) == expected
+            pages, parsed = bo_ingest.parse_bo_pdf_bytes(pdf, cache=cache)
+            assert 'raw_text' not in parsed and parsed['bo_no'] == expected[1]['bo_no']
+        finally:
+            bo_ingest.extract_pdf_text = extract
+
+        # Entries beyond the size cap push out the least recently used ones
+        small = BOParseCache(os.path.join(tmp, 'small.db'), max_bytes=4096)
+        for i in range(20):
+            small.put_text(f"digest{i}", 1, os.urandom(600).hex())
+        assert small.get_text("digest0") is None and small.get_text("digest19") is not None
+    print("   ✓ Hits skip extraction and parsing; LRU eviction keeps the cap")
+except Exception as e:
+    print(f"   ❌ Error with BO parse cache: {e!r}")
+    sys.exit(1)
+
+# Test 12: Scalar and batch totals agree
+print("\n1️⃣2️⃣ Testing invoice totals...")
+try:
+    import random
+    from invoice_totals import calculate_totals, calculate_totals_batch
+
+    totals = calculate_totals(500000, 7.69, 5)
+    assert totals['total_cents'] == 403725
+    assert totals['total_in_words'] == "FOUR THOUSAND THIRTY SEVEN DOLLARS AND TWENTY FIVE CENTS"
+    # Half cents round up from the printed decimal, and never show 100 cents
+    assert calculate_totals(1000, 1.005, 0)['total_cents'] == 101
+    assert calculate_totals(1000, 4.999, 0)['total_in_words'] == "FIVE DOLLARS"
+
+    rng = random.Random(12)
+    quantities = [rng.choice([rng.randint(1, 10**6), round(rng.uniform(0, 1e5), 3)]) for _ in range(5000)]
+    rates = [rng.choice([round(rng.uniform(0, 50), 2), rng.randint(1, 400) / 8, 1.005]) for _ in range(5000)]
+    vats = [rng.choice([0, 5]) for _ in range(5000)]
+    frame = calculate_totals_batch(quantities, rates, vats)
+    for row, q, r, v in zip(frame.to_dict('records'), quantities, rates, vats):
+        assert row == calculate_totals(q, r, v), (q, r, v)
+    assert calculate_totals_batch(['10', 'abc'], [5, 5], 5)['total_cents'].isna().tolist() == [False, True]
+    # Infinite or overflowing values are per-row failures, not an OverflowError
+    frame = calculate_totals_batch(['10', 'inf', '1e400', 1e300, 10], [5, 5, 5, 5, float('-inf')], 5)
+    assert frame['total_cents'].isna().tolist() == [False, True, True, True, True]
+    assert frame['budget'].isna().tolist() == [False, True, True, True, True]
+    print("   ✓ 5000 batch rows match the scalar calculation exactly")
+except Exception as e:
+    print(f"   ❌ Error with invoice totals: {e!r}")
+    sys.exit(1)
+
+# Test 13: Table-driven amount words match the original recursive converter
+print("\n1️⃣3️⃣ Testing amount-to-words...")
+try:
+    from amount_words import int_to_words, amount_in_words, amounts_in_words
+
+    def reference_int_to_words(n):
+        to19 = ['Zero','One','Two','Three','Four','Five','Six','Seven','Eight','Nine','Ten','Eleven','Twelve','Thirteen','Fourteen','Fifteen','Sixteen','Seventeen','Eighteen','Nineteen']
+        tens = ['','','Twenty','Thirty','Forty','Fifty','Sixty','Seventy','Eighty','Ninety']
+
+        def words(num):
+            if num < 20:
+                return to19[num]
+            if num < 100:
+                return tens[num//10] + ('' if num%10==0 else ' ' + to19[num%10])
+            if num < 1000:
+                return to19[num//100] + ' Hundred' + ('' if num%100==0 else ' ' + words(num%100))
+            for p, w in [(10**9, 'Billion'), (10**6, 'Million'), (1000, 'Thousand')]:
+                if num >= p:
+                    return words(num//p) + ' ' + w + ('' if num%p==0 else ' ' + words(num%p))
+            return ''
+        return words(n)
+
+    for n in range(1000001):
+        assert int_to_words(n) == reference_int_to_words(n), n
+    rng = random.Random(13)
+    for n in [rng.randrange(10**15) for _ in range(20000)] + [10**12, 10**18 + 10**9 + 7]:
+        assert int_to_words(n) == reference_int_to_words(n), n
+
+    assert amount_in_words(403725) == "FOUR THOUSAND THIRTY SEVEN DOLLARS AND TWENTY FIVE CENTS"
+    assert amount_in_words(12345, 'AED') == "ONE HUNDRED TWENTY THREE DIRHAMS AND FORTY FIVE FILS"
+    assert amount_in_words(1500, 'KWD') == "ONE DINARS AND FIVE HUNDRED FILS"
+    assert amounts_in_words([0, 5, 0]).tolist() == ["ZERO DOLLARS", "ZERO DOLLARS AND FIVE CENTS", "ZERO DOLLARS"]
+    print("   ✓ 0-1,000,000 (and random large values) match the original wording")
+except Exception as e:
+    print(f"   ❌ Error with amount-to-words: {e!r}")
+    sys.exit(1)
+
+# Test 14: Compiled batch validator
+print("\n1️⃣4️⃣ Testing compiled batch validator...")
+try:
+    import time
+    import pandas as pd
+    from validator import compiled_validator
+
+    rows = [dict(test_data) for _ in range(10000)]
+    for i in range(0, 10000, 7):
+        rows[i]['rate'] = 'abc'
+    rows[5]['date'] = '31/02/2026'
+    rows[9]['bogus'] = 1
+
+    start = time.perf_counter()
+    errors = compiled_validator.validate_batch(rows)
+    elapsed = time.perf_counter() - start
+    assert len(errors) == len(range(0, 10000, 7)) + 2
+    assert errors[0] == {'row': 0, 'field': 'rate', 'message': 'Rate must be a number'}
+    assert {'row': 5, 'field': 'date', 'message': 'Date must be in DD/MM/YYYY format'} in errors
+    assert {'row': 9, 'field': 'bogus', 'message': 'Unknown field: bogus'} in errors
+    assert elapsed < 1.0, elapsed
+    assert compiled_validator.validate_batch(pd.DataFrame(rows)) == errors
+
+    # The stateful wrapper reports the same messages
+    assert not validator.validate_all(rows[5]) and validator.get_errors() == ['Date must be in DD/MM/YYYY format']
+    print(f"   ✓ 10k rows validated in {elapsed * 1000:.0f} ms with row/field errors")
+except Exception as e:
+    print(f"   ❌ Error with compiled validator: {e!r}")
+    sys.exit(1)
+
+# Test 15: Invoice register
+print("\n1️⃣5️⃣ Testing invoice register...")
+try:
+    import shutil
+    from invoice_register import InvoiceRegister
+    from config import REGISTER_FILE, REGISTER_SHEET
+
+    with tempfile.TemporaryDirectory() as tmp:
+        register_file = os.path.join(tmp, 'register.xlsx')
+        shutil.copy(REGISTER_FILE, register_file)
+        register = InvoiceRegister(os.path.join(tmp, 'register.db'), register_file)
+
+        # The shipped register is imported on first start
+        first = register.get_invoice('INV-FY2526-001')
+        assert first['bo_no'] == 'OD25|18292|3' and first['total_amount'] == 4971.72
+        imported = register.search(limit=None)[1]
+
+        register.record_invoices([{
+            'invoice_no': f"INV-T-{i:04d}", 'client_name': f"Client {i % 40}", 'bo_no': f"BO{i}",
+            'date': '15/01/2026', 'due_date': '14/02/2026', 'delivery_month': f"{i % 12 + 1:02d}/2026",
+            'budget': 1000.0, 'vat_amount': 50.0, 'total_amount': 1050.0,
+        } for i in range(3000)])
+        register.record_invoice({'invoice_no': 'INV-FY2526-001', 'client_name': 'Optimum Media Direction FZ-LLC',
+                                 'date': '23/09/2025', 'total_amount': 10.0})
+        assert register.get_invoice('INV-FY2526-001')['comments'] == 'Payment Received'
+
+        # Client names starting with "client 1" (1, 10-19), delivered in April
+        page, total = register.search(client='client 1', month_from='04/2026', month_to='2026-04', limit=5)
+        assert total == sum(1 for i in range(3000) if str(i % 40).startswith('1') and i % 12 == 3)
+        assert len(page) == 5
+        assert register.search(bo_no='BO2999')[0][0]['invoice_no'] == 'INV-T-2999'
+
+        assert register.export_xlsx() == imported + 3000
+        workbook = load_workbook(register_file, read_only=True)
+        assert workbook.sheetnames[1] == 'Credit Notes'
+        assert workbook[REGISTER_SHEET].max_row == imported + 3000 + 1
+        workbook.close()
+    print("   ✓ Import, upsert, indexed search and bulk xlsx export work")
+except Exception as e:
+    print(f"   ❌ Error with invoice register: {e!r}")
+    sys.exit(1)
+
+# Test 16: Incremental indexer backfills the register from saved invoices
+print("\n1️⃣6️⃣ Testing incremental invoice indexer...")
+try:
+    from invoice_indexer import InvoiceIndexer
+    from excel_handler import read_invoice_values
+    from config import OUTPUT_FOLDER
+
+    # The read-only reader returns what the template reader returns
+    sample = os.path.join(OUTPUT_FOLDER, 'INV-FY2526-101.xlsx')
+    sample_handler = ExcelHandler(sample)
+    sample_handler.load_template()
+    assert read_invoice_values(sample) == sample_handler.get_all_template_values()
+    sample_handler.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, 'invoices')
+        shutil.copytree(OUTPUT_FOLDER, folder)
+        register_file = os.path.join(tmp, 'register.xlsx')
+        shutil.copy(REGISTER_FILE, register_file)
+        db_path = os.path.join(tmp, 'register.db')
+        indexer = InvoiceIndexer(folder, InvoiceRegister(db_path, register_file), db_path)
+
+        count = len([name for name in os.listdir(folder) if name.endswith('.xlsx')])
+        first = indexer.scan(workers=2)
+        assert first['files'] == count and first['indexed'] == count and first['failed'] == 0
+        assert indexer.scan()['indexed'] == 0
+
+        # Formula totals (=F25+F26) are recomputed from quantity, rate and VAT
+        row = indexer.register.get_invoice('INV-FY2526-101')
+        assert row['budget'] == 28.35 and row['total_amount'] == 28.35 * 1.05
+        assert row['due_date'] == '2026-03-05'
+
+        # Only the touched file is read again; deleted and broken files are tracked
+        touched = os.path.join(folder, 'INV-FY2526-999.xlsx')
+        os.utime(touched, ns=(time.time_ns(), time.time_ns()))
+        os.remove(os.path.join(folder, 'INV-FY2526-123.xlsx'))
+        with open(os.path.join(folder, 'broken.xlsx'), 'wb') as f:
+            f.write(b'not a workbook')
+        rescan = indexer.scan()
+        assert (rescan['indexed'], rescan['failed'], rescan['removed']) == (1, 1, 1)
+        assert indexer.scan()['indexed'] == 0
+    print("   ✓ First scan indexes every file, rescans read only new or changed ones")
+except Exception as e:
+    print(f"   ❌ Error with invoice indexer: {e!r}")
+    sys.exit(1)
+
+# Test 17: Fast field reader matches a full workbook load
+print("\n1️⃣7️⃣ Testing fast invoice field reader...")
+try:
+    import io
+    import xlsx_reader
+    from datetime import datetime
+    from openpyxl import Workbook
+
+    # Every saved invoice, with chunks small enough to split cells
+    for name in sorted(os.listdir(OUTPUT_FOLDER)):
+        path = os.path.join(OUTPUT_FOLDER, name)
+        full_handler = ExcelHandler(path)
+        full_handler.workbook = load_workbook(path)
+        full_handler.worksheet = full_handler.workbook['Invoice']
+        expected = full_handler.get_all_template_values()
+        full_handler.close()
+        for chunk_size in (13, xlsx_reader.CHUNK_SIZE):
+            original_chunk_size, xlsx_reader.CHUNK_SIZE = xlsx_reader.CHUNK_SIZE, chunk_size
+            try:
+                assert read_invoice_values(path) == expected, name
+            finally:
+                xlsx_reader.CHUNK_SIZE = original_chunk_size
+
+    # Escaped text, dates, booleans and a shared formula written the way Excel stores it
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Invoice'
+    sheet['A1'] = 'Tom & Jerry <LLC>'
+    sheet['B2'] = datetime(2026, 1, 5)
+    sheet['C3'] = True
+    sheet['D4'] = '=SUM(B2:C3)'
+    sheet['D5'] = 7
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as source:
+        members = [(info, source.read(info)) for info in source.infolist()]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as target:
+        for info, content in members:
+            if info.filename.startswith('xl/worksheets/'):
+                content = content.replace(b'<f>SUM(B2:C3)</f>', b'<f t="shared" ref="D4:D5" si="0">SUM(B2:C3)</f>')
+                content = content.replace(b'<c r="D5" t="n"><v>7</v></c>', b'<c r="D5"><f t="shared" si="0"/><v>7</v></c>')
+            target.writestr(info, content)
+    expected_sheet = load_workbook(io.BytesIO(buffer.getvalue()))['Invoice']
+    refs = ['A1', 'B2', 'C3', 'D4', 'D5']
+    assert xlsx_reader.read_cells(io.BytesIO(buffer.getvalue()), refs) == {ref: expected_sheet[ref].value for ref in refs}
+    assert expected_sheet['D5'].value == '=SUM(B3:C4)'
+    print("   ✓ Mapped cells read from the sheet XML equal the openpyxl values")
+except Exception as e:
+    print(f"   ❌ Error with fast invoice field reader: {e!r}")
+    sys.exit(1)
+
+# Test 18: Background job queue
+print("\n1️⃣8️⃣ Testing background job queue...")
+try:
+    from job_queue import JobQueue, register_handler, job_folder
+
+    def square(payloads, params):
+        return [(None, 'odd') if payload['n'] % 2 else ({'square': payload['n'] ** 2}, None) for payload in payloads]
+    register_handler('test_square', square)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(os.path.join(tmp, 'jobs.db'))
+        job_id = queue.submit('test_square', [{'n': n} for n in range(50)], invalid={0: 'bad row'})
+        assert queue.get_job(job_id)['status'] == 'queued'
+
+        # Chunks are claimed in item order; progress is per item
+        assert queue.work_once(chunk_size=10) == 10
+        job = queue.get_job(job_id)
+        assert job['status'] == 'running' and job['pending'] == 39 and job['progress'] == 0.22
+
+        # Cancelling drops the items not yet claimed
+        assert queue.cancel(job_id) == 39
+        assert queue.run_until_empty() == 0
+        job = queue.get_job(job_id)
+        assert (job['status'], job['succeeded'], job['failed'], job['cancelled']) == ('cancelled', 5, 6, 39)
+
+        # Retry queues failed items again, never the ones that failed validation
+        assert queue.retry(job_id) == 5
+        assert queue.get_job(job_id)['status'] == 'queued'
+        queue.run_until_empty()
+        failed = queue.get_items(job_id, status='failed')
+        assert [item['index'] for item in failed] == [0, 1, 3, 5, 7, 9]
+        assert failed[1]['attempts'] == 2 and failed[0]['error'] == 'bad row'
+        assert queue.get_items(job_id, limit=3)[2]['result'] == {'square': 4}
+
+        # Items of a worker that died are claimed again once the lease runs out
+        stale_id = queue.submit('test_square', [{'n': 2}])
+        queue.claim(lease_seconds=-1)
+        assert queue.run_until_empty() == 1
+        assert queue.get_job(stale_id)['status'] == 'succeeded'
+
+        # Items a handler returns no result for fail instead of staying claimed
+        register_handler('test_short', lambda payloads, params: square(payloads, params)[:1])
+        short_id = queue.submit('test_short', [{'n': 2}, {'n': 4}, {'n': 6}])
+        assert queue.run_until_empty() == 3
+        job = queue.get_job(short_id)
+        assert (job['status'], job['succeeded'], job['failed']) == ('failed', 1, 2), job
+        assert queue.get_items(short_id, status='failed')[0]['error'] == "Handler returned 1 results for 3 items"
+
+        # Export jobs write their file into the job's own folder
+        db_path = os.path.join(tmp, 'register.db')
+        register_file = os.path.join(tmp, 'register.xlsx')
+        shutil.copy(REGISTER_FILE, register_file)
+        export_id = queue.submit('register_export', [{}], {'db_path': db_path, 'register_file': register_file})
+        try:
+            assert queue.run_until_empty() == 1
+            assert queue.get_job(export_id)['status'] == 'succeeded'
+            result = queue.get_items(export_id)[0]['result']
+            assert os.path.exists(os.path.join(job_folder(export_id), result['filename']))
+        finally:
+            shutil.rmtree(job_folder(export_id), ignore_errors=True)
+    print("   ✓ Chunked claims, progress, cancel, retry, lease expiry and short handler results work")
+except Exception as e:
+    print(f"   ❌ Error with job queue: {e!r}")
+    sys.exit(1)
+
+# Test 19: Invoice PDFs
+print("\n1️⃣9️⃣ Testing invoice PDF rendering...")
+try:
+    import glob
+    import io
+    import shutil
+    import tempfile
+    from datetime import datetime
+    from pypdf import PdfReader
+    from invoice_indexer import invoice_record
+    from invoice_pdf import compile_layout, convert_invoices, format_value, invoice_pdf_bytes
+
+    assert compile_layout() is compile_layout()
+    assert format_value(3842.66, '_-[$$-409]* #,##0.00_ ;_-[$$-409]* \\-#,##0.00\\ ;_-[$$-409]* "-"??_ ;_-@_ ') == '$ 3,842.66'
+    assert format_value(datetime(2026, 1, 20), 'mm-dd-yy') == '01-20-26'
+    assert format_value(datetime(2025, 10, 1), 'mmm-yy') == 'Oct-25'
+    assert format_value(22.23) == '22.23' and format_value(0.05, '0%') == '5%'
+
+    sources = sorted(glob.glob(os.path.join(OUTPUT_FOLDER, '*.xlsx')))
+    for path in sources:
+        values = read_invoice_values(path)
+        reader = PdfReader(io.BytesIO(invoice_pdf_bytes(path)))
+        text = reader.pages[0].extract_text()
+        assert len(reader.pages) == 1 and reader.metadata.title == values['invoice_no']
+        assert values['invoice_no'] in text and values['client_name'] in text and 'TAX INVOICE' in text
+        # Formulas saved without results are computed, as the register does
+        total = invoice_record(values)['total_amount']
+        assert f"$ {total:,.2f}" in text, path
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = convert_invoices(sources + [os.path.join(tmp, 'missing.xlsx')], tmp, workers=2)
+        assert [bool(pdf_path) for _, pdf_path, _ in results] == [True] * len(sources) + [False]
+        assert results[-1][2] and all(os.path.getsize(pdf_path) > 1000 for _, pdf_path, _ in results[:-1])
+    print(f"   ✓ {len(sources)} saved invoices rendered to one-page PDFs with computed totals")
+except Exception as e:
+    print(f"   ❌ Error with invoice PDFs: {e!r}")
+    sys.exit(1)
+
+# Test 20: Metrics
+print("\n2️⃣0️⃣ Testing metrics...")
+try:
+    import metrics
+    from metrics import Counter, Histogram, MetricsRegistry
+
+    registry = MetricsRegistry()
+    latency = registry.register(Histogram('test_seconds', 'Test latency', ('stage',), buckets=(0.1, 1.0)))
+    errors = registry.register(Counter('test_errors_total', 'Test errors', ('stage',)))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, 'save')
+    errors.inc(2, 'say "hi"\n')
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text and '# TYPE test_errors_total counter' in text
+    # Buckets are cumulative and inclusive of their upper bound
+    assert 'test_seconds_bucket{stage="save",le="0.1"} 2' in text
+    assert 'test_seconds_bucket{stage="save",le="1.0"} 3' in text
+    assert 'test_seconds_bucket{stage="save",le="+Inf"} 4' in text
+    assert 'test_seconds_sum{stage="save"} 2.65' in text and 'test_seconds_count{stage="save"} 4' in text
+    assert 'test_errors_total{stage="say \\"hi\\"\\n"} 2' in text
+
+    was_enabled = metrics.enabled()
+    try:
+        metrics.set_enabled(True)
+        try:
+            with metrics.stage('test', 'boom'):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+        assert metrics.STAGE_SECONDS.count('test', 'boom') == 1 and metrics.ERRORS.value('test', 'boom') == 1
+
+        # Disabled timers record nothing
+        metrics.set_enabled(False)
+        with metrics.stage('test', 'off'):
+            pass
+        metrics.count_invoices('test')
+        assert metrics.STAGE_SECONDS.count('test', 'off') == 0 and metrics.INVOICES.value('test') == 0
+    finally:
+        metrics.set_enabled(was_enabled)
+        metrics.REGISTRY.clear()
+    print("   ✓ Counters, cumulative histograms, stage errors and the disabled no-op work")
+except Exception as e:
+    print(f"   ❌ Error with metrics: {e!r}")
+    sys.exit(1)
+
+# Test 21: Benchmark baseline comparison
+print("\n2️⃣1️⃣ Testing benchmark baseline comparison...")
+try:
+    import json
+    from benchmark import BASELINE_FILE, SUITES, compare
+
+    baseline = {
+        'save': {'value': 10.0, 'unit': 'ms', 'better': 'lower'},
+        'throughput': {'value': 100.0, 'unit': 'req/s', 'better': 'higher'},
+        'stage': {'value': 0.01, 'unit': 'ms', 'better': 'lower', 'gate': False},
+        'dropped': {'value': 1.0, 'unit': 'ms', 'better': 'lower'},
+    }
+    results = {
+        'save': {'value': 16.0, 'unit': 'ms', 'better': 'lower'},
+        'throughput': {'value': 80.0, 'unit': 'req/s', 'better': 'higher'},
+        'stage': {'value': 0.1, 'unit': 'ms', 'better': 'lower', 'gate': False},
+        'new': {'value': 1.0, 'unit': 'ms', 'better': 'lower'},
+    }
+    rows = {row['name']: row for row in compare(results, baseline, tolerance=0.5)}
+    # Only metrics present in both runs are compared
+    assert set(rows) == {'save', 'throughput', 'stage'}
+    assert rows['save']['regression'] and rows['save']['change'] == 0.6
+    # Lower throughput is a slowdown, but 25% is within tolerance
+    assert not rows['throughput']['regression'] and rows['throughput']['change'] == 0.25
+    # Ungated metrics are reported, never failed on
+    assert rows['stage']['change'] > 0.5 and not rows['stage']['regression']
+
+    with open(BASELINE_FILE, encoding='utf-8') as f:
+        stored = json.load(f)
+    assert {name.split('.')[0] for name in stored['results']} == set(SUITES)
+    print("   ✓ Regressions are flagged by direction and tolerance; the baseline covers every suite")
+except Exception as e:
+    print(f"   ❌ Error with benchmark comparison: {e!r}")
+    sys.exit(1)
+
+# Test 22: Production server drains in-flight requests and serves with preforked workers
+print("\n2️⃣2️⃣ Testing production server...")
+try:
+    import http.client
+    import threading
+    import time
+    from server import DrainingWSGIServer
+    from load_test import start_server, stop_server
+
+    def slow_app(environ, start_response):
+        time.sleep(0.3)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'saved']
+
+    server = DrainingWSGIServer('127.0.0.1', 0, slow_app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    responses = []
+
+    def slow_request():
+        conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+        conn.request('POST', '/save')
+        responses.append(conn.getresponse().read())
+        conn.close()
+
+    client = threading.Thread(target=slow_request)
+    client.start()
+    deadline = time.monotonic() + 5
+    while server.active == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Shutting down mid-request waits for the response instead of dropping it
+    assert server.drain(timeout=5)
+    client.join(5)
+    server.server_close()
+    assert responses == [b'saved'], responses
+    print("   ✓ Shutdown drains the in-flight request before returning")
+
+    process, port = start_server(workers=2)
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        conn.request('GET', '/api/invoice/next-number')
+        response = conn.getresponse()
+        assert response.status == 200, response.status
+        response.read()
+        conn.close()
+    finally:
+        status = stop_server(process)
+    assert status == 0, status
+    print("   ✓ Two preforked workers serve requests and stop cleanly on SIGTERM")
+except Exception as e:
+    print(f"   ❌ Error with production server: {e!r}")
+    sys.exit(1)
+
+# Test 23: Entry points import quickly and leave heavy libraries for the paths that need them
+print("\n2️⃣3️⃣ Testing entry point import time...")
+try:
+    import tempfile
+    from benchmark import IMPORT_BUDGETS, LAZY_MODULES, import_time
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # As on a fresh install: no database yet, and importing must not create one
+        data_db_file = os.path.join(tmp, 'invoice_data.db')
+        for module, budget in IMPORT_BUDGETS.items():
+            readings = [import_time(module, data_db_file) for _ in range(3)]
+            heavy = sorted(set(LAZY_MODULES) & readings[0][1])
+            assert not heavy, f"importing {module} loads {', '.join(heavy)}"
+            assert not os.listdir(tmp), f"importing {module} opened {', '.join(os.listdir(tmp))}"
+            milliseconds = min(reading[0] for reading in readings)
+            assert milliseconds <= budget, f"importing {module} took {milliseconds:.0f} ms (budget {budget} ms)"
+            print(f"   ✓ {module}: {milliseconds:.0f} ms of {budget} ms, no {'/'.join(LAZY_MODULES[:3])} or SQLite")
+except Exception as e:
+    print(f"   ❌ Error with import time: {e!r}")
+    sys.exit(1)
+
+# Test 24: Line items fill the item rows and insert rows past the template's capacity
+print("\n2️⃣4️⃣ Testing multi-line-item invoices...")
+try:
+    import tempfile
+    import zipfile
+    from openpyxl import load_workbook
+    from api import _prepare_invoice
+    from config import LINE_ITEM_ROWS
+    from excel_handler import ExcelHandler, read_invoice_values
+    from invoice_totals import calculate_line_items, calculate_totals
+
+    items = [{'description': f"Placement {i}", 'quantity': 10000 * i, 'rate': 2.5 + i} for i in range(1, 13)]
+    totals = calculate_line_items(items, 5)
+    assert abs(totals['budget'] - sum(calculate_totals(i['quantity'], i['rate'], 5)['budget'] for i in items)) < 1e-9
+    assert [item['budget'] for item in totals['items']] == [i['quantity'] * i['rate'] / 1000 for i in items]
+    print(f"   ✓ One pass over {len(items)} items: subtotal {totals['budget']:,.2f}, total {totals['total_amount']:,.2f}")
+
+    capacity = LINE_ITEM_ROWS[1] - LINE_ITEM_ROWS[0] + 1
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in (3, len(items)):
+            invoice = {'invoice_no': f"INV-LINES-{count}", 'client_name': 'Line Items LLC', 'date': '20/01/2026',
+                       'vat_rate': 'UAE GCC (5%)', 'line_items': items[:count]}
+            assert _prepare_invoice(invoice) == [], count
+            extra = max(0, count - capacity)
+            for writer in ('xml', 'openpyxl'):
+                handler = ExcelHandler(writer=writer, output_folder=tmp)
+                handler.load_template()
+                handler.update_invoice(invoice)
+                # Template references keep working after the rows moved
+                assert handler.get_cell_value('F25') == invoice['budget'], (count, writer)
+                path = handler.save_invoice(f"{writer}-{count}.xlsx")
+
+                worksheet = load_workbook(path)['Invoice']
+                rows = range(LINE_ITEM_ROWS[0], LINE_ITEM_ROWS[1] + 1 + extra)
+                assert [worksheet[f"B{row}"].value for row in rows] == list(range(1, count + 1)) + [None] * (len(rows) - count)
+                assert [worksheet[f"C{row}"].value for row in rows[:count]] == [i['description'] for i in items[:count]]
+                assert worksheet[f"E{25 + extra}"].value == 'Subtotal', (count, writer)
+                assert worksheet[f"F{25 + extra}"].value == invoice['budget']
+                assert worksheet[f"F{27 + extra}"].value == f"=F{25 + extra}+F{26 + extra}"
+                assert f"D{28 + extra}:F{29 + extra}" in {str(r) for r in worksheet.merged_cells.ranges}
+                assert worksheet.print_area.endswith(f"$G${46 + extra}")
+                if writer == 'xml':
+                    with zipfile.ZipFile(path) as archive:
+                        drawing = archive.read('xl/drawings/drawing1.xml').decode('utf-8')
+                    assert f"<row>{30 + extra}</row>" in drawing and '<row>1</row>' in drawing
+
+                values = read_invoice_values(path)
+                assert values['invoice_no'] == invoice['invoice_no'] and values['vat_amount'] == invoice['vat_amount']
+                assert values['budget'].split('\n')[-1] in (str(invoice['budget']), f"{invoice['budget']:g}")
+            print(f"   ✓ {count} items ({extra} rows inserted): items, totals, merged cells, print area and images line up")
+
+    bad = {'invoice_no': 'INV-LINES-X', 'client_name': 'Line Items LLC', 'date': '20/01/2026',
+           'line_items': [{'description': 'A', 'quantity': 'lots', 'rate': 1}]}
+    assert _prepare_invoice(bad)[0].startswith('Error calculating fields'), bad
+    print("   ✓ Non-numeric item amounts are rejected")
+except Exception as e:
+    print(f"   ❌ Error with line items: {e!r}")
+    sys.exit(1)
+
+# Test 25: The field layout is compiled once and checked against the template when it loads
+print("\n2️⃣5️⃣ Testing compiled field layout...")
+try:
+    from openpyxl import load_workbook
+    from config import INVOICE_FIELDS, TEMPLATE_FILE
+    from excel_handler import ExcelHandler, _invoice_sheet
+    from field_layout import FIELD_LAYOUT, TemplateLayoutError, check_layout, compile_field_layout
+
+    budget = FIELD_LAYOUT.writes['budget']
+    assert budget.cells == ((21, 6), (25, 6)) and budget.multi
+    assert 'total_amount' not in FIELD_LAYOUT.writes and len(FIELD_LAYOUT.fields) == len(INVOICE_FIELDS)
+    assert budget.coerce('1,234.50') == 1234.5 and budget.coerce('VAT(5%)') == 'VAT(5%)'
+    assert FIELD_LAYOUT.writes['client_address'].split('A\nB') == ('A', 'B', '')
+    try:
+        FIELD_LAYOUT.writes['budget'] = budget
+        raise AssertionError("write plan is mutable")
+    except TypeError:
+        pass
+    print("   ✓ Fields compile to (row, column) cells, split strategies, coercers and a read-only filter")
+
+    for fields, problem in (
+        ({**INVOICE_FIELDS, 'rate': {**INVOICE_FIELDS['rate'], 'cell': 'E2l'}}, 'Invalid cell reference'),
+        ({**INVOICE_FIELDS, 'rate': {**INVOICE_FIELDS['rate'], 'cell': 'D21'}}, 'written by both'),
+    ):
+        try:
+            compile_field_layout(fields)
+            raise AssertionError(f"no error for {problem}")
+        except TemplateLayoutError as e:
+            assert problem in str(e), str(e)
+    worksheet = _invoice_sheet(load_workbook(TEMPLATE_FILE))
+    check_layout(worksheet, FIELD_LAYOUT)
+    misplaced = compile_field_layout({**INVOICE_FIELDS, 'bo_no': {**INVOICE_FIELDS['bo_no'], 'cell': 'E29'},
+                                      'rate': {**INVOICE_FIELDS['rate'], 'cell': 'E90'}})
+    try:
+        check_layout(worksheet, misplaced)
+        raise AssertionError("misplaced cells accepted")
+    except TemplateLayoutError as e:
+        assert 'E29 (bo_no) is inside merged range D28:F29' in str(e) and 'E90 (rate) is outside' in str(e), str(e)
+    print("   ✓ Bad references, shared cells, merged and out-of-range cells are rejected up front")
+
+    handlers = {}
+    for writer in ('xml', 'openpyxl'):
+        handler = ExcelHandler(writer=writer)
+        handler.load_template()
+        handler.update_invoice({'quantity': '172,859', 'rate': '22.23', 'client_address': 'Street\nCity',
+                                'total_amount': 1, 'unknown': 'x'})
+        handlers[writer] = handler.get_all_template_values()
+        assert handler.get_cell_value('D21') == 172859 and handler.get_cell_value('C15') == ''
+        assert handler.get_cell_value('F27') == '=F25+F26'
+    assert handlers['xml'] == handlers['openpyxl']
+    print("   ✓ Both writers apply the same plan and read back the same values")
+except Exception as e:
+    print(f"   ❌ Error with field layout: {e!r}")
+    sys.exit(1)
+
 print("\n" + "="*50)
 print("✅ All tests passed successfully!")
 print("="*50)
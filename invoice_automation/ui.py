@@ -1,19 +1,81 @@
 """
 Streamlit-based UI for Invoice Template Automation with BO data mapping
 Enhanced with client dropdown, PDF parsing, and field auto-population
+
+The template values, client list and client store are cached once per
+process (st.cache_data/st.cache_resource), keyed by the template file's
+modification time and the client store's version, so new sessions reuse
+them and edits are picked up on the next rerun. Plain inputs live in an st.form: typing does not rerun
+the script, the calculated fields update when the form is submitted.
 """
 
+import os
+
 import streamlit as st
-from config import INVOICE_FIELDS
+from config import BASE_DIR, CLIENT_STORE, INVOICE_FIELDS, INVOICE_NUMBER_PREFIX, TEMPLATE_FILE
 from excel_handler import ExcelHandler
-from validator import InvoiceValidator
-from client_manager import ClientManager
+from invoice_totals import calculate_budget, calculate_line_items, calculate_totals
+from validator import compiled_validator
+from client_manager import create_client_manager
+from invoice_register import InvoiceRegister
 from datetime import datetime, date, timedelta
 import calendar
-import math
 from io import BytesIO
 
 
+CLIENTS_FILE = os.path.join(BASE_DIR, 'clients.json')
+
+# Fields with their own buttons or dependent widgets stay outside the form;
+# everything else is only sent when the form is submitted
+INTERACTIVE_FIELDS = ('invoice_no', 'client_name', 'client_address', 'date', 'delivery_month')
+
+
+def _file_version(*paths):
+    """Modification times of files (None when missing), used as a cache key"""
+    versions = []
+    for path in paths:
+        try:
+            versions.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            versions.append(None)
+    return tuple(versions)
+
+
+def _client_store_version():
+    """Cache key of the client manager: the JSON store holds clients.json in
+    memory and is rebuilt when the file changes, the SQLite store never is"""
+    if CLIENT_STORE == 'sqlite':
+        return None
+    return _file_version(CLIENTS_FILE)
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_client_manager(store_version):
+    """Client manager shared by every session"""
+    return create_client_manager()
+
+
+@st.cache_resource(show_spinner=False)
+def get_invoice_register():
+    """Invoice register shared by every session"""
+    return InvoiceRegister()
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_template_values(template_path, template_version):
+    """Field values of the template, reparsed only when the file changes"""
+    handler = ExcelHandler(template_path)
+    handler.load_template()
+    return handler.get_all_template_values()
+
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def load_clients(clients_version):
+    """Client names mapped to addresses, reloaded when the client list changes"""
+    manager = get_client_manager(_client_store_version())
+    return {client['name']: client['address'] for client in manager.get_clients_with_addresses()}
+
+
 # Page config
 st.set_page_config(
     page_title="Invoice Template Automation",
@@ -25,22 +87,20 @@ st.title("📄 Invoice Template Editor")
 st.markdown("---")
 
 # BO drag-and-drop upload removed per user request.
-if 'excel_handler' not in st.session_state:
-    st.session_state.excel_handler = ExcelHandler()
-    st.session_state.validator = InvoiceValidator()
-    st.session_state.client_manager = ClientManager()
-    try:
-        st.session_state.excel_handler.load_template()
-        st.session_state.current_data = st.session_state.excel_handler.get_all_template_values()
-    except Exception as e:
-        st.error(f"Error loading template: {str(e)}")
-        st.stop()
+try:
+    client_manager = get_client_manager(_client_store_version())
+    invoice_register = get_invoice_register()
+    template_values = load_template_values(TEMPLATE_FILE, _file_version(TEMPLATE_FILE))
+    clients = load_clients(client_manager.get_clients_version())
+except Exception as e:
+    st.error(f"Error loading template: {str(e)}")
+    st.stop()
 
 # Initialize calculation fields in session state
 if 'calc_quantity' not in st.session_state:
-    st.session_state.calc_quantity = float(st.session_state.current_data.get('quantity', 0) or 0)
+    st.session_state.calc_quantity = float(template_values.get('quantity', 0) or 0)
 if 'calc_rate' not in st.session_state:
-    st.session_state.calc_rate = float(st.session_state.current_data.get('rate', 0) or 0)
+    st.session_state.calc_rate = float(template_values.get('rate', 0) or 0)
 if 'calc_budget' not in st.session_state:
     st.session_state.calc_budget = 0.0
 if 'calc_vat_type' not in st.session_state:
@@ -50,346 +110,367 @@ if 'calc_vat_amount' not in st.session_state:
 if 'calc_total_amount' not in st.session_state:
     st.session_state.calc_total_amount = 0.0
 
-# Create columns for better layout
-col1, col2 = st.columns([3, 1])
 
-with col1:
-    st.subheader("Invoice Details")
+# Callback functions for date/delivery month pickers
+def apply_date_callback():
+    """Callback to apply selected date before widget re-renders"""
+    day = st.session_state.get('date_day', 1)
+    month = st.session_state.get('date_month', 1)
+    year = st.session_state.get('date_year', 2026)
+    selected_date = f"{day:02d}/{month:02d}/{year:04d}"
+    st.session_state['field_date'] = selected_date
+    st.session_state.show_date_picker = False
+
+
+def apply_delivery_month_callback():
+    """Callback to apply selected delivery month before widget re-renders"""
+    month = st.session_state.get('delivery_month_select', 1)
+    year = st.session_state.get('delivery_year_select', 2026)
+    selected_date = f"{month:02d}/{year}"
+    st.session_state['field_delivery_month'] = selected_date
+    st.session_state.show_delivery_picker = False
+
+
+def render_field(field_key, field_config, form_data):
+    """Render the widget for one invoice field and store its value in form_data"""
+    # Skip calculated fields from UI display except total_amount which we show read-only
+    if field_key in ['due_date', 'vat_amount', 'total_in_words']:
+        return
     
-    # Callback functions for date/delivery month pickers
-    def apply_date_callback():
-        """Callback to apply selected date before widget re-renders"""
-        day = st.session_state.get('date_day', 1)
-        month = st.session_state.get('date_month', 1)
-        year = st.session_state.get('date_year', 2026)
-        selected_date = f"{day:02d}/{month:02d}/{year:04d}"
-        st.session_state['field_date'] = selected_date
-        st.session_state.show_date_picker = False
+    label = field_config['label']
+    is_readonly = field_config.get('read_only', False)
+    current_value = template_values.get(field_key, '')
     
-    def apply_delivery_month_callback():
-        """Callback to apply selected delivery month before widget re-renders"""
-        month = st.session_state.get('delivery_month_select', 1)
-        year = st.session_state.get('delivery_year_select', 2026)
-        selected_date = f"{month:02d}/{year}"
-        st.session_state['field_delivery_month'] = selected_date
-        st.session_state.show_delivery_picker = False
+    if current_value is None:
+        current_value = ''
     
-    # Create form fields
-    form_data = {}
+    # We do not auto-populate fields from BO uploads; keep all fields editable.
+    is_auto_populated = False
     
-    for field_key, field_config in INVOICE_FIELDS.items():
-        # Skip calculated fields from UI display except total_amount which we show read-only
-        if field_key in ['due_date', 'vat_amount', 'total_in_words']:
-            continue
-        
-        label = field_config['label']
-        is_readonly = field_config.get('read_only', False)
-        field_type = field_config.get('type', 'string')
-        current_value = st.session_state.current_data.get(field_key, '')
+    # Special handling for invoice_no with prefix - Auto-generated, non-editable
+    if field_key == 'invoice_no':
+        # Get next invoice number from ClientManager
+        if 'current_invoice_number' not in st.session_state:
+            st.session_state.current_invoice_number = client_manager.get_next_invoice_number()
         
-        if current_value is None:
-            current_value = ''
+        st.markdown("**Invoice No.**")
+        col_prefix, col_number = st.columns([0.4, 0.6])
+        with col_prefix:
+            st.text_input("Prefix", value=INVOICE_NUMBER_PREFIX, disabled=True, key="invoice_prefix")
+        with col_number:
+            # Display auto-generated number (non-editable)
+            auto_invoice_num = st.session_state.current_invoice_number
+            st.text_input(
+                "Number",
+                value=auto_invoice_num,
+                disabled=True,  # Non-editable
+                key=f"field_{field_key}"
+            )
+            form_data[field_key] = f"{INVOICE_NUMBER_PREFIX}{auto_invoice_num}"
+    
+    # Special handling for client_name with dropdown and auto-address population
+    elif field_key == 'client_name':
+        st.markdown("**Client Name**")
         
-        # We do not auto-populate fields from BO uploads; keep all fields editable.
-        is_auto_populated = False
+        col_dropdown, col_add = st.columns([0.8, 0.2])
         
-        # Special handling for invoice_no with prefix - Auto-generated, non-editable
-        if field_key == 'invoice_no':
-            # Get next invoice number from ClientManager
-            if 'current_invoice_number' not in st.session_state:
-                st.session_state.current_invoice_number = st.session_state.client_manager.get_next_invoice_number()
+        with col_dropdown:
+            # Client names and addresses come from the shared cache
+            selected_client = st.selectbox(
+                label=label,
+                options=list(clients),
+                index=0,
+                key=f"field_{field_key}"
+            )
+            form_data[field_key] = selected_client
             
-            st.markdown("**Invoice No.**")
-            col_prefix, col_number = st.columns([0.4, 0.6])
-            with col_prefix:
-                st.text_input("Prefix", value="INV-FY2526-", disabled=True, key="invoice_prefix")
-            with col_number:
-                # Display auto-generated number (non-editable)
-                auto_invoice_num = st.session_state.current_invoice_number
-                st.text_input(
-                    "Number",
-                    value=auto_invoice_num,
-                    disabled=True,  # Non-editable
-                    key=f"field_{field_key}"
-                )
-                form_data[field_key] = f"INV-FY2526-{auto_invoice_num}"
+            # Auto-populate client address when client is selected
+            client_address = clients.get(selected_client)
+            if client_address:
+                st.session_state['auto_client_address'] = client_address
         
-        # Special handling for client_name with dropdown and auto-address population
-        elif field_key == 'client_name':
-            st.markdown("**Client Name**")
-            
-            col_dropdown, col_add = st.columns([0.8, 0.2])
-            
-            with col_dropdown:
-                # Get all clients
-                all_clients = st.session_state.client_manager.get_all_clients()
-                selected_client = st.selectbox(
-                    label=label,
-                    options=all_clients,
-                    index=0,
-                    key=f"field_{field_key}"
-                )
-                form_data[field_key] = selected_client
-                
-                # Auto-populate client address when client is selected
-                client_address = st.session_state.client_manager.get_client_address(selected_client)
-                if client_address:
-                    st.session_state['auto_client_address'] = client_address
-            
-            with col_add:
-                if st.button("➕ Add Client", key="add_client_btn", help="Add new client", use_container_width=True):
-                    st.session_state.show_add_client = True
-            
-            # Show add client dialog
-            if st.session_state.get('show_add_client', False):
-                st.info("**Add New Client**")
-                new_client = st.text_input(
-                    "Enter client name:",
-                    key="new_client_input",
-                    placeholder="e.g., New Company Name"
-                )
-                new_address = st.text_input(
-                    "Enter client address:",
-                    key="new_client_address_input",
-                    placeholder="e.g., Dubai Business Park, Dubai, UAE"
-                )
-                col_save, col_cancel = st.columns(2)
-                with col_save:
-                    if st.button("Save Client", key="save_client_btn"):
-                        if new_client and new_client.strip():
-                            try:
-                                st.session_state.client_manager.add_custom_client(new_client, new_address)
-                                st.session_state.show_add_client = False
-                                st.success(f"✓ Client '{new_client}' added successfully!")
-                                st.rerun()
-                            except ValueError as e:
-                                st.error(str(e))
-                        else:
-                            st.error("Client name cannot be empty")
-                with col_cancel:
-                    if st.button("Cancel", key="cancel_client_btn"):
-                        st.session_state.show_add_client = False
-                        st.rerun()
+        with col_add:
+            if st.button("➕ Add Client", key="add_client_btn", help="Add new client", use_container_width=True):
+                st.session_state.show_add_client = True
         
-        # Special handling for client_address - Auto-populated from selected client
-        elif field_key == 'client_address':
-            # Get auto-populated address from session state (set when client is selected)
-            auto_address = st.session_state.get('auto_client_address', '')
-            st.markdown("**Client Address** (Auto-populated)")
-            address_input = st.text_area(
-                label=label,
-                value=auto_address or st.session_state.get(f"field_{field_key}", ""),
-                placeholder="Address will auto-populate when you select a client",
+        # Show add client dialog
+        if st.session_state.get('show_add_client', False):
+            st.info("**Add New Client**")
+            new_client = st.text_input(
+                "Enter client name:",
+                key="new_client_input",
+                placeholder="e.g., New Company Name"
+            )
+            new_address = st.text_input(
+                "Enter client address:",
+                key="new_client_address_input",
+                placeholder="e.g., Dubai Business Park, Dubai, UAE"
+            )
+            col_save, col_cancel = st.columns(2)
+            with col_save:
+                if st.button("Save Client", key="save_client_btn"):
+                    if new_client and new_client.strip():
+                        try:
+                            client_manager.add_custom_client(new_client, new_address)
+                            load_clients.clear()
+                            st.session_state.show_add_client = False
+                            st.success(f"✓ Client '{new_client}' added successfully!")
+                            st.rerun()
+                        except ValueError as e:
+                            st.error(str(e))
+                    else:
+                        st.error("Client name cannot be empty")
+            with col_cancel:
+                if st.button("Cancel", key="cancel_client_btn"):
+                    st.session_state.show_add_client = False
+                    st.rerun()
+    
+    # Special handling for client_address - Auto-populated from selected client
+    elif field_key == 'client_address':
+        # Get auto-populated address from session state (set when client is selected)
+        auto_address = st.session_state.get('auto_client_address', '')
+        st.markdown("**Client Address** (Auto-populated)")
+        address_input = st.text_area(
+            label=label,
+            value=auto_address or st.session_state.get(f"field_{field_key}", ""),
+            placeholder="Address will auto-populate when you select a client",
+            key=f"field_{field_key}",
+            height=60,
+        )
+        form_data[field_key] = address_input
+    
+    # Special handling for date - add calendar picker
+    elif field_key == 'date':
+        st.markdown("**Date**")
+        col_input, col_button = st.columns([0.8, 0.2])
+        with col_input:
+            # Initialize session state for date if not present - ensure it's a string
+            if f"field_{field_key}" not in st.session_state:
+                st.session_state[f"field_{field_key}"] = str(current_value) if current_value else ""
+            
+            # Display the text input - Streamlit manages state via key parameter
+            st.text_input(
+                label="Select Date",
                 key=f"field_{field_key}",
-                height=60,
+                placeholder="DD/MM/YYYY",
             )
-            form_data[field_key] = address_input
+            # Get value from session state for form_data
+            form_data[field_key] = st.session_state.get(f"field_{field_key}", "")
         
-        # Special handling for date - add calendar picker
-        elif field_key == 'date':
-            st.markdown("**Date**")
-            col_input, col_button = st.columns([0.8, 0.2])
-            with col_input:
-                # Initialize session state for date if not present - ensure it's a string
-                if f"field_{field_key}" not in st.session_state:
-                    st.session_state[f"field_{field_key}"] = str(current_value) if current_value else ""
-                
-                # Display the text input - Streamlit manages state via key parameter
-                st.text_input(
-                    label="Select Date",
-                    key=f"field_{field_key}",
-                    placeholder="DD/MM/YYYY",
-                )
-                # Get value from session state for form_data
-                form_data[field_key] = st.session_state.get(f"field_{field_key}", "")
-            
-            with col_button:
-                if st.button("📅", key="date_picker_btn", help="Pick Date", use_container_width=True):
-                    st.session_state.show_date_picker = True
-            
-            if st.session_state.get('show_date_picker', False):
-                st.write("**Select Date:**")
-                picker_col1, picker_col2, picker_col3 = st.columns(3)
-                with picker_col1:
-                    day = st.selectbox("Day", list(range(1, 32)), key="date_day")
-                with picker_col2:
-                    month = st.selectbox("Month", list(range(1, 13)), format_func=lambda x: calendar.month_name[x], key="date_month")
-                with picker_col3:
-                    year = st.number_input("Year", min_value=2020, max_value=2100, value=datetime.now().year, key="date_year")
-                
-                st.button("Apply Date", key="apply_date_btn", on_click=apply_date_callback)
+        with col_button:
+            if st.button("📅", key="date_picker_btn", help="Pick Date", use_container_width=True):
+                st.session_state.show_date_picker = True
         
-        # Special handling for delivery_month - add calendar picker
-        elif field_key == 'delivery_month':
-            st.markdown("**Delivery Month**")
-            col_input, col_button = st.columns([0.8, 0.2])
-            with col_input:
-                # Initialize session state for delivery month if not present - ensure it's a string
-                if f"field_{field_key}" not in st.session_state:
-                    st.session_state[f"field_{field_key}"] = str(current_value) if current_value else ""
-                
-                # Display the text input - Streamlit manages state via key parameter
-                st.text_input(
-                    label="Select Month",
-                    key=f"field_{field_key}",
-                    placeholder="MM/YYYY",
-                )
-                # Get value from session state for form_data
-                form_data[field_key] = st.session_state.get(f"field_{field_key}", "")
+        if st.session_state.get('show_date_picker', False):
+            st.write("**Select Date:**")
+            picker_col1, picker_col2, picker_col3 = st.columns(3)
+            with picker_col1:
+                st.selectbox("Day", list(range(1, 32)), key="date_day")
+            with picker_col2:
+                st.selectbox("Month", list(range(1, 13)), format_func=lambda x: calendar.month_name[x], key="date_month")
+            with picker_col3:
+                st.number_input("Year", min_value=2020, max_value=2100, value=datetime.now().year, key="date_year")
             
-            with col_button:
-                if st.button("📅", key="delivery_calendar", help="Select Month and Year", use_container_width=True):
-                    st.session_state.show_delivery_picker = True
+            st.button("Apply Date", key="apply_date_btn", on_click=apply_date_callback)
+    
+    # Special handling for delivery_month - add calendar picker
+    elif field_key == 'delivery_month':
+        st.markdown("**Delivery Month**")
+        col_input, col_button = st.columns([0.8, 0.2])
+        with col_input:
+            # Initialize session state for delivery month if not present - ensure it's a string
+            if f"field_{field_key}" not in st.session_state:
+                st.session_state[f"field_{field_key}"] = str(current_value) if current_value else ""
             
-            if st.session_state.get('show_delivery_picker', False):
-                st.write("**Select Month and Year:**")
-                picker_col1, picker_col2 = st.columns(2)
-                with picker_col1:
-                    month = st.selectbox("Month", list(range(1, 13)), format_func=lambda x: calendar.month_name[x], key="delivery_month_select")
-                with picker_col2:
-                    year = st.number_input("Year", min_value=2020, max_value=2100, value=datetime.now().year, key="delivery_year_select")
-                
-                st.button("Apply Month", key="apply_delivery_month_btn", on_click=apply_delivery_month_callback)
-        
-        # Special handling for quantity (show template as placeholder, accept numeric input)
-        elif field_key == 'quantity':
-            placeholder_qty = str(int(float(current_value or 0))) if current_value else ""
-            qty_input = st.text_input(
-                label=label,
-                value=str(st.session_state.get(f"field_{field_key}", "")),
-                placeholder=placeholder_qty,
+            # Display the text input - Streamlit manages state via key parameter
+            st.text_input(
+                label="Select Month",
                 key=f"field_{field_key}",
+                placeholder="MM/YYYY",
             )
-            try:
-                quantity_val = int(float(qty_input)) if str(qty_input).strip() != '' else 0
-            except Exception:
-                quantity_val = 0
-            form_data[field_key] = quantity_val
-            st.session_state.calc_quantity = float(quantity_val)
+            # Get value from session state for form_data
+            form_data[field_key] = st.session_state.get(f"field_{field_key}", "")
         
-        # Special handling for rate (show template as placeholder, accept numeric input)
-        elif field_key == 'rate':
-            placeholder_rate = str(float(current_value)) if current_value else ""
-            rate_input = st.text_input(
-                label=label,
-                value=str(st.session_state.get(f"field_{field_key}", "")),
-                placeholder=placeholder_rate,
-                key=f"field_{field_key}",
-            )
-            try:
-                rate_val = float(rate_input) if str(rate_input).strip() != '' else 0.0
-            except Exception:
-                rate_val = 0.0
-            form_data[field_key] = rate_val
-            st.session_state.calc_rate = rate_val
+        with col_button:
+            if st.button("📅", key="delivery_calendar", help="Select Month and Year", use_container_width=True):
+                st.session_state.show_delivery_picker = True
         
-        # Special handling for description
-        elif field_key == 'description':
-            placeholder_desc = str(current_value) if current_value else ""
-            desc_input = st.text_area(
-                label=label,
-                value=st.session_state.get(f"field_{field_key}", ""),
-                placeholder=placeholder_desc,
-                key=f"field_{field_key}",
-                height=80,
-            )
-            form_data[field_key] = desc_input
+        if st.session_state.get('show_delivery_picker', False):
+            st.write("**Select Month and Year:**")
+            picker_col1, picker_col2 = st.columns(2)
+            with picker_col1:
+                st.selectbox("Month", list(range(1, 13)), format_func=lambda x: calendar.month_name[x], key="delivery_month_select")
+            with picker_col2:
+                st.number_input("Year", min_value=2020, max_value=2100, value=datetime.now().year, key="delivery_year_select")
+            
+            st.button("Apply Month", key="apply_delivery_month_btn", on_click=apply_delivery_month_callback)
+    
+    # Special handling for quantity (show template as placeholder, accept numeric input)
+    elif field_key == 'quantity':
+        placeholder_qty = str(int(float(current_value or 0))) if current_value else ""
+        qty_input = st.text_input(
+            label=label,
+            value=str(st.session_state.get(f"field_{field_key}", "")),
+            placeholder=placeholder_qty,
+            key=f"field_{field_key}",
+        )
+        try:
+            quantity_val = int(float(qty_input)) if str(qty_input).strip() != '' else 0
+        except Exception:
+            quantity_val = 0
+        form_data[field_key] = quantity_val
+        st.session_state.calc_quantity = float(quantity_val)
+    
+    # Special handling for rate (show template as placeholder, accept numeric input)
+    elif field_key == 'rate':
+        placeholder_rate = str(float(current_value)) if current_value else ""
+        rate_input = st.text_input(
+            label=label,
+            value=str(st.session_state.get(f"field_{field_key}", "")),
+            placeholder=placeholder_rate,
+            key=f"field_{field_key}",
+        )
+        try:
+            rate_val = float(rate_input) if str(rate_input).strip() != '' else 0.0
+        except Exception:
+            rate_val = 0.0
+        form_data[field_key] = rate_val
+        st.session_state.calc_rate = rate_val
+    
+    # Special handling for description
+    elif field_key == 'description':
+        placeholder_desc = str(current_value) if current_value else ""
+        desc_input = st.text_area(
+            label=label,
+            value=st.session_state.get(f"field_{field_key}", ""),
+            placeholder=placeholder_desc,
+            key=f"field_{field_key}",
+            height=80,
+        )
+        form_data[field_key] = desc_input
+    
+    # Special handling for BO No
+    elif field_key == 'bo_no':
+        placeholder_bo = str(current_value) if current_value else ""
+        bo_no_input = st.text_input(
+            label=label,
+            value=st.session_state.get(f"field_{field_key}", ""),
+            placeholder=placeholder_bo,
+            key=f"field_{field_key}",
+        )
+        form_data[field_key] = bo_no_input
+    
+    # Special handling for Client TRN
+    elif field_key == 'client_trn':
+        placeholder_trn = str(current_value) if current_value else ""
+        trn_input = st.text_input(
+            label=label,
+            value=st.session_state.get(f"field_{field_key}", ""),
+            placeholder=placeholder_trn,
+            key=f"field_{field_key}",
+        )
+        form_data[field_key] = trn_input
+    
+    # Special handling for budget (read-only, calculated)
+    elif field_key == 'budget':
+        st.session_state.calc_budget = calculate_budget(st.session_state.calc_quantity, st.session_state.calc_rate)
+        st.number_input(
+            label=label,
+            value=st.session_state.calc_budget,
+            disabled=True,
+            key=f"display_{field_key}",
+            format="%.2f"
+        )
+        form_data[field_key] = st.session_state.calc_budget
+    
+    # Special handling for VAT rate (dropdown)
+    elif field_key == 'vat_rate':
+        vat_option = st.selectbox(
+            label=label,
+            options=['non-GCC (0%)', 'GCC (5%)'],
+            index=0 if st.session_state.calc_vat_type == 'non-GCC' else 1,
+            key=f"field_{field_key}"
+        )
         
-        # Special handling for BO No
-        elif field_key == 'bo_no':
-            placeholder_bo = str(current_value) if current_value else ""
-            bo_no_input = st.text_input(
-                label=label,
-                value=st.session_state.get(f"field_{field_key}", ""),
-                placeholder=placeholder_bo,
-                key=f"field_{field_key}",
-            )
-            form_data[field_key] = bo_no_input
+        if 'non-GCC' in vat_option:
+            st.session_state.calc_vat_type = 'non-GCC'
+            vat_percent = 0
+        else:
+            st.session_state.calc_vat_type = 'GCC'
+            vat_percent = 5
         
-        # Special handling for Client TRN
-        elif field_key == 'client_trn':
-            placeholder_trn = str(current_value) if current_value else ""
-            trn_input = st.text_input(
-                label=label,
-                value=st.session_state.get(f"field_{field_key}", ""),
-                placeholder=placeholder_trn,
-                key=f"field_{field_key}",
-            )
-            form_data[field_key] = trn_input
+        form_data[field_key] = vat_percent
         
-        # Special handling for budget (read-only, calculated)
-        elif field_key == 'budget':
-            st.session_state.calc_budget = (st.session_state.calc_quantity * st.session_state.calc_rate) / 1000
-            st.number_input(
+        # Calculate VAT amount (not shown in UI)
+        st.session_state.calc_vat_amount = calculate_totals(
+            st.session_state.calc_quantity, st.session_state.calc_rate, vat_percent
+        )['vat_amount']
+    
+    # Read-only fields (including total_amount handled here)
+    elif is_readonly:
+        # For total_amount, show calculated value instead of template/formula
+        if field_key == 'total_amount':
+            st.session_state.calc_total_amount = st.session_state.calc_budget + st.session_state.calc_vat_amount
+            st.text_input(
                 label=label,
-                value=st.session_state.calc_budget,
+                value=f"{st.session_state.calc_total_amount:.2f}",
                 disabled=True,
-                key=f"display_{field_key}",
-                format="%.2f"
-            )
-            form_data[field_key] = st.session_state.calc_budget
-        
-        # Special handling for VAT rate (dropdown)
-        elif field_key == 'vat_rate':
-            vat_option = st.selectbox(
-                label=label,
-                options=['non-GCC (0%)', 'GCC (5%)'],
-                index=0 if st.session_state.calc_vat_type == 'non-GCC' else 1,
                 key=f"field_{field_key}"
             )
-            
-            if 'non-GCC' in vat_option:
-                st.session_state.calc_vat_type = 'non-GCC'
-                vat_percent = 0
-            else:
-                st.session_state.calc_vat_type = 'GCC'
-                vat_percent = 5
-            
-            form_data[field_key] = vat_percent
-            
-            # Calculate VAT amount (not shown in UI)
-            st.session_state.calc_vat_amount = (st.session_state.calc_budget * vat_percent) / 100
-        
-        # Read-only fields (including total_amount handled here)
-        elif is_readonly:
-            # For total_amount, show calculated value instead of template/formula
-            if field_key == 'total_amount':
-                st.session_state.calc_total_amount = st.session_state.calc_budget + st.session_state.calc_vat_amount
-                st.text_input(
-                    label=label,
-                    value=f"{st.session_state.calc_total_amount:.2f}",
-                    disabled=True,
-                    key=f"field_{field_key}"
-                )
-                form_data[field_key] = st.session_state.calc_total_amount
-            else:
-                st.text_input(
-                    label=label,
-                    value=str(current_value),
-                    disabled=True,
-                    key=f"field_{field_key}"
-                )
-                form_data[field_key] = str(current_value)
-        
-        # Regular text/date inputs
+            form_data[field_key] = st.session_state.calc_total_amount
         else:
-            # Use BO value if available, otherwise show template as placeholder
-            bo_val = st.session_state.get('bo_values', {}).get(field_key, '')
-            placeholder_val = str(current_value) if current_value else ""
-            form_data[field_key] = st.text_input(
+            st.text_input(
                 label=label,
-                value=bo_val or "",
-                placeholder=placeholder_val if not bo_val else "",
-                key=f"field_{field_key}",
-                disabled=is_auto_populated  # Make read-only if auto-populated
+                value=str(current_value),
+                disabled=True,
+                key=f"field_{field_key}"
             )
+            form_data[field_key] = str(current_value)
+    
+    # Regular text/date inputs
+    else:
+        # Use BO value if available, otherwise show template as placeholder
+        bo_val = st.session_state.get('bo_values', {}).get(field_key, '')
+        placeholder_val = str(current_value) if current_value else ""
+        form_data[field_key] = st.text_input(
+            label=label,
+            value=bo_val or "",
+            placeholder=placeholder_val if not bo_val else "",
+            key=f"field_{field_key}",
+            disabled=is_auto_populated  # Make read-only if auto-populated
+        )
+
+
+# Create columns for better layout
+col1, col2 = st.columns([3, 1])
 
+with col1:
+    st.subheader("Invoice Details")
+    
+    # Create form fields
+    form_data = {}
+    
+    for field_key, field_config in INVOICE_FIELDS.items():
+        if field_key in INTERACTIVE_FIELDS:
+            render_field(field_key, field_config, form_data)
+    
+    with st.form("invoice_form"):
+        for field_key, field_config in INVOICE_FIELDS.items():
+            if field_key not in INTERACTIVE_FIELDS:
+                render_field(field_key, field_config, form_data)
+        
         # (total_amount rendered above as read-only)
+        
+        col_calc, col_save = st.columns(2)
+        with col_calc:
+            st.form_submit_button("🧮 Update Totals", use_container_width=True)
+        with col_save:
+            save_clicked = st.form_submit_button("💾 Save Invoice", use_container_width=True)
 
     # Show header preview (merged B1) as read-only so user can verify
     try:
         from config import INVOICE_HEADER_CELL
-        header_val = st.session_state.current_data.get('header', '')
+        header_val = template_values.get('header', '')
         if header_val is None:
             header_val = ''
         st.markdown("**Header Preview (top row)**")
@@ -401,7 +482,8 @@ with col1:
     if st.session_state.get('line_items'):
         st.markdown("---")
         st.subheader("📋 Additional Line Items (from BO)")
-        st.info(f"Found {len(st.session_state.get('line_items'))} line item(s) in the BO. First item is shown above.")
+        st.info(f"Found {len(st.session_state.get('line_items'))} line item(s) in the BO. First item is shown above; "
+                "every item is written to the invoice.")
         with st.expander("View all line items", expanded=False):
             for idx, item in enumerate(st.session_state.get('line_items')[1:], 2):
                 st.write(f"**Item {idx}:**")
@@ -412,12 +494,12 @@ with col1:
 with col2:
     st.subheader("Actions")
     
-    # Save button
-    if st.button("💾 Save Invoice", use_container_width=True):
+    # Save button (submitted with the form)
+    if save_clicked:
         try:
             # Validate data
-            if not st.session_state.validator.validate_all(form_data):
-                errors = st.session_state.validator.get_errors()
+            errors = [error['message'] for error in compiled_validator.validate(form_data)]
+            if errors:
                 st.error("**Validation Errors:**\n\n" + "\n".join(f"- {e}" for e in errors))
             else:
                 # Ensure due date is computed as Date + 30 days (if date provided)
@@ -431,49 +513,42 @@ with col2:
                     except Exception:
                         pass
 
-                # Include calculated VAT amount
-                form_data['vat_amount'] = st.session_state.calc_vat_amount
-                
-                # Compute total amount
-                st.session_state.calc_total_amount = st.session_state.calc_budget + st.session_state.calc_vat_amount
-                form_data['total_amount'] = st.session_state.calc_total_amount
-                
-                # Compute total in words (dollars only)
+                # Budget, VAT, total and total in words from the shared totals module
                 try:
-                    total_val = float(form_data.get('total_amount', 0) or 0)
+                    vat_percent = int(float(form_data.get('vat_rate', 0) or 0))
                 except Exception:
-                    total_val = 0.0
-
-                def _int_to_words(n):
-                    # supports 0 <= n < 1 trillion
-                    to19 = ['Zero','One','Two','Three','Four','Five','Six','Seven','Eight','Nine','Ten','Eleven','Twelve','Thirteen','Fourteen','Fifteen','Sixteen','Seventeen','Eighteen','Nineteen']
-                    tens = ['','','Twenty','Thirty','Forty','Fifty','Sixty','Seventy','Eighty','Ninety']
-
-                    def words(num):
-                        if num < 20:
-                            return to19[num]
-                        if num < 100:
-                            return tens[num//10] + ('' if num%10==0 else ' ' + to19[num%10])
-                        if num < 1000:
-                            return to19[num//100] + ' Hundred' + ('' if num%100==0 else ' ' + words(num%100))
-                        for p, w in [(10**9, 'Billion'), (10**6, 'Million'), (1000, 'Thousand')]:
-                            if num >= p:
-                                return words(num//p) + ' ' + w + ('' if num%p==0 else ' ' + words(num%p))
-                        return ''
-                    return words(n)
-
-                dollars = int(math.floor(abs(total_val)))
-                cents = int(round((abs(total_val) - dollars) * 100))
-                words_parts = []
-                if dollars == 0:
-                    words_parts.append('Zero Dollars')
+                    vat_percent = 0
+                # Extra BO items follow the (editable) first line on the invoice
+                bo_items = st.session_state.get('line_items') or []
+                line_items = []
+                if len(bo_items) > 1:
+                    line_items = [{
+                        'description': form_data.get('description'),
+                        'quantity': st.session_state.calc_quantity,
+                        'rate': st.session_state.calc_rate,
+                    }] + [dict(item) for item in bo_items[1:]]
+                    totals = calculate_line_items(line_items, vat_percent)
                 else:
-                    words_parts.append(f"{_int_to_words(dollars)} Dollars")
-                if cents > 0:
-                    words_parts.append(f"and {_int_to_words(cents)} Cents")
-                total_words = ' '.join(words_parts)
-                # Force uppercase (user-friendly)
-                form_data['total_in_words'] = total_words.upper()
+                    totals = calculate_totals(
+                        st.session_state.calc_quantity, st.session_state.calc_rate, vat_percent
+                    )
+                st.session_state.calc_budget = totals['budget']
+                st.session_state.calc_vat_amount = totals['vat_amount']
+                st.session_state.calc_total_amount = totals['total_amount']
+                form_data['budget'] = totals['budget']
+                form_data['vat_amount'] = totals['vat_amount']
+                form_data['total_amount'] = totals['total_amount']
+                form_data['total_in_words'] = totals['total_in_words']
+
+                # Claim the displayed number atomically: another session may have
+                # issued it in the meantime, and then the next one is shown instead
+                invoice_no = client_manager.claim_invoice_number(form_data.get('invoice_no'))
+                if invoice_no is None:
+                    st.session_state.current_invoice_number = client_manager.get_next_invoice_number()
+                    raise ValueError(f"Invoice number {form_data.get('invoice_no')} has just been issued "
+                                     f"elsewhere; save again to use {INVOICE_NUMBER_PREFIX}"
+                                     f"{st.session_state.current_invoice_number}")
+                form_data['invoice_no'] = invoice_no
 
                 # Save invoice; filename should be invoice number
                 inv_no = form_data.get('invoice_no') or 'Invoice'
@@ -482,20 +557,20 @@ with col2:
 
                 # Prepare data for writing to Excel: vat_rate cell should contain "VAT(5%)" or "VAT(0%)"
                 excel_data = dict(form_data)
-                try:
-                    vat_percent = int(float(form_data.get('vat_rate', 0) or 0))
-                except Exception:
-                    vat_percent = 0
                 excel_data['vat_rate'] = f"VAT({vat_percent}%)"
+                if line_items:
+                    excel_data['line_items'] = totals['items']
 
-                st.session_state.excel_handler.update_invoice(excel_data)
-                output_path = st.session_state.excel_handler.save_invoice(output_filename=filename)
-                
-                # Increment invoice number after successful save
-                st.session_state.client_manager.increment_invoice_number()
-                st.session_state.current_invoice_number = st.session_state.client_manager.get_next_invoice_number()
+                # Start from a clean copy of the (cached) template for every invoice
+                excel_handler = ExcelHandler()
+                excel_handler.load_template()
+                excel_handler.update_invoice(excel_data)
+                output_path = excel_handler.save_invoice(output_filename=filename)
+                invoice_register.record_invoice(excel_data, output_path)
                 
-                st.success(f"✓ Invoice saved successfully!\n\nLocation: `{output_path}`")
+                st.session_state.current_invoice_number = client_manager.get_next_invoice_number()
+
+                st.success(f"✓ Invoice {form_data['invoice_no']} saved successfully!\n\nLocation: `{output_path}`")
         except Exception as e:
             st.error(f"Error saving invoice: {str(e)}")
     
@@ -2,92 +2,209 @@
 Validation module for invoice data
 """
 
+import math
+from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
+
 from config import VALIDATION_RULES, INVOICE_FIELDS
 
 
+@lru_cache(maxsize=4096)
+def _is_date(value):
+    """Whether a string parses as DD/MM/YYYY (bulk runs repeat the same few dates)"""
+    try:
+        datetime.strptime(value, "%d/%m/%Y")
+    except Exception:
+        return False
+    return True
+
+
+def _compile_field(field_key, field_config, rules):
+    """
+    Build the check for one field from its config and validation rules
+
+    Returns:
+        Function taking a value and returning an error message or None
+    """
+    label = field_config['label']
+    field_type = field_config.get('type', 'string')
+    numeric = field_type == 'numeric'
+    is_date = field_type == 'date'
+
+    rule_checks = []
+    if 'min' in rules and numeric:
+        minimum = rules['min']
+        message = f"{label} must be >= {minimum}"
+        rule_checks.append(lambda value, number: message if number < minimum else None)
+
+    if 'max' in rules and numeric and rules['max']:
+        maximum = rules['max']
+        message = f"{label} must be <= {maximum}"
+        rule_checks.append(lambda value, number: message if number > maximum else None)
+
+    if 'allowed_values' in rules:
+        allowed = rules['allowed_values']
+        message = f"{label} must be one of {allowed}"
+
+        def check_allowed(value, number):
+            try:
+                if (number if numeric else value) not in allowed:
+                    return message
+            except Exception:
+                return f"{label} validation failed"
+            return None
+        rule_checks.append(check_allowed)
+
+    required_message = f"{label} is required"
+    number_message = f"{label} must be a number"
+    date_message = f"{label} must be in DD/MM/YYYY format"
+
+    def check(value):
+        # Check if required (non-empty)
+        if value is None or str(value).strip() == '':
+            return required_message
+
+        # Type validation
+        number = None
+        if numeric:
+            try:
+                number = float(value)
+            except (ValueError, TypeError):
+                return number_message
+        elif is_date and isinstance(value, str) and not _is_date(value):
+            return date_message
+
+        # Specific field validations
+        for rule_check in rule_checks:
+            message = rule_check(value, number)
+            if message:
+                return message
+        return None
+
+    return check
+
+
+def compile_fields(fields=INVOICE_FIELDS, rules=VALIDATION_RULES):
+    """Compile a check for every configured field"""
+    return MappingProxyType({
+        field_key: _compile_field(field_key, field_config, rules.get(field_key, {}))
+        for field_key, field_config in fields.items()
+    })
+
+
+# Compiled once at import from config.py
+FIELD_CHECKS = compile_fields()
+
+
+def _check_unknown(field_key):
+    """Error message for a field that is not in INVOICE_FIELDS"""
+    return f"Unknown field: {field_key}"
+
+
+class CompiledValidator:
+    """
+    Stateless validator built from precompiled field checks
+
+    Nothing is stored between calls, so a single instance can be shared
+    across threads and request handlers.
+    """
+
+    def __init__(self, checks=FIELD_CHECKS):
+        """
+        Initialize the validator
+
+        Args:
+            checks: Mapping of field key to check, as built by compile_fields
+        """
+        self._checks = checks
+
+    def validate(self, data_dict):
+        """
+        Validate one invoice
+
+        Returns:
+            List of {'field', 'message'} dicts (empty when valid)
+        """
+        checks = self._checks
+        errors = []
+        for field_key, value in data_dict.items():
+            check = checks.get(field_key)
+            message = check(value) if check else _check_unknown(field_key)
+            if message:
+                errors.append({'field': field_key, 'message': message})
+        return errors
+
+    def validate_batch(self, rows):
+        """
+        Validate many invoices in one call
+
+        Accepts a list of dicts or a DataFrame (one invoice per row). In a
+        DataFrame, NaN cells count as absent keys and are skipped.
+
+        Returns:
+            List of {'row', 'field', 'message'} dicts ordered by row, where
+            ``row`` is the position of the invoice in ``rows``
+        """
+        checks = self._checks
+        errors = []
+
+        if hasattr(rows, 'columns'):
+            # Column by column: one check lookup per field, not per cell
+            for field_key in rows.columns:
+                check = checks.get(field_key)
+                for row, value in enumerate(rows[field_key].tolist()):
+                    if isinstance(value, float) and math.isnan(value):
+                        continue
+                    message = check(value) if check else _check_unknown(field_key)
+                    if message:
+                        errors.append({'row': row, 'field': field_key, 'message': message})
+            errors.sort(key=lambda error: error['row'])
+            return errors
+
+        for row, data_dict in enumerate(rows):
+            for field_key, value in data_dict.items():
+                check = checks.get(field_key)
+                message = check(value) if check else _check_unknown(field_key)
+                if message:
+                    errors.append({'row': row, 'field': field_key, 'message': message})
+        return errors
+
+
+# Shared, thread-safe instance
+compiled_validator = CompiledValidator()
+
+
 class InvoiceValidator:
     """Validate invoice data before saving"""
-    
+
     def __init__(self):
         self.errors = []
         self.warnings = []
-    
+
     def validate_field(self, field_key, value):
         """Validate a single field"""
         self.errors = []
         self.warnings = []
-        
-        if field_key not in INVOICE_FIELDS:
-            self.errors.append(f"Unknown field: {field_key}")
-            return False
-        
-        field_config = INVOICE_FIELDS[field_key]
-        field_type = field_config.get('type', 'string')
-        
-        # Check if required (non-empty)
-        if value is None or str(value).strip() == '':
-            self.errors.append(f"{field_config['label']} is required")
+
+        check = FIELD_CHECKS.get(field_key)
+        message = check(value) if check else _check_unknown(field_key)
+        if message:
+            self.errors.append(message)
             return False
-        
-        # Type validation
-        if field_type == 'numeric':
-            try:
-                float(value)
-            except (ValueError, TypeError):
-                self.errors.append(f"{field_config['label']} must be a number")
-                return False
-        
-        elif field_type == 'date':
-            try:
-                if isinstance(value, str):
-                    # Try common date formats
-                    from datetime import datetime
-                    datetime.strptime(value, "%d/%m/%Y")
-            except:
-                self.errors.append(f"{field_config['label']} must be in DD/MM/YYYY format")
-                return False
-        
-        # Specific field validations
-        if field_key in VALIDATION_RULES:
-            rules = VALIDATION_RULES[field_key]
-            
-            if 'min' in rules and field_type == 'numeric':
-                if float(value) < rules['min']:
-                    self.errors.append(f"{field_config['label']} must be >= {rules['min']}")
-                    return False
-            
-            if 'max' in rules and field_type == 'numeric':
-                if rules['max'] and float(value) > rules['max']:
-                    self.errors.append(f"{field_config['label']} must be <= {rules['max']}")
-                    return False
-            
-            if 'allowed_values' in rules:
-                try:
-                    val = float(value) if field_type == 'numeric' else value
-                    if val not in rules['allowed_values']:
-                        self.errors.append(f"{field_config['label']} must be one of {rules['allowed_values']}")
-                        return False
-                except:
-                    self.errors.append(f"{field_config['label']} validation failed")
-                    return False
-        
+
         return True
-    
+
     def validate_all(self, data_dict):
         """Validate all fields in data dictionary"""
-        all_errors = []
-        
-        for field_key, value in data_dict.items():
-            if not self.validate_field(field_key, value):
-                all_errors.extend(self.errors)
-        
-        self.errors = all_errors
-        return len(all_errors) == 0
-    
+        self.errors = [error['message'] for error in compiled_validator.validate(data_dict)]
+        self.warnings = []
+        return len(self.errors) == 0
+
     def get_errors(self):
         """Get all validation errors"""
         return self.errors
-    
+
     def get_warnings(self):
         """Get all validation warnings"""
         return self.warnings
@@ -0,0 +1,378 @@
+"""
+Fast invoice writer that patches mapped cells directly in the template XML
+Skips the openpyxl load/serialize round-trip for every saved invoice
+"""
+
+import copy
+import html
+import math
+import posixpath
+import re
+import struct
+import zlib
+import zipfile
+
+
+# Control characters openpyxl refuses to write (same as openpyxl.cell.cell.ILLEGAL_CHARACTERS_RE)
+ILLEGAL_CHARACTERS_RE = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+
+_CELL_RE = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.DOTALL)
+_ATTR_RE = re.compile(rb'\b([A-Za-z:]+)="([^"]*)"')
+_SHEET_RE = re.compile(r'<sheet\b[^>]*\bname="([^"]*)"[^>]*\br:id="([^"]*)"')
+_REL_RE = re.compile(r'<Relationship\b[^>]*>')
+
+# Row insertion: A1 references outside string literals, and the sheet/drawing
+# XML that carries row numbers
+_A1_RE = re.compile(r'(?<![A-Za-z0-9_.$])(\$?[A-Z]{1,3}\$?)(\d+)(?![\d(A-Za-z_!])')
+_ROW_XML_RE = r'<row\b[^>]*?\br="%d"[^>]*?(?:/>|>.*?</row>)'
+_ROW_ATTR_RE = re.compile(r'(<row\b[^>]*?\br=")(\d+)"')
+_CELL_REF_RE = re.compile(r'(<c\b[^>]*?\br="[A-Z]+)(\d+)"')
+_RANGE_ATTR_RE = re.compile(r'(\b(?:ref|sqref)=")([^"]*)"')
+_FORMULA_TEXT_RE = re.compile(r'(<f\b[^>/]*>)([^<]+)')
+_ROW_BREAKS_RE = re.compile(r'<rowBreaks\b.*?</rowBreaks>', re.DOTALL)
+_BREAK_ID_RE = re.compile(r'(<brk\b[^>]*?\bid=")(\d+)"')
+_ANCHOR_ROW_RE = re.compile(r'(<(?:xdr:)?row>)(\d+)(?=</(?:xdr:)?row>)')
+_DEFINED_NAME_RE = re.compile(r'(<definedName\b[^>]*>)([^<]+)')
+_STR_CELL_RE = re.compile(r'<c\b([^>]*?)(?:/>|>.*?</c>)', re.DOTALL)
+_STR_ATTR_RE = re.compile(r'\b([A-Za-z:]+)="([^"]*)"')
+
+# Zip record layouts (local file header / central directory / end record)
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_CENTRAL_HEADER = struct.Struct('<4s6H3L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+
+
+def escape(text):
+    """Escape &, < and > for XML text (xml.sax.saxutils.escape, which imports urllib)"""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+class UnsupportedValueError(ValueError):
+    """Raised when a value cannot be patched and openpyxl must be used instead"""
+
+
+def shift_refs(text, at, count):
+    """
+    Move the A1 references in a cell ref, range or formula as if ``count`` rows
+    were inserted above row ``at`` (text inside string literals is left alone)
+
+    Args:
+        text: e.g. 'F25', 'D28:F29' or 'SUM(F21:F24)*$E$26'
+        at: First row that moves down
+        count: Number of inserted rows
+
+    Returns:
+        The text with every row >= ``at`` increased by ``count``
+    """
+    def shift(match):
+        row = int(match.group(2))
+        return f"{match.group(1)}{row + count if row >= at else row}"
+
+    parts = text.split('"')
+    # Even parts lie outside "string literals"
+    parts[::2] = [_A1_RE.sub(shift, part) for part in parts[::2]]
+    return '"'.join(parts)
+
+
+def _shift_formulas(xml, at, count):
+    """Shift the references in every <f> element of a sheet"""
+    def shift(match):
+        return match.group(1) + escape(shift_refs(html.unescape(match.group(2)), at, count))
+    return _FORMULA_TEXT_RE.sub(shift, xml)
+
+
+def _shift_sheet_xml(xml, at, count):
+    """Renumber rows, cells, ranges, formulas and row breaks from row ``at`` down"""
+    def shift_number(match):
+        row = int(match.group(2))
+        return f'{match.group(1)}{row + count if row >= at else row}"'
+
+    xml = _ROW_ATTR_RE.sub(shift_number, xml)
+    xml = _CELL_REF_RE.sub(shift_number, xml)
+    xml = _RANGE_ATTR_RE.sub(lambda m: f'{m.group(1)}{shift_refs(m.group(2), at, count)}"', xml)
+    xml = _shift_formulas(xml, at, count)
+    return _ROW_BREAKS_RE.sub(lambda m: _BREAK_ID_RE.sub(shift_number, m.group(0)), xml)
+
+
+def _blank_rows(row_xml, first_row, count):
+    """``count`` empty copies of a row (row and cell styles kept), numbered from ``first_row``"""
+    open_tag = re.match(r'<row\b[^>]*?(/?)>', row_xml)
+    cells = []
+    for match in _STR_CELL_RE.finditer(row_xml):
+        attrs = dict(_STR_ATTR_RE.findall(match.group(1)))
+        column = attrs['r'].rstrip('0123456789')
+        style = f' s="{attrs["s"]}"' if 's' in attrs else ''
+        cells.append((column, style))
+
+    rows = []
+    for row in range(first_row, first_row + count):
+        tag = _ROW_ATTR_RE.sub(lambda m: f'{m.group(1)}{row}"', open_tag.group(0))
+        if open_tag.group(1):
+            rows.append(tag)
+            continue
+        rows.append(tag + ''.join(f'<c r="{column}{row}"{style}/>' for column, style in cells) + '</row>')
+    return ''.join(rows), [f"{column}{row}" for row in range(first_row, first_row + count)
+                           for column, _ in cells]
+
+
+def _dos_datetime(date_time):
+    """Pack a zip (year, month, day, hour, minute, second) tuple into DOS format"""
+    year, month, day, hour, minute, second = date_time
+    dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_time, dos_date
+
+
+def _find_sheet_member(archive, sheet_name):
+    """Resolve the zip member holding the named sheet (or the first sheet)"""
+    workbook_xml = archive.read('xl/workbook.xml').decode('utf-8')
+    rels_xml = archive.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+
+    sheets = _SHEET_RE.findall(workbook_xml)
+    if not sheets:
+        raise ValueError("Template workbook has no sheets")
+    rel_id = dict(sheets).get(sheet_name, sheets[0][1])
+
+    for rel in _REL_RE.findall(rels_xml):
+        attrs = dict(re.findall(r'(\w+)="([^"]*)"', rel))
+        if attrs.get('Id') == rel_id:
+            target = attrs['Target']
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise ValueError(f"Sheet relationship {rel_id} not found")
+
+
+class XlsxCellPatcher:
+    """Render invoices by rewriting only the mapped cells of the template sheet
+
+    The template is compiled once: the sheet XML is split into static byte
+    segments around each mapped ``<c>`` element, and every other zip member
+    is kept as its original compressed bytes. Rendering an invoice then
+    costs one small XML join, one deflate of the sheet and a raw copy of the
+    remaining members.
+    """
+
+    def __init__(self, template_path, cell_refs, sheet_name='Invoice'):
+        """
+        Compile the template for patching
+
+        Args:
+            template_path: Path to the .xlsx template
+            cell_refs: A1 references of every cell that may be written
+            sheet_name: Sheet to patch (falls back to the first sheet)
+        """
+        self.template_path = template_path
+        # Rows added by insert_rows, and the members they changed besides the
+        # sheet (member name -> (crc, size, deflated bytes))
+        self.inserted_rows = 0
+        self._overrides = {}
+
+        with open(template_path, 'rb') as f:
+            raw = f.read()
+        with zipfile.ZipFile(template_path) as archive:
+            self.sheet_member = _find_sheet_member(archive, sheet_name)
+            sheet_names = [name for name, _ in _SHEET_RE.findall(archive.read('xl/workbook.xml').decode('utf-8'))]
+            self.sheet_name = sheet_name if sheet_name in sheet_names else sheet_names[0]
+            self._sheet_xml = archive.read(self.sheet_member)
+            self._members = [
+                (info, self._raw_member(raw, info))
+                for info in archive.infolist()
+            ]
+
+        self._compile_sheet(self._sheet_xml, set(cell_refs))
+
+    @staticmethod
+    def _raw_member(raw, info):
+        """Slice the still-compressed bytes of a member out of the archive"""
+        name_len, extra_len = struct.unpack_from('<2H', raw, info.header_offset + 26)
+        start = info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+        return raw[start:start + info.compress_size]
+
+    def _member_bytes(self, name):
+        """Uncompressed bytes of a zip member (None if the archive has no such member)"""
+        for info, data in self._members:
+            if info.filename == name:
+                if info.compress_type == zipfile.ZIP_STORED:
+                    return data
+                if info.compress_type == zipfile.ZIP_DEFLATED:
+                    return zlib.decompress(data, -15)
+                raise ValueError(f"Unsupported compression for {name}")
+        return None
+
+    def _drawing_members(self):
+        """Zip members of the drawings anchored to the patched sheet"""
+        folder, name = posixpath.split(self.sheet_member)
+        rels = self._member_bytes(posixpath.join(folder, '_rels', f"{name}.rels"))
+        members = []
+        for rel in _REL_RE.findall(rels.decode('utf-8') if rels else ''):
+            attrs = dict(re.findall(r'(\w+)="([^"]*)"', rel))
+            if attrs.get('Type', '').endswith('/drawing'):
+                target = attrs['Target']
+                members.append(target.lstrip('/') if target.startswith('/')
+                               else posixpath.normpath(posixpath.join(folder, target)))
+        return members
+
+    @staticmethod
+    def _deflate(data):
+        """(crc, size, raw deflate bytes) for a replaced member"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        return zlib.crc32(data), len(data), compressor.compress(data) + compressor.flush()
+
+    def insert_rows(self, at, count, prototype_row=None):
+        """
+        Compile a patcher for the template with ``count`` blank rows inserted above row ``at``
+
+        The new rows copy the row and cell styles (not the values) of
+        ``prototype_row`` and every one of their cells can be written. Rows from
+        ``at`` down move with their formulas, merged ranges, drawing anchors
+        and the sheet's defined names (print area); a range ending at or below
+        ``at`` grows to cover the new rows, e.g. SUM(F21:F24) with rows inserted
+        above row 24.
+
+        Args:
+            at: Row the new rows are inserted above
+            count: Number of rows to insert
+            prototype_row: Row whose styles are copied (defaults to the row above ``at``)
+
+        Returns:
+            New XlsxCellPatcher whose writable cells are the shifted original
+            cells plus the new ones; this patcher is left unchanged
+        """
+        if count <= 0:
+            return self
+        prototype_row = prototype_row or at - 1
+        xml = self._sheet_xml.decode('utf-8')
+        prototype = re.search(_ROW_XML_RE % prototype_row, xml, re.DOTALL)
+        if prototype is None or re.search(_ROW_XML_RE % at, xml, re.DOTALL) is None:
+            raise ValueError(f"Rows {prototype_row} and {at} must both exist to insert rows")
+        new_rows, new_cells = _blank_rows(prototype.group(0), at, count)
+
+        xml = _shift_sheet_xml(xml, at, count)
+        position = re.search(_ROW_XML_RE % (at + count), xml, re.DOTALL).start()
+        sheet_xml = (xml[:position] + new_rows + xml[position:]).encode('utf-8')
+
+        overrides = dict(self._overrides)
+        for member in self._drawing_members():
+            drawing = _ANCHOR_ROW_RE.sub(
+                # Anchor rows are 0-based
+                lambda m: f"{m.group(1)}{int(m.group(2)) + count if int(m.group(2)) >= at - 1 else m.group(2)}",
+                self._member_bytes(member).decode('utf-8'))
+            overrides[member] = self._deflate(drawing.encode('utf-8'))
+
+        workbook = self._member_bytes('xl/workbook.xml').decode('utf-8')
+        sheet_prefixes = (f"'{self.sheet_name}'!", f"{self.sheet_name}!")
+        shifted = _DEFINED_NAME_RE.sub(
+            lambda m: m.group(1) + (escape(shift_refs(html.unescape(m.group(2)), at, count))
+                                    if any(p in html.unescape(m.group(2)) for p in sheet_prefixes)
+                                    else m.group(2)),
+            workbook)
+        if shifted != workbook:
+            overrides['xl/workbook.xml'] = self._deflate(shifted.encode('utf-8'))
+
+        calc_chain = self._member_bytes('xl/calcChain.xml')
+        if calc_chain is not None:
+            overrides['xl/calcChain.xml'] = self._deflate(
+                _shift_sheet_xml(calc_chain.decode('utf-8'), at, count).encode('utf-8'))
+
+        patcher = copy.copy(self)
+        patcher.inserted_rows = self.inserted_rows + count
+        patcher._sheet_xml = sheet_xml
+        patcher._overrides = overrides
+        cell_refs = {shift_refs(ref, at, count) for ref, _, _ in self._slots}
+        patcher._compile_sheet(sheet_xml, cell_refs | set(new_cells))
+        return patcher
+
+    def _compile_sheet(self, sheet_xml, cell_refs):
+        """Split the sheet XML into static segments around the target cells"""
+        self._segments = []
+        self._slots = []
+        position = 0
+        for match in _CELL_RE.finditer(sheet_xml):
+            attrs = dict(_ATTR_RE.findall(match.group(1)))
+            ref = attrs.get(b'r', b'').decode('ascii')
+            if ref not in cell_refs:
+                continue
+            self._segments.append(sheet_xml[position:match.start()])
+            style = attrs.get(b's')
+            style_attr = f' s="{style.decode("ascii")}"' if style is not None else ''
+            self._slots.append((ref, style_attr, match.group(0)))
+            position = match.end()
+        self._segments.append(sheet_xml[position:])
+
+        missing = cell_refs - {slot[0] for slot in self._slots}
+        if missing:
+            raise ValueError(f"Cells not present in template sheet: {', '.join(sorted(missing))}")
+
+    @staticmethod
+    def _cell_xml(ref, style_attr, value):
+        """Serialize one cell the way openpyxl would store the value"""
+        if value is None:
+            return f'<c r="{ref}"{style_attr}/>'
+        if isinstance(value, bool):
+            return f'<c r="{ref}"{style_attr} t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (int, float)):
+            if isinstance(value, float) and not math.isfinite(value):
+                raise UnsupportedValueError(f"Cannot write {value!r} to {ref}")
+            return f'<c r="{ref}"{style_attr}><v>{value!r}</v></c>'
+        if isinstance(value, str):
+            if ILLEGAL_CHARACTERS_RE.search(value):
+                raise UnsupportedValueError(f"Illegal characters in value for {ref}")
+            if value.startswith('=') and len(value) > 1:
+                return f'<c r="{ref}"{style_attr}><f>{escape(value[1:])}</f><v></v></c>'
+            space = ' xml:space="preserve"' if value != value.strip() else ''
+            return f'<c r="{ref}"{style_attr} t="inlineStr"><is><t{space}>{escape(value)}</t></is></c>'
+        raise UnsupportedValueError(f"Cannot write {type(value).__name__} to {ref}")
+
+    def render_sheet(self, cell_values):
+        """Build the patched sheet XML for a mapping of cell ref -> value"""
+        parts = [self._segments[0]]
+        for (ref, style_attr, original), segment in zip(self._slots, self._segments[1:]):
+            if ref in cell_values:
+                parts.append(self._cell_xml(ref, style_attr, cell_values[ref]).encode('utf-8'))
+            else:
+                # Cells the caller leaves unset keep their template XML
+                parts.append(original)
+            parts.append(segment)
+        return b''.join(parts)
+
+    def render(self, cell_values):
+        """Render a complete .xlsx file as bytes with the given cell values"""
+        sheet_xml = self.render_sheet(cell_values)
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        sheet_data = compressor.compress(sheet_xml) + compressor.flush()
+        sheet_crc = zlib.crc32(sheet_xml)
+
+        out = bytearray()
+        central = bytearray()
+        for info, data in self._members:
+            if info.filename == self.sheet_member:
+                method, crc, size, data = zipfile.ZIP_DEFLATED, sheet_crc, len(sheet_xml), sheet_data
+            elif info.filename in self._overrides:
+                method = zipfile.ZIP_DEFLATED
+                crc, size, data = self._overrides[info.filename]
+            else:
+                method, crc, size = info.compress_type, info.CRC, info.file_size
+            name = info.filename.encode('utf-8')
+            dos_time, dos_date = _dos_datetime(info.date_time)
+            offset = len(out)
+            out += _LOCAL_HEADER.pack(
+                b'PK\x03\x04', 20, 0, method, dos_time, dos_date,
+                crc, len(data), size, len(name), 0,
+            )
+            out += name
+            out += data
+            central += _CENTRAL_HEADER.pack(
+                b'PK\x01\x02', info.create_system << 8 | 20, 20, 0, method, dos_time, dos_date,
+                crc, len(data), size, len(name), 0, 0, 0, 0,
+                info.external_attr, offset,
+            )
+            central += name
+
+        central_offset = len(out)
+        out += central
+        out += _END_RECORD.pack(
+            b'PK\x05\x06', 0, 0, len(self._members), len(self._members),
+            len(central), central_offset, 0,
+        )
+        return bytes(out)
@@ -0,0 +1,240 @@
+"""
+Fast invoice reader that scans the sheet XML for a handful of cells
+The sheet is decompressed in chunks and reading stops as soon as every
+requested cell has been seen; styles are only consulted to tell dates
+from numbers
+"""
+
+import html
+import re
+import zipfile
+from functools import lru_cache
+
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+
+from xlsx_patcher import _ATTR_RE, _CELL_RE, _find_sheet_member
+
+
+# Decompressed bytes scanned per step
+CHUNK_SIZE = 64 * 1024
+
+_FORMULA_RE = re.compile(rb'<f\b([^>]*?)(?:/>|>(.*?)</f>)', re.DOTALL)
+_VALUE_RE = re.compile(rb'<v\b[^>]*>(.*?)</v>', re.DOTALL)
+_TEXT_RE = re.compile(rb'<t\b[^>]*>(.*?)</t>', re.DOTALL)
+_PHONETIC_RE = re.compile(rb'<rPh\b.*?</rPh>', re.DOTALL)
+_SHARED_ITEM_RE = re.compile(rb'<si\b[^>]*?(?:/>|>(.*?)</si>)', re.DOTALL)
+_NUM_FMT_RE = re.compile(rb'<numFmt\b([^>]*)')
+_CELL_XFS_RE = re.compile(rb'<cellXfs\b.*?</cellXfs>', re.DOTALL)
+_XF_RE = re.compile(rb'<xf\b([^>]*)')
+_DATE1904_RE = re.compile(r'<workbookPr\b[^>]*\bdate1904="(1|true)"')
+
+# (CRC, size) of styles.xml -> number format codes by style index
+_FORMATS_CACHE = {}
+
+
+def _iter_matches(stream, pattern, start_tag):
+    """
+    Yield each complete match of ``pattern`` while reading ``stream`` in chunks
+
+    ``start_tag`` opens the elements being matched; an element cut by the
+    chunk boundary is carried over to the next chunk from that tag on.
+    """
+    buffer = b''
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        buffer += chunk
+        position = 0
+        for match in pattern.finditer(buffer):
+            yield match
+            position = match.end()
+        cut = buffer.rfind(start_tag, position)
+        buffer = buffer[cut:] if cut >= 0 else buffer[max(position, len(buffer) - len(start_tag)):]
+
+
+def _unescape(text):
+    """Decode XML character entities in element text"""
+    return html.unescape(text.decode('utf-8')) if b'&' in text else text.decode('utf-8')
+
+
+def _text(body):
+    """All text of a string item (plain or rich text runs), joined"""
+    if b'<rPh' in body:
+        body = _PHONETIC_RE.sub(b'', body)
+    return ''.join(_unescape(text) for text in _TEXT_RE.findall(body))
+
+
+def _shared_strings(archive, indexes):
+    """Shared strings at the given indexes; the table is read only up to the largest"""
+    strings = []
+    if 'xl/sharedStrings.xml' in archive.NameToInfo:
+        last = max(indexes)
+        with archive.open('xl/sharedStrings.xml') as stream:
+            for match in _iter_matches(stream, _SHARED_ITEM_RE, b'<si'):
+                strings.append(_text(match.group(1) or b''))
+                if len(strings) > last:
+                    break
+    return {index: strings[index] for index in indexes if index < len(strings)}
+
+
+def _number_formats(archive):
+    """Number format code for every cell style index"""
+    info = archive.NameToInfo.get('xl/styles.xml')
+    if info is None:
+        return ()
+    # Invoices made from one template share a stylesheet, so each is parsed once
+    key = (info.CRC, info.file_size)
+    formats = _FORMATS_CACHE.get(key)
+    if formats is None:
+        if len(_FORMATS_CACHE) >= 32:
+            _FORMATS_CACHE.clear()
+        formats = _FORMATS_CACHE[key] = _parse_number_formats(archive.read('xl/styles.xml'))
+    return formats
+
+
+def _parse_number_formats(styles):
+    """Number format codes by cell style index from styles.xml bytes"""
+    # Only the numFmts and cellXfs sections matter; fonts, fills and borders are skipped
+    custom = {}
+    for attrs in _NUM_FMT_RE.findall(styles):
+        attrs = dict(_ATTR_RE.findall(attrs))
+        custom[int(attrs[b'numFmtId'])] = _unescape(attrs[b'formatCode'])
+    formats = []
+    cell_xfs = _CELL_XFS_RE.search(styles)
+    for attrs in _XF_RE.findall(cell_xfs.group(0) if cell_xfs else b''):
+        format_id = int(dict(_ATTR_RE.findall(attrs)).get(b'numFmtId', 0))
+        formats.append(custom.get(format_id, BUILTIN_FORMATS.get(format_id)))
+    return tuple(formats)
+
+
+@lru_cache(maxsize=32)
+def _cells_pattern(refs):
+    """Regex matching only the ``<c>`` elements of the given cell references"""
+    alternatives = b'|'.join(re.escape(ref) for ref in sorted(refs, key=len, reverse=True))
+    return re.compile(rb'<c\b([^>]*?\br="(' + alternatives + rb')"[^>]*?)(?:/>|>(.*?)</c>)', re.DOTALL)
+
+
+def _shared_masters(archive, sheet_member, indexes):
+    """Translators for the master cells of the given shared formula indexes"""
+    masters = {}
+    with archive.open(sheet_member) as stream:
+        for match in _iter_matches(stream, _CELL_RE, b'<c'):
+            body = match.group(2) or b''
+            formula = _FORMULA_RE.search(body) if b'<f' in body else None
+            if formula is None or not formula.group(2):
+                continue
+            formula_attrs = dict(_ATTR_RE.findall(formula.group(1)))
+            index = formula_attrs.get(b'si')
+            if formula_attrs.get(b't') == b'shared' and index in indexes and index not in masters:
+                ref = dict(_ATTR_RE.findall(match.group(1)))[b'r'].decode('ascii')
+                masters[index] = Translator('=' + _unescape(formula.group(2)), ref)
+                if len(masters) == len(indexes):
+                    break
+    return masters
+
+
+def read_cells(path, cell_refs, sheet_name='Invoice'):
+    """
+    Read the values of a few cells from an .xlsx file without loading it
+
+    Values match openpyxl's (``load_workbook`` without ``data_only``):
+    formulas come back as their '=' text, dates as datetimes, and numbers
+    as int or float.
+
+    Args:
+        path: Path (or binary file object) of the .xlsx file
+        cell_refs: A1 references of the cells to read
+        sheet_name: Sheet to read (falls back to the first sheet)
+
+    Returns:
+        Dict of cell reference -> value for every cell present in the
+        sheet; empty or missing cells are left out
+    """
+    refs = frozenset(ref.encode('ascii') for ref in cell_refs)
+    if not refs:
+        return {}
+    pattern = _cells_pattern(refs)
+    raw = {}
+    shared = {}
+
+    with zipfile.ZipFile(path) as archive:
+        sheet_member = _find_sheet_member(archive, sheet_name)
+        epoch = CALENDAR_WINDOWS_1900
+        if _DATE1904_RE.search(archive.read('xl/workbook.xml').decode('utf-8')):
+            epoch = CALENDAR_MAC_1904
+
+        pending = set(refs)
+        with archive.open(sheet_member) as stream:
+            for match in _iter_matches(stream, pattern, b'<c'):
+                ref = match.group(2)
+                if ref not in pending:
+                    continue
+                pending.discard(ref)
+                ref = ref.decode('ascii')
+                attrs = dict(_ATTR_RE.findall(match.group(1)))
+                body = match.group(3) or b''
+                data_type = attrs.get(b't', b'n').decode('ascii')
+
+                formula = _FORMULA_RE.search(body) if b'<f' in body else None
+                if formula is not None:
+                    formula_attrs = dict(_ATTR_RE.findall(formula.group(1)))
+                    text = _unescape(formula.group(2) or b'')
+                    if not text and formula_attrs.get(b't') == b'shared':
+                        # Filled in from the shared formula's master cell below
+                        shared[ref] = formula_attrs.get(b'si')
+                    raw[ref] = ('f', '=' + text, None)
+                elif data_type == 'inlineStr':
+                    if b'<is' in body:
+                        raw[ref] = ('str', _text(body), None)
+                else:
+                    value = _VALUE_RE.search(body)
+                    if value and value.group(1):
+                        raw[ref] = (data_type, _unescape(value.group(1)), int(attrs.get(b's', 0)))
+                if not pending:
+                    break
+
+        if shared:
+            masters = _shared_masters(archive, sheet_member, set(shared.values()))
+            for ref, index in shared.items():
+                if index in masters:
+                    raw[ref] = ('f', masters[index].translate_formula(ref), None)
+
+        return _decode(raw, archive, epoch)
+
+
+def _decode(raw, archive, epoch):
+    """Turn (type, text, style) cell entries into Python values"""
+    string_indexes = [int(text) for data_type, text, _ in raw.values() if data_type == 's']
+    strings = _shared_strings(archive, string_indexes) if string_indexes else {}
+
+    formats = None
+    values = {}
+    for ref, (data_type, text, style_id) in raw.items():
+        if data_type in ('f', 'str', 'e'):
+            value = text
+        elif data_type == 's':
+            value = strings.get(int(text))
+        elif data_type == 'b':
+            value = bool(int(text))
+        elif data_type == 'd':
+            value = from_ISO8601(text)
+        else:
+            value = _cast_number(text)
+            if style_id:
+                if formats is None:
+                    formats = _number_formats(archive)
+                number_format = formats[style_id] if style_id < len(formats) else None
+                if number_format and is_date_format(number_format):
+                    try:
+                        value = from_excel(value, epoch, timedelta=is_timedelta_format(number_format))
+                    except (OverflowError, ValueError):
+                        value = '#VALUE!'
+        values[ref] = value
+    return values
+
+
+def _cast_number(value):
+    """Numeric cell text as an int or float, as openpyxl reads it"""
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)